@@ -0,0 +1,240 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+# The render pass opens a window, the dummy driver keeps that off screen. Must be set before pygame is imported.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+from bench.scenarios import Scenario, SCENARIOS
+from sim.headless import HeadlessGame
+from sim.overrides import overridden
+from profiling.frame_profiler import FrameProfiler, PHASES
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Metrics compared against the baseline, and whether a higher value is better
+GATED = {"ticks_per_second": True, "frames_per_second": True, "peak_kib": False}
+
+# Profiler phases reported by the render pass
+GROUPS = {"collisions": ("collisions",), "physics": ("input", "move"), "bullets": ("bullets",),
+          "render": ("particles", "draw", "hud", "flip")}
+
+
+def headless_pass(scenario: Scenario, ticks: int, seed: int, repeat: int) -> dict:
+    """
+    Simulate the scenario without a display, timing only the ticks.
+    :param scenario: Scenario to run
+    :param ticks: Ticks per run
+    :param seed: Seed of the input script and the setup
+    :param repeat: Number of runs, the fastest is kept
+    :return: ticks_per_second and the number of bullets alive at the end
+    """
+    best = 0.0
+    for _ in range(repeat):
+        game = HeadlessGame(functools.partial(scenario.scene, map_name=scenario.map_name()))
+        script = scenario.script(seed)
+        rng = random.Random(seed)
+        elapsed = 0.0
+        for tick in range(ticks):
+            if scenario.setup:
+                scenario.setup(game.current_scene, rng)
+            keys = script(tick)
+            start = time.perf_counter()
+            game.step(keys)
+            elapsed += time.perf_counter() - start
+        best = max(best, ticks / elapsed if elapsed > 0 else float("inf"))
+    return {"ticks_per_second": best, "bullets": game.current_scene.bullets.count}
+
+
+def memory_pass(scenario: Scenario, ticks: int, seed: int) -> dict:
+    """
+    Simulate the scenario under tracemalloc. Much slower than the other passes, so its times are not used.
+    :param scenario: Scenario to run
+    :param ticks: Ticks to run
+    :param seed: Seed of the input script and the setup
+    :return: Peak traced memory over the run and the mean and largest memory allocated during a tick, in KiB
+    """
+    tracemalloc.start()
+    try:
+        game = HeadlessGame(functools.partial(scenario.scene, map_name=scenario.map_name()))
+        script = scenario.script(seed)
+        rng = random.Random(seed)
+        transient = np.zeros(ticks)
+        for tick in range(ticks):
+            if scenario.setup:
+                scenario.setup(game.current_scene, rng)
+            keys = script(tick)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            game.step(keys)
+            transient[tick] = tracemalloc.get_traced_memory()[1] - before
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_kib": peak / 1024, "tick_alloc_kib": float(transient.mean()) / 1024,
+            "tick_alloc_max_kib": float(transient.max()) / 1024}
+
+
+def render_pass(scenario: Scenario, frames: int, seed: int) -> dict:
+    """
+    Play the scenario in a real Game on the dummy video driver with the frame profiler attached and no frame cap.
+    :param scenario: Scenario to run
+    :param frames: Frames to run
+    :param seed: Seed of the input script and the setup
+    :return: frames_per_second and the mean and p50 in milliseconds of each group of phases
+    """
+    from game import Game
+
+    pygame.init()
+    game = Game()
+    game.current_scene = scenario.scene(game, map_name=scenario.map_name())
+    profiler = FrameProfiler(frames)
+    profiler.attach(game)
+
+    script = scenario.script(seed)
+    rng = random.Random(seed)
+    elapsed = 0.0
+    for tick in range(frames):
+        if scenario.setup:
+            scenario.setup(game.current_scene, rng)
+        keys = script(tick)
+        start = time.perf_counter()
+        game.pump_events()
+        game.current_scene.handle_events(keys)
+        game.current_scene.update()
+        game.present(game.current_scene.draw())
+        elapsed += time.perf_counter() - start
+    pygame.quit()
+
+    times = profiler.recent() * 1000
+    result = {"frames_per_second": frames / elapsed if elapsed > 0 else float("inf")}
+    for group, phases in GROUPS.items():
+        column = times[:, [PHASES.index(phase) for phase in phases]].sum(axis=1)
+        result[group + "_ms"] = {"mean": float(column.mean()), "p50": float(np.percentile(column, 50))}
+    return result
+
+
+def run_scenario(scenario: Scenario, seed: int = 0, repeat: int = 3, quick: bool = False) -> dict:
+    """
+    Run every pass of a scenario with its config overrides applied.
+    :param scenario: Scenario to run
+    :param seed: Seed of the input script and the setup
+    :param repeat: Number of headless and render runs, the fastest is kept
+    :param quick: Run a fifth of the ticks
+    :return: Results of all passes
+    """
+    ticks = max(scenario.ticks // 5, 1) if quick else scenario.ticks
+    with overridden(scenario.overrides):
+        result = {"ticks": ticks}
+        result.update(headless_pass(scenario, ticks, seed, repeat))
+        result.update(memory_pass(scenario, min(ticks, 600), seed))
+        renders = [render_pass(scenario, min(ticks, 600), seed) for _ in range(repeat)]
+        result.update(max(renders, key=lambda r: r["frames_per_second"]))
+    return result
+
+
+def machine() -> dict:
+    """
+    :return: Description of the machine and versions the benchmark ran on, stored with the baseline.
+    """
+    return {"platform": platform.platform(), "processor": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count(), "python": platform.python_version(), "numpy": np.__version__,
+            "pygame": pygame.version.ver}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    :param results: Results by scenario
+    :param baseline: Stored results by scenario
+    :param threshold: Allowed relative change in the wrong direction, 0.15 is 15 %
+    :return: One message per gated metric that got worse by more than the threshold.
+    """
+    failures = []
+    for name, result in results.items():
+        stored = baseline.get(name)
+        if stored is None:
+            continue
+        for metric, higher_is_better in GATED.items():
+            old, new = stored.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                failures.append(f"{name}: {metric} {old:.1f} -> {new:.1f} ({change:+.1%})")
+    return failures
+
+
+def report(name: str, result: dict, stored: dict | None) -> str:
+    """
+    :return: The results of a scenario as text, with the change from the baseline where there is one.
+    """
+    def value(metric: str, unit: str = "") -> str:
+        text = f"{result[metric]:.1f}{unit}"
+        if stored and stored.get(metric):
+            text += f" ({(result[metric] - stored[metric]) / stored[metric]:+.1%})"
+        return text
+
+    lines = [f"{name}: {SCENARIOS[name].description}, {result['ticks']} ticks",
+             f"    ticks/s {value('ticks_per_second')}   frames/s {value('frames_per_second')}",
+             f"    peak {value('peak_kib', ' KiB')}   per tick {result['tick_alloc_kib']:.1f} KiB"
+             f" (max {result['tick_alloc_max_kib']:.1f} KiB)",
+             "    " + "   ".join(f"{group} {result[group + '_ms']['mean']:.3f}/{result[group + '_ms']['p50']:.3f} ms"
+                                 for group in GROUPS) + "  (mean/p50)"]
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the benchmark scenarios and compare them against a baseline.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), default=None,
+                        help="scenario to run, can be given several times, all of them by default")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file to compare against or save to")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative regression that fails the run, 0.15 by default")
+    parser.add_argument("--repeat", type=int, default=3, help="headless and render runs per scenario, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="run a fifth of the ticks")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    stored = baseline.get("scenarios", {})
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_scenario(SCENARIOS[name], args.seed, args.repeat, args.quick)
+        print(report(name, results[name], stored.get(name)))
+
+    if args.save:
+        with open(args.baseline, "w") as file:
+            json.dump({"machine": machine(), "scenarios": {**stored, **results}}, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not stored:
+        print(f"No baseline at {args.baseline}, run with --save to store one")
+        return 0
+    if baseline.get("machine") != machine():
+        print("Warning: the baseline was stored on another machine or with other versions")
+
+    failures = compare(results, stored, args.threshold)
+    for failure in failures:
+        print("REGRESSION " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import functools
+import json
+import os
+import random
+import tempfile
+from typing import Any, Callable, NamedTuple
+import numpy as np
+from config import *
+from sim.headless import ScriptedKeys, NO_KEYS
+from scenes.local_game import LocalGame
+from scenes.fleet_game import FleetGame
+
+
+class Scenario(NamedTuple):
+    """
+    A scripted, seeded match to benchmark.
+
+    Attributes:
+        name        : Name used on the command line and in the baselines.
+        description : One line summary.
+        ticks       : Ticks simulated per run.
+        script      : Builds the input script from a seed, like the policies in sim.policies.
+        map_name    : Returns the map to play on, None for MAP. Generated maps are written when it is called.
+        overrides   : Config values to change while the scenario runs.
+        setup       : Called with the scene and a random generator before every tick, outside the timed part.
+        scene       : Scene class, called with the game and map_name.
+    """
+    name: str
+    description: str
+    ticks: int
+    script: Callable[[int], Callable[[int], ScriptedKeys]]
+    map_name: Callable[[], str | None] = lambda: None
+    overrides: dict[str, Any] = {}
+    setup: Callable[['LocalGame', random.Random], None] | None = None
+    scene: Callable = LocalGame
+
+
+def hover_script(seed: int) -> Callable[[int], ScriptedKeys]:
+    """
+    Player 1 pulses its engine just enough to hover over its fuel pad, player 2 sits on its pad.
+    """
+    hover = ScriptedKeys.from_actions([[True, False, False, False]])
+
+    def script(tick: int) -> ScriptedKeys:
+        return hover if tick % 12 < 3 else NO_KEYS
+    return script
+
+
+def dogfight_script(seed: int) -> Callable[[int], ScriptedKeys]:
+    """
+    Both players fire every time they can while boosting in bursts and turning towards each other.
+    """
+    rng = random.Random(seed)
+    current = NO_KEYS
+
+    def script(tick: int) -> ScriptedKeys:
+        nonlocal current
+        if tick % 20 == 0:
+            current = ScriptedKeys.from_actions(
+                [rng.random() < 0.5, rng.random() < 0.3, rng.random() < 0.3, True] for _ in PLAYER_CONTROLS)
+        return current
+    return script
+
+
+def stress_map(walls: int = 400) -> str:
+    """
+    Write a map with a grid of short walls above the spawn points. The file only depends on the wall count, so its
+    compiled cache is reused between runs.
+    :param walls: Number of walls
+    :return: Path of the map file
+    """
+    columns = int(np.ceil(np.sqrt(walls * 1.25)))
+    rows = int(np.ceil(walls / columns))
+    xs = np.linspace(60, RESOLUTION[0] - 60, columns)
+    ys = np.linspace(60, RESOLUTION[1] - 200, rows)
+    cells = [(float(x), float(y)) for y in ys for x in xs][:walls]
+
+    data = {"name": f"Stress {walls}", "border": True,
+            "spawns": [[150, 750], [850, 750]],
+            "walls": [{"id": str(i + 5), "pos": pos, "size": [24, 6] if i % 2 else [6, 24]}
+                      for i, pos in enumerate(cells)],
+            "fuel_pads": [{"id": "1", "pos": [150, 795], "size": [200, 10]},
+                          {"id": "2", "pos": [850, 795], "size": [200, 10]}]}
+
+    directory = os.path.join(tempfile.gettempdir(), "mayhem-bench")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"stress_{walls}.json")
+    with open(path, "w") as file:
+        json.dump(data, file)
+    return path
+
+
+def top_up_bullets(count: int) -> Callable[['LocalGame', random.Random], None]:
+    """
+    :param count: Number of live bullets to keep
+    :return: Setup that adds bullets at random positions and headings until there are count of them
+    """
+    def setup(scene: 'LocalGame', rng: random.Random) -> None:
+        bullets = scene.bullets
+        missing = count - bullets.count
+        if missing <= 0:
+            return
+
+        n = bullets.count
+        generator = np.random.default_rng(rng.getrandbits(32))
+        pos = generator.uniform((20, 20), (RESOLUTION[0] - 20, RESOLUTION[1] - 20), (missing, 2))
+        angle = generator.uniform(0, 2 * np.pi, missing)
+        speed = generator.uniform(2, BULLET_SPEED, missing)
+        velocity = np.column_stack([np.cos(angle), np.sin(angle)]) * speed[:, None]
+
+        # New owners are added to the end of the owner table, so the bullets already flying keep their index
+        players = sorted(scene.players, key=lambda p: p.id)
+        owners = list(bullets.owners) + [p for p in players if p not in bullets.owners]
+        shooters = np.array([owners.index(p) for p in players], dtype=np.int32)
+        owner = np.concatenate([bullets.owner[:n], shooters[generator.integers(0, len(players), missing)]])
+
+        bullets.restore(np.concatenate([bullets.pos[:n], pos]), np.concatenate([bullets.velocity[:n], velocity]),
+                        np.concatenate([bullets.speed[:n], speed]),
+                        np.concatenate([bullets.distance_traveled[:n], np.zeros(missing)]), owner, owners)
+    return setup
+
+
+SCENARIOS = {s.name: s for s in [
+    Scenario("hover", "Player 1 hovers over its fuel pad, player 2 stays landed", 3000, hover_script),
+    Scenario("dogfight", "Both players boost, turn and fire constantly", 3000, dogfight_script,
+             overrides={"SHOOT_COOLDOWN": 5}),
+    Scenario("stress", "400 walls and 2000 long-lived bullets", 300, dogfight_script,
+             map_name=lambda: stress_map(400), setup=top_up_bullets(2000)),
+    Scenario("fleet", "128 ships, all bots when headless", 1200, dogfight_script,
+             scene=functools.partial(FleetGame, ships=128)),
+    Scenario("caverns", "1024 ships on a map 3x2.5 the window, drawn through a scrolling camera", 600,
+             dogfight_script, map_name=lambda: "caverns", scene=functools.partial(FleetGame, ships=1024)),
+]}
+
@@ -4,14 +4,39 @@ import pygame
 
 SHOW_FPS = False
 DEBUG_MODE = False
+HUD_TEXT_CACHE_SIZE = 128
+PROFILE_PHASES = False
+PROFILE_FRAMES = 600
+PROFILE_EXPORT = None  # "frames.csv" or "frames.json" to save the profiled frames on exit
+REPORT_STARTUP = False  # Print the time from launch to the first frame
+ASSET_CACHE_DIR = None  # None keeps resolved font paths in a .cache folder next to main.py
 
 # BACKGROUND
 RESOLUTION = (1000, 800)
 BACKGROUND_COLOR = (120, 180, 200)
-FPS = 60
+
+# TIMING
+TICK_RATE = 60  # Simulation ticks per second, speeds and cooldowns are per tick
+FPS = 60  # Frames drawn per second at most, 0 draws as fast as possible
+MAX_FRAME_TIME = 0.25  # Longest frame simulated in full, the game slows down instead of catching up past it
+MAX_FRAME_SKIP = 5  # Frames in a row that can go undrawn while the simulation catches up
+INTERPOLATE = True  # Draw players and bullets between the last two ticks
+PIPELINE_RENDER = False  # Simulate the next ticks on a second thread while a frame is drawn, frames show a frame late
+
+# RENDER
+WINDOW_RESIZABLE = False  # Let the window be resized, frames are scaled to fit it
+RENDER_SCALES = (1.0,)  # Sizes frames are drawn at as a share of RESOLUTION, the next one is used when drawing is slow
+RENDER_BUDGET = 0.5  # Share of a frame at FPS drawing and presenting may take before frames are drawn smaller
+SMOOTH_SCALING = True  # Filter frames and sprites when scaling them, slower but less blocky
+GPU_SCALING = False  # Let SDL scale frames drawn at the first of the RENDER_SCALES to the window
+
+# CAMERA
+SPLIT_SCREEN = False  # A view of its own for each keyboard player, side by side, instead of one view for everyone
+STATIC_CHUNK_SIZE = 256  # Width and height of the squares walls and fuel pads of maps larger than the window are drawn in
+STATIC_CHUNK_MARGIN = 1  # Squares kept rendered around each view, squares further away are dropped
 
 # PLAYER
-G_ACCELERATION = 9.8/FPS
+G_ACCELERATION = 9.8/TICK_RATE
 SPEED_ACCELERATION = 0.5
 AIR_FRICTION = 0.1
 TERMINAL_VELOCITY = 7
@@ -20,7 +45,7 @@ HP = 1000
 FUEL = 10000
 MAX_LANDING_ANGLE = 40
 MAX_LANDING_SPEED = 3
-RESPAWN_POINT = [[150, 750], [850, 750]]
+ROTATION_STEP = 5
 SIZE = [15, 20]
 COLOR = ("black")
 
@@ -29,6 +54,62 @@ SHOOT_COOLDOWN = 30
 BULLET_SPEED = 10
 MAX_TRAVEL_DISTANCE = 100
 BULLET_SIZE = 10
+BULLET_CAPACITY = 256
+
+# PARTICLES
+PARTICLES = True  # Thrust exhaust, bullet impacts and explosions, they are only drawn and never change a match
+PARTICLE_BUDGET = 4000  # Most particles alive at once, effects thin out the fuller it gets
+PARTICLE_FADE_STEPS = 8  # Images of each particle as it shrinks and fades
+
+# FLEET
+FLEET_SHIPS = 0  # 0 plays the two player match, more fills the map with that many ships, most of them bots
+FLEET_BOT_HOLD = 15  # Ticks a bot holds a set of keys
+
+# BOTS
+BOT_PLAYERS = ()  # Ids of the players a bot plays in the two player match, (1,) puts a bot against player 1
+FLEET_BOTS = "random"  # How fleet bots play: "random" keys or "nav" to fly like BOT_PLAYERS
+BOT_SPEED = 3  # Speed bots fly at on the way to a target
+BOT_LOOKAHEAD = 10  # Ticks ahead bots look for walls
+BOT_REFUEL = 0.3  # Share of FUEL left when a bot heads back to a fuel pad
+BOT_SHOOT_RANGE = 90  # Distance a bot turns to face its target and shoots from
+BOT_AIM_ANGLE = 8  # Degrees a bot can be off its target and still shoot
+NAV_CELL_SIZE = 20  # Size of the navigation grid cells, in pixels
+NAV_CLEARANCE = 14  # Distance from a wall a ship's center keeps to, in pixels
+NAV_WALL_COST = 2  # Extra cost of a path through a cell next to a wall, bots keep to open space
+NAV_SECTOR_SIZE = 8  # Width and height in cells of the squares bots are led to, a distance field to each is compiled
+NAV_FIELD_CACHE = 256  # Flows of the sectors kept per map, the rest are worked out again from the compiled distances
+
+# MAP
+MAP = "default"
+MAP_CACHE_DIR = None  # None keeps compiled maps in a .cache folder next to the map file
+
+# COLLISION
+MASK_COLLISIONS = True  # Test the pixels of ships that overlap something, not only their bounding rects
+SPATIAL_HASH_CELL_SIZE = 64
+BROADPHASE_MIN_PAIRS = 65536
+SWEEP_MAX_STEP = 32
+
+# REPLAY
+RECORD_REPLAYS = False
+REPLAY_DIR = "replays"
+REPLAY_KEYFRAME_INTERVAL = 10*TICK_RATE
+REPLAY_BUFFER_TICKS = 4096
+
+# TELEMETRY
+RECORD_TELEMETRY = False  # Stream every shot, hit, score change, bounce, landing, crash and refill to a file
+TELEMETRY_DIR = "telemetry"
+TELEMETRY_CHUNK_ROWS = 4096  # Events per chunk, chunks are written whole on a thread of their own
+TELEMETRY_CHUNKS = 4  # Chunks kept in memory, events are dropped and counted while all of them wait to be written
+
+# ROLLBACK
+SNAPSHOT_RING_SIZE = 8
+
+# NETWORK
+NET_HOST = "127.0.0.1"
+NET_PORT = 7777
+NET_INTERPOLATION_TICKS = 3
+NET_STATE_HISTORY = 64
+NET_TIMEOUT = 5
 
 # PLAYER 1 CONTROLS
 LEFT_KEY_P1 = pygame.K_a
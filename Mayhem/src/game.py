@@ -1,5 +1,8 @@
 """Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import time
+from typing import Callable
 from scenes.local_game import LocalGame
+from render.viewport import Viewport
 from config import *
 
 
@@ -11,36 +14,178 @@ class Game:
     --------
         __init__    : Initializes game.
         run         : Game loop.
+        step        : Simulate a single tick.
+        pump_events : Handle the window events.
+        present     : Push the drawn frame to the display.
+        use_canvas  : Draw the next frames on the current canvas of the viewport.
     """
 
-    def __init__(self) -> None:
-        """Initializes game"""
+    def __init__(self, started: float = None, scene: Callable[['Game'], object] = None) -> None:
+        """
+        Initializes game
+        :param started: time.perf_counter() when the program was launched, to report the time to the first frame
+        :param scene: Builds the scene to play from the game, like a NetworkGame. A local match by default.
+        """
+        self.started = started
+        self.first_frame = None
+
         #Screen size
         self.resolution = RESOLUTION
+        self.headless = False
 
-        # Define the Program Window
-        self.screen = pygame.display.set_mode(self.resolution)
+        # Define the Program Window, frames are drawn on the canvas of the viewport and scaled up to the window
+        self.viewport = Viewport(self.resolution)
+        self.screen = self.viewport.canvas
         pygame.display.set_caption('ROCKETS!!!!')
 
         self.running = True
         self.clock = pygame.time.Clock()
+        self.tick = 0
+
+        # Current Match. Modules only some settings use are imported when they are used, to start up faster.
+        local = scene is None
+        if not local:
+            self.current_scene = scene(self)
+        elif FLEET_SHIPS:
+            from scenes.fleet_game import FleetGame
+            self.current_scene = FleetGame(self)
+        else:
+            self.current_scene = LocalGame(self)
 
-        # Current Match
-        self.current_scene = LocalGame(self)   
+        # Every tick of input is streamed to a replay file while the match is played, replays hold two player matches.
+        # Only local matches are recorded, other scenes are simulated elsewhere.
+        self.recorder = None
+        if RECORD_REPLAYS and local and not FLEET_SHIPS:
+            from sim.replay import ReplayRecorder, new_replay_path
+            self.recorder = ReplayRecorder(new_replay_path(), self.current_scene)
+
+        # Shots, hits, landings and crashes are streamed to a telemetry file, written on a thread of its own
+        self.telemetry = None
+        if RECORD_TELEMETRY and local:
+            from sim.telemetry import TelemetryBus, new_telemetry_path
+            ships = FLEET_SHIPS or len(self.current_scene.players)
+            self.telemetry = self.current_scene.telemetry = TelemetryBus(new_telemetry_path(), ships)
+
+        # Phase timers are only wrapped around the loop when profiling, otherwise nothing changes
+        self.profiler = None
+        if PROFILE_PHASES:
+            from profiling.frame_profiler import FrameProfiler
+            self.profiler = FrameProfiler(PROFILE_FRAMES)
+            self.profiler.attach(self)
 
     def run(self) -> None:
         """
-        Game loop
+        Game loop: the match is simulated TICK_RATE times per second whatever the frame rate, and each frame is drawn
+        between the last two ticks.
+
+        Real time is added to an accumulator every frame and spent in whole ticks, so a slow frame is followed by extra
+        ticks instead of slowing the match down. While the simulation is behind, up to MAX_FRAME_SKIP frames in a row
+        are not drawn so the time goes to catching up. With PIPELINE_RENDER the ticks run on a SimulationThread while
+        the frame before them is drawn.
         :return:
         """
+        tick_time = 1 / TICK_RATE
+        accumulator = 0.0
+        skipped = 0
+
+        # The phase timers time one thread, so the match is never pipelined while profiling. Network matches are
+        # simulated by the server and have no frame state to copy.
+        simulation = None
+        if PIPELINE_RENDER and self.profiler is None and hasattr(self.current_scene, "capture"):
+            from sim.pipeline import SimulationThread
+            simulation = SimulationThread(self)
+
+        previous = time.perf_counter()
         while self.running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
+            now = time.perf_counter()
+            accumulator += min(now - previous, MAX_FRAME_TIME)
+            previous = now
+
+            self.pump_events()
+
+            keys = pygame.key.get_pressed()
+            ticks = 0
+            while accumulator >= tick_time:
+                ticks += 1
+                accumulator -= tick_time
+            alpha = accumulator / tick_time if INTERPOLATE else 1.0
+
+            # Pipelined, the ticks are simulated while the state of the previous frame is drawn
+            state = None
+            if simulation:
+                state, alpha = simulation.advance(keys, ticks, alpha)
+            else:
+                for _ in range(ticks):
+                    self.step(keys)
 
-            self.current_scene.handle_events(pygame.key.get_pressed())
-            self.current_scene.update()
+            # Another tick is already due, so this frame would be out of date before it is shown
+            if accumulator + time.perf_counter() - now >= tick_time and skipped < MAX_FRAME_SKIP:
+                skipped += 1
+                continue
+            skipped = 0
+
+            started = time.perf_counter()
+            changed = self.current_scene.draw(alpha, state)
+            drawing = time.perf_counter() - started
             self.clock.tick(FPS)
-            pygame.display.flip()
+            started = time.perf_counter()
+            self.present(changed)
+
+            # Frames are drawn smaller while they take too long, see Viewport
+            if self.viewport.adapt(drawing + time.perf_counter() - started):
+                self.use_canvas()
 
+            if self.first_frame is None and self.started is not None:
+                self.first_frame = time.perf_counter() - self.started
+                if REPORT_STARTUP:
+                    print(f"First frame {self.first_frame * 1000:.0f} ms after launch")
+
+        if simulation:
+            simulation.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.telemetry:
+            self.telemetry.close()
+        if self.profiler and PROFILE_EXPORT:
+            self.profiler.export(PROFILE_EXPORT)
         pygame.quit()
+
+    def step(self, keys: tuple[bool, ...]) -> None:
+        """
+        Simulate a single tick.
+        :param keys: keyboard
+        :return:
+        """
+        if self.recorder:
+            self.recorder.record(keys)
+        self.current_scene.handle_events(keys)
+        self.current_scene.update()
+        self.tick += 1
+
+    def pump_events(self) -> None:
+        """
+        Handle the window events.
+        :return:
+        """
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.VIDEORESIZE and self.viewport.resize():
+                self.use_canvas()
+
+    def present(self, changed: list[pygame.Rect] | None) -> None:
+        """
+        Push the drawn frame to the display.
+        :param changed: Areas of the screen that changed, None if the whole screen changed
+        :return:
+        """
+        self.viewport.present(changed)
+
+    def use_canvas(self) -> None:
+        """
+        Draw the next frames on the current canvas of the viewport, the first of them in full as the areas drawn last
+        frame were on the old canvas.
+        :return:
+        """
+        self.screen = self.viewport.canvas
+        self.current_scene.dirty_rects = None
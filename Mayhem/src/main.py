@@ -1,12 +1,19 @@
 """Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import time
+
+# Taken before anything else is imported, so the startup report includes the imports
+STARTED = time.perf_counter()
+
 import pygame
 from game import Game
 
 
 def main() -> None:
 
-    pygame.init()
-    game = Game()
+    # Only the modules the game uses, pygame.init() would also open the audio device
+    pygame.display.init()
+    pygame.font.init()
+    game = Game(STARTED)
     game.run()
     pygame.quit()
 
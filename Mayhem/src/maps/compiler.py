@@ -0,0 +1,314 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import hashlib
+import json
+import mmap
+import os
+import numpy as np
+import pygame
+from config import *
+from physics.spatial_hash import RectIndex
+from maps.navigation import NavGrid, compile_navigation
+from sprites.object import Object
+from sprites.fuel_pad import FuelPad
+from sprites.static_group import StaticGroup
+
+# Bump when the layout of the cache files changes, every cached map is then compiled again
+FORMAT_VERSION = 5
+MAGIC = b"MAYHEMMP"
+ALIGNMENT = 64
+
+# Arrays of the navigation cache, in the order NavGrid takes them
+NAV_ARRAYS = ("nav_blocked", "nav_clearance", "nav_pads", "nav_escape", "nav_sectors", "nav_sector_goals")
+
+MAP_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Maps already loaded by this process, by path
+_loaded = {}
+
+
+class CompiledMap:
+    """
+    A map file compiled into arrays, loaded from a memory-mapped cache file when one with the same key exists.
+
+    Attributes:
+        name            : Map name, the file name without .json.
+        key             : Hash of the map file and every setting the compiled data depends on.
+        resolution      : Size of the window the map was compiled for.
+        size            : Size of the world, the border walls go around it. The resolution unless the map file has a
+                          size of its own.
+        walls           : Id, center and size of every wall, border walls first.
+        pads            : Id, center and size of every fuel pad.
+        spawn_points    : (players, 2) array of respawn points, indexed by player id.
+        wall_index      : RectIndex of the walls, in the same order.
+        layer_pixels    : (height, width, 3) RGB pixels of the background, walls and fuel pads, empty when the world
+                          is not the size of the window.
+        nav_cache       : (prefix, key, path) of the cache file of the navigation grid, as taken by _write_cache. Set
+                          by load_map, None compiles the grid without caching it.
+
+    Methods:
+    -------
+    __init__        : Wrap compiled arrays.
+    objects         : New wall sprites for a match.
+    fuel_pads       : New fuel pad sprites for a match.
+    layer_surface   : The pre-rendered static layer as a new surface.
+    navigation      : The navigation grid bots fly with.
+    """
+
+    def __init__(self, name: str, key: str, header: dict, arrays: dict[str, np.ndarray], buffer=None) -> None:
+        """
+        Wrap compiled arrays.
+        :param name: Map name
+        :param key: Hash the data was compiled for
+        :param header: resolution, size, walls and pads
+        :param arrays: spawn_points, wall rects and index arrays and layer pixels
+        :param buffer: The memory map the arrays are views of, kept open as long as the map is
+        """
+        self.name = name
+        self.key = key
+        self.resolution = tuple(header["resolution"])
+        self.size = tuple(header["size"])
+        self.walls = header["walls"]
+        self.pads = header["pads"]
+        self.spawn_points = arrays["spawn_points"]
+        self.wall_index = RectIndex.from_arrays(arrays["wall_rects"], SPATIAL_HASH_CELL_SIZE, header["margin"],
+                                                arrays["wall_origin"], tuple(header["shape"]),
+                                                arrays["cell_start"], arrays["cell_items"])
+        self.layer_pixels = arrays["layer_pixels"]
+        self.nav_cache = None
+        self._navigation = None
+        self._buffer = buffer
+        self._nav_buffer = None
+
+    def objects(self) -> StaticGroup:
+        """
+        :return: New wall sprites for a match, their images are only created if they are drawn.
+        """
+        return StaticGroup(Object(id, pos, size) for id, pos, size in self.walls)
+
+    def fuel_pads(self) -> StaticGroup:
+        """
+        :return: New fuel pad sprites for a match.
+        """
+        return StaticGroup(FuelPad(id, pos, size) for id, pos, size in self.pads)
+
+    def layer_surface(self) -> pygame.Surface | None:
+        """
+        :return: The pre-rendered background, walls and fuel pads as a new surface. None for worlds larger than the
+        window, they are rendered in chunks as they scroll into view instead, see ChunkedLayer.
+        """
+        height, width, _ = self.layer_pixels.shape
+        if not width:
+            return None
+        surface = pygame.image.frombuffer(memoryview(self.layer_pixels).cast("B"), (width, height), "RGB")
+        return surface.convert() if pygame.display.get_surface() is not None else surface.copy()
+
+    def navigation(self) -> NavGrid:
+        """
+        The navigation grid of the map, shared by every match played on it in this process. Only bots use it, so it is
+        compiled into a cache file of its own the first time they do, and maps played without bots never pay for it.
+        :return: NavGrid
+        """
+        if self._navigation is None:
+            try:
+                if self.nav_cache is None:
+                    raise OSError("The navigation grid of this map is not cached")
+                _, arrays, self._nav_buffer = _read_cache(*self.nav_cache[1:])
+            except (OSError, ValueError):
+                arrays = compile_navigation(self.size, _rects(self.walls), _rects(self.pads))
+                if self.nav_cache is not None:
+                    _write_cache(*self.nav_cache[:2], {}, arrays, self.nav_cache[2])
+            self._navigation = NavGrid(*(arrays[name] for name in NAV_ARRAYS))
+        return self._navigation
+
+
+def map_path(name: str) -> str:
+    """
+    :param name: Map name, or a path to a map file.
+    :return: Path of the map file.
+    """
+    if name.endswith(".json"):
+        return name
+    return os.path.join(MAP_SOURCE_DIR, name + ".json")
+
+
+def load_map(name: str, resolution: tuple[int, int] = RESOLUTION) -> CompiledMap:
+    """
+    Load a map, compiling it only if no cache file exists for its current contents and settings.
+    :param name: Map name or path to a map file
+    :param resolution: Size of the playfield
+    :return: CompiledMap
+    """
+    path = map_path(name)
+    with open(path, "rb") as file:
+        source = file.read()
+    settings = _settings_key(resolution)
+    key = hashlib.sha256(source + settings.encode()).hexdigest()
+
+    loaded = _loaded.get(path)
+    if loaded is not None and loaded.key == key:
+        return loaded
+
+    map_name = os.path.splitext(os.path.basename(path))[0]
+    cache_dir = os.path.join(os.path.dirname(path), ".cache") if MAP_CACHE_DIR is None else MAP_CACHE_DIR
+    cache = os.path.join(cache_dir, f"{map_name}-{settings[:8]}-{key[:16]}.bin")
+    try:
+        compiled = CompiledMap(map_name, key, *_read_cache(key, cache))
+    except (OSError, ValueError):
+        header, arrays = compile_map(json.loads(source), resolution)
+        _write_cache(f"{map_name}-{settings[:8]}", key, header, arrays, cache)
+        compiled = CompiledMap(map_name, key, header, arrays)
+
+    # The navigation grid is cached apart, keyed only on what it depends on, see CompiledMap.navigation
+    nav_settings = _navigation_key(resolution)
+    nav_key = hashlib.sha256(source + nav_settings.encode()).hexdigest()
+    nav_prefix = f"{map_name}-nav-{nav_settings[:8]}"
+    compiled.nav_cache = (nav_prefix, nav_key, os.path.join(cache_dir, f"{nav_prefix}-{nav_key[:16]}.bin"))
+
+    _loaded[path] = compiled
+    return compiled
+
+
+def _settings_key(resolution: tuple[int, int]) -> str:
+    """
+    :return: Hash of every setting the compiled data depends on. Caches of a map are kept apart by it, so processes
+        playing the same map with other settings each keep their own.
+    """
+    settings = [FORMAT_VERSION, list(resolution), SPATIAL_HASH_CELL_SIZE, BULLET_SIZE, SWEEP_MAX_STEP,
+                list(BACKGROUND_COLOR), list(Object.COLOR), list(FuelPad.COLOR)]
+    return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
+
+def _navigation_key(resolution: tuple[int, int]) -> str:
+    """
+    :return: Hash of every setting the navigation grid depends on, so sweeps over other settings share its cache.
+    """
+    settings = [FORMAT_VERSION, list(resolution), NAV_CELL_SIZE, NAV_CLEARANCE, NAV_WALL_COST, NAV_SECTOR_SIZE]
+    return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
+
+def _rects(items: list) -> list[pygame.Rect]:
+    """
+    :param items: Id, center and size of walls or fuel pads
+    :return: Their rects, centered the same way BaseObject centers them
+    """
+    rects = [pygame.Rect((0, 0), size) for _, _, size in items]
+    for rect, (_, pos, _) in zip(rects, items):
+        rect.center = pos
+    return rects
+
+
+def compile_map(data: dict, resolution: tuple[int, int]) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Turn a map description into the arrays a match needs.
+    :param data: Parsed map file
+    :param resolution: Size of the window, and of the world unless the map has a size
+    :return: (header, arrays) as taken by CompiledMap, the navigation grid is compiled apart by CompiledMap.navigation
+    """
+    width, height = size = tuple(data.get("size", resolution))
+    walls = []
+    if data.get("border", True):
+        walls += [["1", [width/2, height+10], [width, 40]],
+                  ["2", [-10, height/2], [40, height]],
+                  ["3", [width+10, height/2], [40, height]],
+                  ["4", [width/2, -10], [width, 40]]]
+    walls += [[str(w["id"]), w["pos"], w["size"]] for w in data.get("walls", [])]
+    pads = [[str(p["id"]), p["pos"], p["size"]] for p in data.get("fuel_pads", [])]
+
+    for kind, items in (("wall", walls), ("fuel pad", pads)):
+        ids = [id for id, _, _ in items]
+        duplicates = sorted({id for id in ids if ids.count(id) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate {kind} ids in map: {', '.join(duplicates)}")
+
+    spawns = data.get("spawns", [])
+    if len(spawns) < len(PLAYER_CONTROLS):
+        raise ValueError(f"The map needs a spawn point for each of the {len(PLAYER_CONTROLS)} players")
+
+    wall_rects = _rects(walls)
+    pad_rects = _rects(pads)
+
+    index = RectIndex(wall_rects, SPATIAL_HASH_CELL_SIZE, margin=BULLET_SIZE / 2 + SWEEP_MAX_STEP)
+
+    # A world the size of the window is drawn from one pre-rendered layer. Rects are clipped first, Surface.fill
+    # colors pixels past the edge of rects that start off the surface.
+    pixels = np.zeros((0, 0, 3), dtype=np.uint8)
+    if size == tuple(resolution):
+        layer = pygame.Surface(resolution)
+        layer.fill(BACKGROUND_COLOR)
+        bounds = layer.get_rect()
+        for rect in wall_rects:
+            layer.fill(Object.COLOR, rect.clip(bounds))
+        for rect in pad_rects:
+            layer.fill(FuelPad.COLOR, rect.clip(bounds))
+        pixels = np.frombuffer(pygame.image.tobytes(layer, "RGB"), dtype=np.uint8).reshape(height, width, 3)
+
+    header = {"resolution": list(resolution), "size": list(size), "walls": walls, "pads": pads,
+              "margin": index.margin, "shape": list(index.shape)}
+    arrays = {"spawn_points": np.array(spawns, dtype=float).reshape(-1, 2),
+              "wall_rects": index.rects,
+              "wall_origin": index.origin,
+              "cell_start": index.cell_start.astype(np.int64),
+              "cell_items": index.cell_items.astype(np.int64),
+              "layer_pixels": pixels}
+    return header, arrays
+
+
+def _write_cache(prefix: str, key: str, header: dict, arrays: dict[str, np.ndarray], path: str) -> None:
+    """
+    Write a compiled map, or its navigation grid, as MAGIC, the header length, a JSON header and the arrays, each aligned so they can be
+    viewed straight out of a memory map. Cache files of older versions of the map with the same settings are removed,
+    caches of other settings may be in use by other processes. Every process writes to a temporary file of its own
+    first. A cache directory that can't be written to is not an error, the map is then compiled again by the next
+    process.
+    """
+    layout = []
+    offset = 0
+    for array_name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout.append([array_name, array.dtype.str, list(array.shape), offset])
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    meta = json.dumps({"key": key, "header": header, "arrays": layout}).encode()
+    start = -(-(len(MAGIC) + 8 + len(meta)) // ALIGNMENT) * ALIGNMENT
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(MAGIC + len(meta).to_bytes(8, "little") + meta)
+            for (_, _, _, array_offset), array in zip(layout, arrays.values()):
+                file.seek(start + array_offset)
+                file.write(np.ascontiguousarray(array).tobytes())
+            file.truncate(start + offset)
+        os.replace(temporary, path)
+
+        for old in os.listdir(os.path.dirname(path)):
+            if old.startswith(prefix + "-") and old.endswith(".bin") and old != os.path.basename(path):
+                os.remove(os.path.join(os.path.dirname(path), old))
+    except OSError:
+        pass
+
+
+def _read_cache(key: str, path: str) -> tuple[dict, dict[str, np.ndarray], mmap.mmap]:
+    """
+    Memory-map a cache file, the arrays are views of the file and are only read from disk when used.
+    :return: (header, arrays, buffer) the memory map the arrays are views of
+    :raise OSError: The file does not exist.
+    :raise ValueError: The file is not a cache of this map.
+    """
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a compiled map")
+    length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8], "little")
+    meta = json.loads(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+    if meta["key"] != key:
+        raise ValueError(f"{path} was compiled from another version of the map")
+
+    start = -(-(len(MAGIC) + 8 + length) // ALIGNMENT) * ALIGNMENT
+    arrays = {}
+    for array_name, dtype, shape, offset in meta["arrays"]:
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[array_name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=start + offset).reshape(shape)
+    return meta["header"], arrays, buffer
@@ -0,0 +1,265 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import numpy as np
+from config import *
+
+# Steps to the eight neighbouring cells as (row, column), and the length of each step
+NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+STEP_COSTS = [float(np.hypot(row, column)) for row, column in NEIGHBOURS]
+
+
+def compile_navigation(size: tuple[int, int], wall_rects: list, pad_rects: list) -> dict[str, np.ndarray]:
+    """
+    Build the navigation grid of a map: which cells a ship can fly through, and the distance fields every match on the
+    map uses, so they are cached with the compiled map instead of being searched again.
+    :param size: Size of the world
+    :param wall_rects: pygame.Rect of every wall
+    :param pad_rects: pygame.Rect of every fuel pad
+    :return: nav_blocked, nav_clearance, nav_pads and nav_escape grids, indexed [row, column], and the
+    nav_sectors distance fields with the nav_sector_goals cell each of them leads to
+    """
+    width, height = size
+    shape = (-(-height // NAV_CELL_SIZE), -(-width // NAV_CELL_SIZE))
+    xs = (np.arange(shape[1]) + 0.5) * NAV_CELL_SIZE
+    ys = (np.arange(shape[0]) + 0.5) * NAV_CELL_SIZE
+
+    # A cell is blocked if a ship centered on it could touch a wall or a fuel pad, ships only touch pads to land
+    blocked = np.zeros(shape, dtype=bool)
+    for rect in wall_rects + pad_rects:
+        columns = slice(*np.searchsorted(xs, [rect.left - NAV_CLEARANCE, rect.right + NAV_CLEARANCE]))
+        rows = slice(*np.searchsorted(ys, [rect.top - NAV_CLEARANCE, rect.bottom + NAV_CLEARANCE]))
+        blocked[rows, columns] = True
+
+    # Ships refuel from the free cells right above a pad
+    goals = np.zeros(shape, dtype=bool)
+    for rect in pad_rects:
+        columns = slice(*np.searchsorted(xs, [rect.left, rect.right]))
+        rows = slice(*np.searchsorted(ys, [rect.top - NAV_CLEARANCE - NAV_CELL_SIZE, rect.top]))
+        goals[rows, columns] = True
+    goals &= ~blocked
+
+    open_grid = np.zeros(shape, dtype=bool)
+    clearance = distance_field(open_grid, blocked)
+    costs = path_costs(clearance)
+    sector_goals = sector_cells(blocked)
+    sector_targets = np.zeros((len(sector_goals), *shape), dtype=bool)
+    sector_targets[np.arange(len(sector_goals)), sector_goals[:, 0], sector_goals[:, 1]] = True
+    sectors = distance_fields(blocked, sector_targets, costs).astype(np.float32)
+    return {"nav_blocked": blocked,
+            "nav_clearance": clearance.astype(np.float32),
+            "nav_pads": distance_field(blocked, goals, costs).astype(np.float32),
+            "nav_escape": distance_field(open_grid, ~blocked).astype(np.float32),
+            "nav_sectors": sectors,
+            "nav_sector_goals": sector_goals}
+
+
+def sector_cells(blocked: np.ndarray) -> np.ndarray:
+    """
+    :param blocked: Blocked cells of the grid
+    :return: (sectors, 2) [row, column] of the cell the way to each NAV_SECTOR_SIZE square of cells leads to, row by
+    row: the free cell closest to the middle of the sector, or the middle itself if every cell is blocked.
+    """
+    rows, columns = blocked.shape
+    cells = []
+    for top in range(0, rows, NAV_SECTOR_SIZE):
+        for left in range(0, columns, NAV_SECTOR_SIZE):
+            area = blocked[top:top + NAV_SECTOR_SIZE, left:left + NAV_SECTOR_SIZE]
+            row, column = np.indices(area.shape)
+            middle = ((area.shape[0] - 1) / 2, (area.shape[1] - 1) / 2)
+            gap = (row - middle[0]) ** 2 + (column - middle[1]) ** 2 + np.where(area, np.inf, 0)
+            if np.isinf(gap).all():
+                gap = (row - middle[0]) ** 2 + (column - middle[1]) ** 2
+            best = np.unravel_index(np.argmin(gap), area.shape)
+            cells.append((top + best[0], left + best[1]))
+    return np.array(cells, dtype=np.int64).reshape(-1, 2)
+
+
+def path_costs(clearance: np.ndarray) -> np.ndarray:
+    """
+    :param clearance: Distance in cells from every cell to the nearest blocked one
+    :return: Cost of flying through each cell, higher next to walls so paths keep to open space where they can.
+    """
+    return 1 + NAV_WALL_COST / np.maximum(clearance, 1)
+
+
+def distance_field(blocked: np.ndarray, goals: np.ndarray, costs: np.ndarray = None) -> np.ndarray:
+    """
+    Cost of the cheapest path from every cell to the nearest goal, see distance_fields.
+    :param blocked: Cells that can't be passed through
+    :param goals: Cells the paths lead to, a blocked goal can still be reached
+    :param costs: Cost of a step out of each cell, 1 everywhere by default so the distance is in cells
+    :return: Distance of every cell, inf where no goal can be reached
+    """
+    return distance_fields(blocked, goals[None], costs)[0]
+
+
+def distance_fields(blocked: np.ndarray, goals: np.ndarray, costs: np.ndarray = None) -> np.ndarray:
+    """
+    Cost of the cheapest path from every cell to the nearest goal, moving between neighbouring cells, for many sets of
+    goals on the same grid at once. A step from a cell to a neighbour costs its length times the cost of the cell it
+    leaves.
+
+    The grid is swept down, up, right and left, each sweep carrying the distances one row or column further from the
+    row or column before it, and the sweeps are repeated until nothing changes. A path only needs another round of
+    sweeps where it turns back against all four of them, so a few rounds cover most maps, and every field is swept
+    together.
+    :param blocked: Cells that can't be passed through
+    :param goals: (fields, rows, columns) cells the paths of each field lead to, a blocked goal can still be reached
+    :param costs: Cost of a step out of each cell, 1 everywhere by default so the distance is in cells
+    :return: (fields, rows, columns) distance of every cell, inf where no goal can be reached
+    """
+    rows, columns = blocked.shape
+    costs = np.ones(blocked.shape) if costs is None else costs
+
+    # Steps out of a blocked cell cost inf, so only goals are ever passed through in one
+    straight = np.where(blocked, np.inf, costs)
+    diagonal = straight * STEP_COSTS[0]
+
+    # Padded with inf, so the neighbours of the edge cells need no special case. Columns are swept as the rows of the
+    # transposed grid.
+    distance = np.full((len(goals), rows + 2, columns + 2), np.inf)
+    inner = distance[:, 1:-1, 1:-1]
+    inner[goals] = 0.0
+    while True:
+        before = inner.copy()
+        _sweep_rows(distance, straight, diagonal)
+        _sweep_rows(distance.transpose(0, 2, 1), straight.T, diagonal.T)
+        if np.array_equal(inner, before):
+            return before
+
+
+def _sweep_rows(distance: np.ndarray, straight: np.ndarray, diagonal: np.ndarray) -> None:
+    """
+    Carry distances down the rows of padded fields, then back up, each row reached from the three cells next to it in
+    the row before.
+    :param distance: (fields, rows + 2, columns + 2) padded distance fields, updated in place
+    :param straight: (rows, columns) cost of a straight step out of each cell
+    :param diagonal: (rows, columns) cost of a diagonal step out of each cell
+    :return:
+    """
+    rows = len(straight)
+    for order, step in ((range(1, rows), -1), (range(rows - 2, -1, -1), 1)):
+        for index in order:
+            previous = distance[:, index + 1 + step]
+            reached = np.minimum(previous[:, :-2], previous[:, 2:])
+            reached += diagonal[index]
+            np.minimum(reached, previous[:, 1:-1] + straight[index], out=reached)
+            current = distance[:, index + 1, 1:-1]
+            np.minimum(current, reached, out=current)
+
+
+def flow_field(distance: np.ndarray) -> np.ndarray:
+    """
+    :param distance: A distance field
+    :return: (rows, columns, 2) step [x, y] in cells from every cell to its neighbour closest to a goal, zero on the
+    goals and where no goal can be reached.
+    """
+    rows, columns = distance.shape
+    padded = np.full((rows + 2, columns + 2), np.inf)
+    padded[1:-1, 1:-1] = distance
+    neighbours = np.stack([padded[1 + row:rows + 1 + row, 1 + column:columns + 1 + column]
+                           for row, column in NEIGHBOURS])
+    best = np.argmin(neighbours + np.array(STEP_COSTS)[:, None, None], axis=0)
+    steps = np.array([(column, row) for row, column in NEIGHBOURS], dtype=np.int8)
+    flow = steps[best]
+    flow[~(np.take_along_axis(neighbours, best[None], axis=0)[0] < distance)] = 0
+    return flow
+
+
+class NavGrid:
+    """
+    Navigation grid of a compiled map. Bots look up which way to fly instead of searching for a path every tick.
+
+    Every distance field is compiled the first time bots play on the map and cached next to it: the way to the fuel
+    pads, and the way to each sector, a NAV_SECTOR_SIZE square of cells, that leads to a free cell in its middle. The
+    way to any other place is the way to its sector, so nothing is searched while a match is played. The flows of the
+    NAV_FIELD_CACHE most recently used sectors are kept, older ones are worked out again from the compiled distances.
+    Paths keep away from walls where there is room, see path_costs.
+
+    Attributes:
+        cell_size   : Size of a cell in pixels.
+        shape       : (rows, columns) of the grid.
+        blocked     : Cells a ship centered on would touch a wall or a fuel pad.
+        clearance   : Distance in cells from each cell to the nearest blocked one.
+        pads        : (distance, flow) to the nearest fuel pad.
+        escape      : Flow from blocked cells to the nearest free one.
+        sectors     : (sectors, rows, columns) distance to each sector.
+        sector_goals: (sectors, 2) cell the way to each sector leads to.
+
+    Methods:
+    -------
+    __init__    : Wrap the compiled grids.
+    cells       : Grid cell of points.
+    sector      : Sector of points.
+    toward      : (distance, flow) to the sector of a point.
+    lookup      : Distance in pixels and direction along a field for many points at once.
+    """
+
+    def __init__(self, blocked: np.ndarray, clearance: np.ndarray, pad_distance: np.ndarray,
+                 escape_distance: np.ndarray, sectors: np.ndarray, sector_goals: np.ndarray) -> None:
+        """
+        Wrap the compiled grids.
+        :param blocked: nav_blocked of the compiled map
+        :param clearance: nav_clearance of the compiled map
+        :param pad_distance: nav_pads of the compiled map
+        :param escape_distance: nav_escape of the compiled map
+        :param sectors: nav_sectors of the compiled map
+        :param sector_goals: nav_sector_goals of the compiled map
+        """
+        self.cell_size = NAV_CELL_SIZE
+        self.shape = blocked.shape
+        self.blocked = np.asarray(blocked, dtype=bool)
+        self.clearance = clearance
+        self.pads = (pad_distance, flow_field(pad_distance))
+        self.escape = flow_field(escape_distance)
+        self.sectors = sectors
+        self.sector_goals = sector_goals
+        self._columns = -(-self.shape[1] // NAV_SECTOR_SIZE)
+        self._flows = {}
+
+    def cells(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param points: (n, 2) points, points off the map use the nearest cell on it
+        :return: Row and column of each point's cell.
+        """
+        cells = np.floor_divide(np.asarray(points, dtype=float), self.cell_size).astype(np.int64)
+        return (np.clip(cells[:, 1], 0, self.shape[0] - 1), np.clip(cells[:, 0], 0, self.shape[1] - 1))
+
+    def sector(self, points: np.ndarray) -> np.ndarray:
+        """
+        :param points: (n, 2) points, points off the map use the nearest cell on it
+        :return: (n,) index of each point's sector.
+        """
+        rows, columns = self.cells(points)
+        return rows // NAV_SECTOR_SIZE * self._columns + columns // NAV_SECTOR_SIZE
+
+    def toward(self, sector: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param sector: Index of a sector, see sector
+        :return: (distance, flow) to the sector.
+        """
+        flow = self._flows.pop(sector, None)
+        if flow is None:
+            flow = flow_field(self.sectors[sector])
+            while len(self._flows) >= NAV_FIELD_CACHE:
+                del self._flows[next(iter(self._flows))]
+        self._flows[sector] = flow
+        return self.sectors[sector], flow
+
+    def lookup(self, points: np.ndarray, field: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Where a field leads from many points. The way leads to the center of the next cell on the path rather than
+        along the grid, which keeps ships in the middle of narrow gaps. Points in blocked cells are led out to the
+        nearest free cell first, points on the goal to its center.
+        :param points: (n, 2) points
+        :param field: (distance, flow) from pads or toward
+        :return: (n,) distance in pixels along the path, inf where the goal can't be reached, (n, 2) unit direction to
+        fly in and (n,) clearance of each point's cell.
+        """
+        points = np.asarray(points, dtype=float)
+        rows, columns = self.cells(points)
+        distance, flow = field
+        step = np.where(self.blocked[rows, columns][:, None], self.escape[rows, columns], flow[rows, columns])
+        way = (np.column_stack([columns, rows]) + step + 0.5) * self.cell_size - points
+        length = np.hypot(way[:, 0], way[:, 1])
+        way /= np.maximum(length, 1)[:, None]
+        return distance[rows, columns] * self.cell_size, way, self.clearance[rows, columns]
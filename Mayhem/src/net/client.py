@@ -0,0 +1,214 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import bisect
+import socket
+import time
+from config import *
+from net.link import Link
+from net import protocol
+
+# Seconds between JOIN datagrams until the server answers
+JOIN_RETRY = 0.5
+
+
+class NetClient:
+    """
+    Client side of a networked match, on a non-blocking UDP socket so it can be polled from the game loop.
+
+    States received from the server are kept by tick and drawn NET_INTERPOLATION_TICKS behind the newest one,
+    interpolating between the two states around that time so movement stays smooth when datagrams arrive late or
+    not at all.
+
+    Attributes:
+        match       : Name of the match to join.
+        address     : (host, port) of the server.
+        link        : Sends datagrams, through simulated latency and loss if set.
+        player_id   : Player this client controls, None until the server has answered.
+        layout      : Map and resolution of the match, None until the server has answered.
+        rejected    : Reason the server refused the client, None if it has not.
+        states      : Received states by tick.
+        ticks       : Sorted ticks of the received states.
+        latest      : Newest tick received, None before the first state.
+        received    : Number of states received.
+        bytes_received : Number of bytes of state received.
+
+    Methods:
+    -------
+    __init__        : Open the socket and ask to join.
+    send_input      : Send the key mask of the local player.
+    poll            : Send queued datagrams and handle everything that has arrived.
+    render_state    : The interpolated state to draw this frame.
+    close           : Close the socket.
+    """
+
+    def __init__(self, match: str = "default", address: tuple[str, int] = (NET_HOST, NET_PORT),
+                 latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0, seed: int = None) -> None:
+        """
+        Open the socket and ask to join.
+        :param match: Name of the match to join
+        :param address: (host, port) of the server
+        :param latency: Simulated latency of every datagram sent, in seconds
+        :param jitter: Extra random latency of up to this many seconds
+        :param loss: Chance of a datagram sent being dropped
+        :param seed: Seed for the simulated jitter and loss
+        """
+        self.match = match
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.socket.bind(("", 0))
+        self.link = Link(self.socket.sendto, latency, jitter, loss, seed)
+
+        self.player_id = None
+        self.layout = None
+        self.rejected = None
+        self.states = {}
+        self.ticks = []
+        self.latest = None
+        self.received = 0
+        self.bytes_received = 0
+
+        self._sequence = 0
+        self._latest_time = 0.0
+        self._render_tick = 0.0
+        self._last_join = 0.0
+        self._join()
+
+    def _join(self) -> None:
+        self._last_join = time.monotonic()
+        self.link.send(protocol.encode_text(protocol.JOIN, self.match), self.address)
+
+    def send_input(self, mask: int) -> None:
+        """
+        Send the key mask of the local player, along with the newest state received so the server can send deltas.
+        :param mask: 4 bit key mask in PLAYER_CONTROLS order: power, left, right, shoot
+        :return:
+        """
+        if self.player_id is None:
+            return
+        self._sequence += 1
+        ack = protocol.NO_BASE if self.latest is None else self.latest
+        self.link.send(protocol.INPUT_MESSAGE.pack(protocol.INPUT, self._sequence, ack, mask), self.address)
+
+    def poll(self) -> None:
+        """
+        Send queued datagrams and handle everything that has arrived.
+        :return:
+        """
+        self.link.flush()
+        if self.player_id is None and self.rejected is None and time.monotonic() - self._last_join > JOIN_RETRY:
+            self._join()
+
+        while True:
+            try:
+                data, _ = self.socket.recvfrom(65536)
+            except (BlockingIOError, ConnectionError):
+                return
+            if not data:
+                continue
+
+            kind = data[0]
+            if kind == protocol.STATE:
+                self._receive_state(data)
+            elif kind == protocol.WELCOME and self.player_id is None:
+                self.player_id, _, self.layout = protocol.decode_welcome(data)
+            elif kind == protocol.REJECT:
+                self.rejected = data[1:].decode(errors="replace")
+
+    def _receive_state(self, data: bytes) -> None:
+        decoded = protocol.decode_state(data, self.states)
+        if decoded is None:
+            return
+        tick, state = decoded
+        if tick in self.states:
+            return
+
+        self.states[tick] = state
+        bisect.insort(self.ticks, tick)
+        while len(self.ticks) > NET_STATE_HISTORY:
+            del self.states[self.ticks.pop(0)]
+
+        self.received += 1
+        self.bytes_received += len(data)
+        if self.latest is None or tick > self.latest:
+            self.latest = tick
+            self._latest_time = time.monotonic()
+
+    def render_state(self) -> tuple[tuple, tuple] | None:
+        """
+        :return: The state NET_INTERPOLATION_TICKS behind the server, interpolated between the received states
+        around it, None before the first state has arrived.
+        """
+        if self.latest is None:
+            return None
+
+        # The server tick is estimated from the newest state and the time since it arrived, and never runs backwards
+        estimate = self.latest + (time.monotonic() - self._latest_time) * TICK_RATE - NET_INTERPOLATION_TICKS
+        self._render_tick = max(self._render_tick, min(estimate, self.latest))
+
+        i = bisect.bisect_right(self.ticks, self._render_tick)
+        if i == 0:
+            return self.states[self.ticks[0]]
+        if i == len(self.ticks):
+            return self.states[self.ticks[-1]]
+
+        a, b = self.ticks[i - 1], self.ticks[i]
+        return interpolate(self.states[a], self.states[b], (self._render_tick - a) / (b - a))
+
+    def close(self) -> None:
+        """
+        Close the socket.
+        :return:
+        """
+        self.socket.close()
+
+
+def interpolate(a: tuple, b: tuple, t: float) -> tuple[tuple, tuple]:
+    """
+    Blend two states. Positions and directions are interpolated, everything else is taken from the later state.
+    Bullets are matched by index and only interpolated if the same player shot them and they are close, so a bullet
+    that disappeared does not drag the others across the screen.
+    :param a: Earlier state
+    :param b: Later state
+    :param t: 0 for a, 1 for b
+    :return: The blended state
+    """
+    players = tuple((ax + (bx - ax) * t, ay + (by - ay) * t, adx + (bdx - adx) * t, ady + (bdy - ady) * t, *rest)
+                    for (ax, ay, adx, ady, *_), (bx, by, bdx, bdy, *rest) in zip(a[0], b[0]))
+
+    reach = BULLET_SPEED + MAX_SPEED * 2
+    bullets = []
+    for i, (bx, by, owner) in enumerate(b[1]):
+        if i < len(a[1]):
+            ax, ay, a_owner = a[1][i]
+            if a_owner == owner and abs(bx - ax) < reach and abs(by - ay) < reach:
+                bullets.append((ax + (bx - ax) * t, ay + (by - ay) * t, owner))
+                continue
+        bullets.append((bx, by, owner))
+    return players, tuple(bullets)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Join a networked match.")
+    parser.add_argument("--host", default=NET_HOST)
+    parser.add_argument("--port", type=int, default=NET_PORT)
+    parser.add_argument("--match", default="default", help="name of the match to join")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated jitter in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="chance of dropping a datagram")
+    args = parser.parse_args()
+
+    import pygame
+    from game import Game
+    from scenes.network_game import NetworkGame
+
+    pygame.display.init()
+    pygame.font.init()
+    client = NetClient(args.match, (args.host, args.port), args.latency, args.jitter, args.loss)
+    game = Game(scene=lambda game: NetworkGame(game, client))
+    game.run()
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import heapq
+import itertools
+import random
+import time
+from typing import Callable
+
+
+class Link:
+    """
+    Sends datagrams, optionally through simulated latency, jitter and packet loss so that networked matches can be
+    tested over localhost.
+
+    Delayed datagrams are queued and sent by flush, which the owner calls every tick.
+
+    Attributes:
+        latency     : Seconds every datagram is delayed.
+        jitter      : Extra random delay of up to this many seconds, datagrams can arrive out of order.
+        loss        : Chance of a datagram being dropped.
+        sent        : Number of datagrams sent.
+        dropped     : Number of datagrams dropped.
+        bytes_sent  : Number of bytes sent.
+
+    Methods:
+    -------
+    __init__    : Initializes the link.
+    send        : Send a datagram, or queue it if it is delayed.
+    flush       : Send the queued datagrams that are due.
+    """
+
+    def __init__(self, sendto: Callable[[bytes, tuple], None], latency: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0, seed: int = None) -> None:
+        """
+        Initializes the link.
+        :param sendto: Sends a datagram to an address, like transport.sendto or socket.sendto
+        :param latency: Seconds every datagram is delayed
+        :param jitter: Extra random delay of up to this many seconds
+        :param loss: Chance of a datagram being dropped
+        :param seed: Seed for the simulated jitter and loss
+        """
+        self._sendto = sendto
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.queue = []
+        self._order = itertools.count()
+
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+
+    def send(self, data: bytes, addr: tuple) -> None:
+        """
+        Send a datagram, or queue it if the link is delayed.
+        :param data: Datagram
+        :param addr: (host, port)
+        :return:
+        """
+        if self.loss and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+
+        if self.latency or self.jitter:
+            due = time.monotonic() + self.latency + self.random.uniform(0, self.jitter)
+            heapq.heappush(self.queue, (due, next(self._order), data, addr))
+        else:
+            self._deliver(data, addr)
+
+    def flush(self) -> None:
+        """
+        Send the queued datagrams that are due.
+        :return:
+        """
+        now = time.monotonic()
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, addr = heapq.heappop(self.queue)
+            self._deliver(data, addr)
+
+    def _deliver(self, data: bytes, addr: tuple) -> None:
+        try:
+            self._sendto(data, addr)
+        except (BlockingIOError, ConnectionError):
+            # UDP gives no guarantees either way, a full buffer or an unreachable peer is the same as a lost packet
+            self.dropped += 1
+            return
+        self.sent += 1
+        self.bytes_sent += len(data)
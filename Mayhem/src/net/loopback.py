@@ -0,0 +1,82 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import asyncio
+import time
+from config import *
+from sim.policies import random_policy
+from sim.replay import key_mask
+from net.client import NetClient
+from net.server import serve
+
+
+async def loopback(matches: int, seconds: float, latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0,
+                   seed: int = 0) -> dict:
+    """
+    Run a server and two scripted clients per match over localhost, with the same simulated network conditions in
+    both directions.
+    :param matches: Number of concurrent matches
+    :param seconds: How long to play
+    :param latency: Simulated latency in seconds
+    :param jitter: Simulated jitter in seconds
+    :param loss: Chance of dropping a datagram
+    :param seed: Seed for the scripted input and the simulated network
+    :return: Statistics of the run
+    """
+    server, task = await serve("127.0.0.1", 0, latency=latency, jitter=jitter, loss=loss, seed=seed)
+    address = ("127.0.0.1", server.transport.get_extra_info("sockname")[1])
+
+    clients = [NetClient(f"match-{i // 2}", address, latency, jitter, loss, seed + i + 1) for i in range(matches * 2)]
+    policies = [random_policy(seed + i) for i in range(len(clients))]
+
+    start = time.monotonic()
+    tick = 0
+    while time.monotonic() - start < seconds:
+        for client, policy in zip(clients, policies):
+            client.poll()
+            client.send_input(key_mask(policy(tick), 1)[0])
+            client.render_state()
+        tick += 1
+        await asyncio.sleep(1 / TICK_RATE)
+    elapsed = time.monotonic() - start
+
+    # Every state a client decoded must match what the server sent, whether it arrived in full or as a delta
+    mismatches = 0
+    for client in clients:
+        port = client.socket.getsockname()[1]
+        match = next((m for addr, m in server.clients.items() if addr[1] == port), None)
+        history = match.history if match else {}
+        mismatches += sum(1 for tick, state in client.states.items() if tick in history and history[tick] != state)
+
+    task.cancel()
+    server.transport.close()
+    for client in clients:
+        client.close()
+
+    states = server.full_states + server.delta_states
+    return {"matches": len(server.matches),
+            "server_ticks_per_second": server.ticks / elapsed,
+            "states_sent": states,
+            "delta_share": server.delta_states / states if states else 0.0,
+            "states_received": sum(c.received for c in clients),
+            "bytes_per_state": sum(c.bytes_received for c in clients) / max(1, sum(c.received for c in clients)),
+            "datagrams_dropped": server.link.dropped + sum(c.link.dropped for c in clients),
+            "mismatched_states": mismatches}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Play scripted networked matches over localhost and report.")
+    parser.add_argument("--matches", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="simulated jitter in seconds")
+    parser.add_argument("--loss", type=float, default=0.05, help="chance of dropping a datagram")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = asyncio.run(loopback(args.matches, args.seconds, args.latency, args.jitter, args.loss, args.seed))
+    for name, value in report.items():
+        print(f"{name:>26}: {value:.3f}" if isinstance(value, float) else f"{name:>26}: {value}")
+
+
+if __name__ == "__main__":
+    main()
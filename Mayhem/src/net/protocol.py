@@ -0,0 +1,161 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import json
+import struct
+import numpy as np
+from typing import TYPE_CHECKING
+
+# Message types, the first byte of every datagram
+JOIN, WELCOME, INPUT, STATE, REJECT = range(1, 6)
+
+# A state sent with no base holds every field
+NO_BASE = 0xFFFFFFFF
+
+TYPE = struct.Struct("<B")
+WELCOME_HEADER = struct.Struct("<BBI")      # type, player id, tick
+INPUT_MESSAGE = struct.Struct("<BIIB")      # type, sequence number, last state tick received, key mask
+STATE_HEADER = struct.Struct("<BII")        # type, tick, base tick
+COUNT = struct.Struct("<H")
+MASK = struct.Struct("<B")
+
+# Fields of the state sent to clients, one row per player sorted by id and one row per live bullet
+PLAYER_FIELDS = ("x", "y", "dir_x", "dir_y", "fuel", "score")
+PLAYER_FORMATS = tuple(struct.Struct(f) for f in ("<f", "<f", "<f", "<f", "<f", "<i"))
+BULLET_FIELDS = ("x", "y", "owner")
+BULLET_FORMATS = tuple(struct.Struct(f) for f in ("<f", "<f", "<B"))
+
+_FLOAT32 = struct.Struct("<f")
+
+
+def _f32(value: float) -> float:
+    return _FLOAT32.unpack(_FLOAT32.pack(value))[0]
+
+
+def capture_state(scene: 'LocalGame') -> tuple[tuple, tuple]:
+    """
+    The part of a match clients need to draw it, with floats rounded to the precision they are sent with so that
+    unchanged fields compare equal.
+    :param scene: The match.
+    :return: (player rows, bullet rows)
+    """
+    players = tuple((_f32(p.pos[0]), _f32(p.pos[1]), _f32(p.direction_vec.x), _f32(p.direction_vec.y),
+                     _f32(p.fuel), p.score) for p in sorted(scene.players, key=lambda p: p.id))
+
+    bullets = scene.bullets
+    n = bullets.count
+    if n == 0:
+        return players, ()
+
+    pos = bullets.pos[:n].astype(np.float32).tolist()
+    owner_ids = [owner.id for owner in bullets.owners]
+    return players, tuple((x, y, owner_ids[o]) for (x, y), o in zip(pos, bullets.owner[:n].tolist()))
+
+
+def _encode_table(rows: tuple, base: tuple, formats: tuple) -> list[bytes]:
+    """
+    Encode rows as a count, then per row a bitmask of the fields that differ from the same row of the base followed
+    by those fields. Rows the base does not have are sent in full.
+    """
+    out = [COUNT.pack(len(rows))]
+    full = (1 << len(formats)) - 1
+    for i, row in enumerate(rows):
+        old = base[i] if i < len(base) else None
+        if old == row:
+            out.append(b"\0")
+        elif old is None:
+            out.append(MASK.pack(full))
+            out += [f.pack(v) for f, v in zip(formats, row)]
+        else:
+            mask = 0
+            values = []
+            for bit, (f, v, o) in enumerate(zip(formats, row, old)):
+                if v != o:
+                    mask |= 1 << bit
+                    values.append(f.pack(v))
+            out.append(MASK.pack(mask))
+            out += values
+    return out
+
+
+def _decode_table(data: bytes, offset: int, base: tuple, formats: tuple) -> tuple[tuple, int]:
+    """
+    Inverse of _encode_table.
+    :return: (rows, offset after the table)
+    """
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    rows = []
+    for i in range(count):
+        mask = data[offset]
+        offset += 1
+        row = list(base[i]) if i < len(base) else [0] * len(formats)
+        for bit, f in enumerate(formats):
+            if mask >> bit & 1:
+                (row[bit],) = f.unpack_from(data, offset)
+                offset += f.size
+        rows.append(tuple(row))
+    return tuple(rows), offset
+
+
+def encode_state(tick: int, state: tuple, base_tick: int = NO_BASE, base: tuple = ((), ())) -> bytes:
+    """
+    :param tick: Tick of the state.
+    :param state: Result of capture_state.
+    :param base_tick: Tick of a state the client has, NO_BASE to send every field.
+    :param base: The state of base_tick.
+    :return: A STATE datagram holding only the fields that changed since the base.
+    """
+    parts = [STATE_HEADER.pack(STATE, tick, base_tick)]
+    parts += _encode_table(state[0], base[0], PLAYER_FORMATS)
+    parts += _encode_table(state[1], base[1], BULLET_FORMATS)
+    return b"".join(parts)
+
+
+def decode_state(data: bytes, states: dict[int, tuple]) -> tuple[int, tuple] | None:
+    """
+    :param data: A STATE datagram.
+    :param states: States already received by tick, the base is looked up in it.
+    :return: (tick, state), or None if the base is no longer known.
+    """
+    _, tick, base_tick = STATE_HEADER.unpack_from(data)
+    if base_tick == NO_BASE:
+        base = ((), ())
+    elif base_tick in states:
+        base = states[base_tick]
+    else:
+        return None
+
+    players, offset = _decode_table(data, STATE_HEADER.size, base[0], PLAYER_FORMATS)
+    bullets, _ = _decode_table(data, offset, base[1], BULLET_FORMATS)
+    return tick, (players, bullets)
+
+
+def encode_welcome(player_id: int, tick: int, layout: dict) -> bytes:
+    """
+    :param player_id: Player the client controls.
+    :param tick: Current tick of the match.
+    :param layout: Map and resolution of the match.
+    :return: A WELCOME datagram.
+    """
+    return WELCOME_HEADER.pack(WELCOME, player_id, tick) + json.dumps(layout).encode()
+
+
+def decode_welcome(data: bytes) -> tuple[int, int, dict]:
+    """
+    :param data: A WELCOME datagram.
+    :return: (player id, tick, layout)
+    """
+    _, player_id, tick = WELCOME_HEADER.unpack_from(data)
+    return player_id, tick, json.loads(data[WELCOME_HEADER.size:])
+
+
+def encode_text(kind: int, text: str) -> bytes:
+    """
+    :param kind: JOIN or REJECT.
+    :param text: Match name or reason.
+    :return: The datagram.
+    """
+    return TYPE.pack(kind) + text.encode()
+
+
+if TYPE_CHECKING:
+    from scenes.local_game import LocalGame
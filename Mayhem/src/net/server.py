@@ -0,0 +1,283 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import asyncio
+import time
+from collections import OrderedDict
+from config import *
+from scenes.local_game import LocalGame
+from sim.headless import HeadlessGame, ScriptedKeys
+from sim.replay import map_layout
+from net.link import Link
+from net import protocol
+
+
+class Connection:
+    """
+    A client playing in a match.
+
+    Attributes:
+        addr        : (host, port) of the client.
+        player_id   : Player the client controls.
+        sequence    : Highest input sequence number received, older input arriving late is ignored.
+        ack         : Last state tick the client has received, states are sent as a delta from it.
+        last_seen   : time.monotonic() of the last datagram from the client.
+    """
+
+    def __init__(self, addr: tuple, player_id: int) -> None:
+        self.addr = addr
+        self.player_id = player_id
+        self.sequence = 0
+        self.ack = protocol.NO_BASE
+        self.last_seen = time.monotonic()
+
+
+class ServerMatch:
+    """
+    One match hosted by the server, simulated headless with the latest input of each client.
+
+    Attributes:
+        name        : Name clients join the match by.
+        game        : Headless game the match is simulated in.
+        connections : Connections by address.
+        masks       : Latest 4 bit key mask of each player, in PLAYER_CONTROLS order.
+        history     : States of the last NET_STATE_HISTORY ticks, clients get deltas from them.
+
+    Methods:
+    -------
+    __init__        : Set up the match.
+    free_player     : A player no client controls yet.
+    step            : Simulate one tick with the latest input and store the state.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        Set up the match.
+        :param name: Name clients join the match by
+        """
+        self.name = name
+        self.game = HeadlessGame(LocalGame)
+        self.connections = {}
+        self.masks = [0] * len(self.game.current_scene.players)
+        self.history = OrderedDict()
+        self._keys = {}
+
+        self.layout = {"resolution": list(self.game.resolution), **map_layout(self.game.current_scene)}
+        self.history[self.game.tick] = protocol.capture_state(self.game.current_scene)
+
+    def free_player(self) -> int | None:
+        """
+        :return: Id of a player no client controls, None if the match is full.
+        """
+        taken = {c.player_id for c in self.connections.values()}
+        return next((i for i in range(len(self.masks)) if i not in taken), None)
+
+    def step(self) -> None:
+        """
+        Simulate one tick with the latest input of every player and store the state.
+        :return:
+        """
+        masks = tuple(self.masks)
+        keys = self._keys.get(masks)
+        if keys is None:
+            keys = self._keys[masks] = ScriptedKeys.from_actions(
+                [[mask >> bit & 1 for bit in range(4)] for mask in masks])
+
+        self.game.step(keys)
+        self.history[self.game.tick] = protocol.capture_state(self.game.current_scene)
+        while len(self.history) > NET_STATE_HISTORY:
+            self.history.popitem(last=False)
+
+
+class MatchServer(asyncio.DatagramProtocol):
+    """
+    Authoritative server for any number of matches over UDP.
+
+    Clients join a match by name and send their key mask every frame. Every tick each match is stepped and each
+    client is sent the fields that changed since the last state it confirmed receiving, or the full state if that
+    state is too old. Matches are stepped one at a time, yielding to the event loop in between, so datagrams keep
+    being handled however many matches are running.
+
+    Attributes:
+        matches     : ServerMatch by name.
+        clients     : ServerMatch by client address.
+        link        : Sends datagrams, through simulated latency and loss if set.
+        ticks       : Number of ticks the server has run.
+        full_states : Number of states sent without a base.
+        delta_states: Number of states sent as a delta.
+
+    Methods:
+    -------
+    __init__            : Initializes the server.
+    connection_made     : Set up the link once the socket is open.
+    datagram_received   : Handle a JOIN or INPUT datagram.
+    join                : Add a client to a match.
+    run                 : Step every match TICK_RATE times per second.
+    broadcast           : Send the state of a match to its clients.
+    drop_idle           : Remove clients that have stopped sending.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, loss: float = 0.0, seed: int = None) -> None:
+        """
+        Initializes the server.
+        :param latency: Simulated latency of every datagram sent, in seconds
+        :param jitter: Extra random latency of up to this many seconds
+        :param loss: Chance of a datagram sent being dropped
+        :param seed: Seed for the simulated jitter and loss
+        """
+        self.matches = {}
+        self.clients = {}
+        self.link = None
+        self.transport = None
+        self._link_settings = (latency, jitter, loss, seed)
+
+        self.ticks = 0
+        self.full_states = 0
+        self.delta_states = 0
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.transport = transport
+        self.link = Link(transport.sendto, *self._link_settings)
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        """
+        Handle a JOIN or INPUT datagram, anything else is ignored.
+        :param data: Datagram
+        :param addr: (host, port) of the client
+        :return:
+        """
+        if not data:
+            return
+        kind = data[0]
+
+        if kind == protocol.INPUT and len(data) == protocol.INPUT_MESSAGE.size:
+            match = self.clients.get(addr)
+            if match is None:
+                return
+            connection = match.connections[addr]
+            _, sequence, ack, mask = protocol.INPUT_MESSAGE.unpack(data)
+            connection.last_seen = time.monotonic()
+            if sequence > connection.sequence:
+                connection.sequence = sequence
+                connection.ack = ack
+                match.masks[connection.player_id] = mask & 0xF
+
+        elif kind == protocol.JOIN:
+            self.join(data[1:].decode(errors="replace"), addr)
+
+    def join(self, name: str, addr: tuple) -> None:
+        """
+        Add a client to a match, the match is created if it does not exist. Joining again resends the welcome.
+        :param name: Match name
+        :param addr: (host, port) of the client
+        :return:
+        """
+        match = self.clients.get(addr)
+        if match is None:
+            match = self.matches.get(name)
+            if match is None:
+                match = self.matches[name] = ServerMatch(name)
+
+            player_id = match.free_player()
+            if player_id is None:
+                self.link.send(protocol.encode_text(protocol.REJECT, f"Match {name} is full"), addr)
+                return
+            match.connections[addr] = Connection(addr, player_id)
+            self.clients[addr] = match
+
+        connection = match.connections[addr]
+        connection.last_seen = time.monotonic()
+        self.link.send(protocol.encode_welcome(connection.player_id, match.game.tick, match.layout), addr)
+
+    def broadcast(self, match: ServerMatch) -> None:
+        """
+        Send the latest state of a match to each of its clients as a delta from the last state they received.
+        :param match: A match
+        :return:
+        """
+        tick = match.game.tick
+        state = match.history[tick]
+        for connection in match.connections.values():
+            base = match.history.get(connection.ack)
+            if base is None:
+                data = protocol.encode_state(tick, state)
+                self.full_states += 1
+            else:
+                data = protocol.encode_state(tick, state, connection.ack, base)
+                self.delta_states += 1
+            self.link.send(data, connection.addr)
+
+    def drop_idle(self) -> None:
+        """
+        Remove clients that have sent nothing for NET_TIMEOUT seconds, and matches nobody is left in.
+        :return:
+        """
+        now = time.monotonic()
+        for addr, match in list(self.clients.items()):
+            connection = match.connections[addr]
+            if now - connection.last_seen > NET_TIMEOUT:
+                match.masks[connection.player_id] = 0
+                del match.connections[addr]
+                del self.clients[addr]
+                if not match.connections:
+                    del self.matches[match.name]
+
+    async def run(self) -> None:
+        """
+        Step every match TICK_RATE times per second until cancelled. When the server falls behind it skips ahead instead
+        of trying to catch up.
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            for match in list(self.matches.values()):
+                match.step()
+                self.broadcast(match)
+                await asyncio.sleep(0)
+
+            self.link.flush()
+            self.drop_idle()
+            self.ticks += 1
+
+            next_tick += 1 / TICK_RATE
+            delay = next_tick - loop.time()
+            if delay < -0.25:
+                next_tick = loop.time()
+            await asyncio.sleep(max(0.0, delay))
+
+
+async def serve(host: str = NET_HOST, port: int = NET_PORT, **link) -> tuple[MatchServer, asyncio.Task]:
+    """
+    Open the server socket and start stepping matches.
+    :param host: Address to listen on
+    :param port: Port to listen on, 0 picks a free port
+    :param link: latency, jitter, loss and seed of the simulated network
+    :return: (server, task running the tick loop), cancel the task and close server.transport to stop
+    """
+    loop = asyncio.get_running_loop()
+    _, server = await loop.create_datagram_endpoint(lambda: MatchServer(**link), local_addr=(host, port))
+    return server, asyncio.create_task(server.run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Host networked matches.")
+    parser.add_argument("--host", default=NET_HOST)
+    parser.add_argument("--port", type=int, default=NET_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated jitter in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="chance of dropping a datagram")
+    args = parser.parse_args()
+
+    async def run() -> None:
+        server, task = await serve(args.host, args.port, latency=args.latency, jitter=args.jitter, loss=args.loss)
+        print(f"Serving on {args.host}:{server.transport.get_extra_info('sockname')[1]}")
+        await task
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
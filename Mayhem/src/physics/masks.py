@@ -0,0 +1,42 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+
+# Fully set masks by size, walls and fuel pads are solid so they are tested against one of these
+_solid_masks = {}
+
+
+def solid_mask(size: tuple[int, int]) -> pygame.mask.Mask:
+    """
+    :param size: (width, height)
+    :return: A mask with every bit set, shared by every caller asking for the same size.
+    """
+    mask = _solid_masks.get(size)
+    if mask is None:
+        mask = _solid_masks[size] = pygame.mask.Mask(size, fill=True)
+    return mask
+
+
+def touches_rect(mask: pygame.mask.Mask, topleft: tuple[int, int], rect: tuple[int, int, int, int]) -> bool:
+    """
+    Test if any set bit of a mask lies inside a solid rect. Only the part of the rect over the mask is tested, so a
+    long wall costs as much as a short one.
+    :param mask: Mask of the sprite.
+    :param topleft: Where the mask is placed.
+    :param rect: [left, top, right, bottom] of the rect.
+    :return: True if they touch.
+    """
+    x, y = topleft
+    width, height = mask.get_size()
+    left, top = int(max(x, rect[0])), int(max(y, rect[1]))
+    right, bottom = int(min(x + width, rect[2])), int(min(y + height, rect[3]))
+    if right <= left or bottom <= top:
+        return False
+    return mask.overlap(solid_mask((right - left, bottom - top)), (left - x, top - y)) is not None
+
+
+def touches(mask: pygame.mask.Mask, topleft: tuple[int, int], other: pygame.mask.Mask,
+            other_topleft: tuple[int, int]) -> bool:
+    """
+    :return: True if the set bits of two placed masks overlap.
+    """
+    return mask.overlap(other, (other_topleft[0] - topleft[0], other_topleft[1] - topleft[1])) is not None
@@ -0,0 +1,427 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+from collections import namedtuple
+from typing import Iterable
+import numpy as np
+import pygame
+from config import *
+from sprites.fuel_pad import FuelPad
+
+
+# Broadphase results, each list keeps the order the sprites were inserted in
+Candidates = namedtuple("Candidates", ["fuel_pads", "objects", "players"])
+
+FUEL_PAD, OBJECT, PLAYER = range(3)
+
+
+class SpatialHash:
+    """
+    A uniform grid that buckets sprites by the cells their rect covers.
+
+    Static geometry (Object, FuelPad) is inserted once, moving sprites (players) are re-bucketed with update_dynamic
+    and are only moved between cells when their rect has actually crossed a cell border. The static part of a query
+    only depends on the cells it covers, so it is cached per cell range.
+
+    Attributes:
+        cell_size       : Width and height of a cell in pixels.
+        static_cells    : Maps a cell (x, y) to the walls and fuel pads touching it.
+        dynamic_cells   : Maps a cell (x, y) to the moving sprites touching it.
+
+    Methods:
+    -------
+    __init__        : Initializes an empty grid.
+    insert_static   : Insert walls and fuel pads.
+    replace_static  : Swap every wall and fuel pad for new ones.
+    update_dynamic  : Insert or re-bucket a moving sprite.
+    remove          : Remove a sprite from the grid.
+    query           : Typed candidate lists for the sprites near a rect.
+    wall_index      : Array-backed index of every Object rect, used by the bullets.
+    """
+
+    def __init__(self, cell_size: int = SPATIAL_HASH_CELL_SIZE) -> None:
+        """
+        Initializes an empty grid.
+        :param cell_size: Width and height of a cell in pixels.
+        """
+        self.cell_size = cell_size
+        self.static_cells = {}
+        self.dynamic_cells = {}
+        self._static_queries = {}
+
+        # Per sprite: its kind, its insertion order and the cell range it is bucketed in
+        self._kind = {}
+        self._order = {}
+        self._span = {}
+        self._inserted = 0
+
+        self._walls = None
+
+    def _cell_span(self, rect: pygame.Rect) -> tuple[int, int, int, int]:
+        """
+        :param rect: Rect to bucket.
+        :return: First and last cell covered by the rect on each axis.
+        """
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def _cells_for(self, sprite: pygame.sprite.Sprite) -> dict:
+        return self.dynamic_cells if self._kind[sprite] == PLAYER else self.static_cells
+
+    def _add(self, sprite: pygame.sprite.Sprite, span: tuple[int, int, int, int]) -> None:
+        cells = self._cells_for(sprite)
+        x0, y0, x1, y1 = span
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                cells.setdefault((x, y), []).append(sprite)
+        self._span[sprite] = span
+
+    def _discard(self, sprite: pygame.sprite.Sprite) -> None:
+        cells = self._cells_for(sprite)
+        x0, y0, x1, y1 = self._span.pop(sprite)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                cell = cells[(x, y)]
+                cell.remove(sprite)
+                if not cell:
+                    del cells[(x, y)]
+
+    def _register(self, sprite: pygame.sprite.Sprite, kind: int) -> None:
+        self._kind[sprite] = kind
+        self._order[sprite] = self._inserted
+        self._inserted += 1
+
+    def insert_static(self, *groups: Iterable[pygame.sprite.Sprite], walls: 'RectIndex' = None) -> None:
+        """
+        Insert walls and fuel pads, they are never re-bucketed.
+        :param groups: Sprite groups or lists of Object and FuelPad
+        :param walls: Prebuilt wall index of the Objects in insertion order, built on first use if not given
+        :return:
+        """
+        for group in groups:
+            for sprite in group:
+                self._register(sprite, FUEL_PAD if isinstance(sprite, FuelPad) else OBJECT)
+                self._add(sprite, self._cell_span(sprite.rect))
+        self._static_changed()
+        self._walls = walls
+
+    def replace_static(self, *groups: Iterable[pygame.sprite.Sprite]) -> None:
+        """
+        Remove every wall and fuel pad and insert new ones, players stay where they are.
+        :param groups: Sprite groups or lists of Object and FuelPad
+        :return:
+        """
+        for sprite in [s for s, kind in self._kind.items() if kind != PLAYER]:
+            self._discard(sprite)
+            del self._kind[sprite]
+            del self._order[sprite]
+        self.insert_static(*groups)
+
+    def _static_changed(self) -> None:
+        self._static_queries.clear()
+        self._walls = None
+
+    def update_dynamic(self, sprite: pygame.sprite.Sprite) -> None:
+        """
+        Insert a moving sprite, or move it to the cells its rect covers now.
+        :param sprite: A Player
+        :return:
+        """
+        span = self._cell_span(sprite.rect)
+        if sprite not in self._kind:
+            self._register(sprite, PLAYER)
+        elif self._span[sprite] == span:
+            return
+        else:
+            self._discard(sprite)
+        self._add(sprite, span)
+
+    def remove(self, sprite: pygame.sprite.Sprite) -> None:
+        """
+        Remove a sprite from the grid.
+        :param sprite: Any inserted sprite
+        :return:
+        """
+        if sprite in self._kind:
+            if self._kind[sprite] != PLAYER:
+                self._static_changed()
+            self._discard(sprite)
+            del self._kind[sprite]
+            del self._order[sprite]
+
+    def clear(self) -> None:
+        """
+        Remove every sprite.
+        :return:
+        """
+        self.static_cells.clear()
+        self.dynamic_cells.clear()
+        self._kind.clear()
+        self._order.clear()
+        self._span.clear()
+        self._static_changed()
+
+    def query(self, rect: pygame.Rect) -> Candidates:
+        """
+        Find the sprites bucketed in the cells a rect covers, sorted by kind.
+        :param rect: Rect to search around.
+        :return: Candidates, the sprites still have to be tested against the rect itself.
+        """
+        span = self._cell_span(rect)
+        static = self._static_queries.get(span)
+        if static is None:
+            static = self._static_queries[span] = self._collect(self.static_cells, span)
+
+        return Candidates(static[FUEL_PAD], static[OBJECT], self._collect(self.dynamic_cells, span)[PLAYER])
+
+    def _collect(self, cells: dict, span: tuple[int, int, int, int]) -> tuple[list, list, list]:
+        """
+        :return: The sprites in a range of cells, one list per kind, in insertion order.
+        """
+        x0, y0, x1, y1 = span
+        found = set()
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                cell = cells.get((x, y))
+                if cell:
+                    found.update(cell)
+
+        by_kind = ([], [], [])
+        for sprite in sorted(found, key=self._order.__getitem__):
+            by_kind[self._kind[sprite]].append(sprite)
+        return by_kind
+
+    def wall_index(self) -> 'RectIndex':
+        """
+        Array-backed index of every Object rect, rebuilt only when the static geometry changes.
+        :return: RectIndex
+        """
+        if self._walls is None:
+            walls = sorted((s for s, kind in self._kind.items() if kind == OBJECT), key=self._order.__getitem__)
+            self._walls = RectIndex([s.rect for s in walls], self.cell_size, margin=BULLET_SIZE / 2 + SWEEP_MAX_STEP)
+        return self._walls
+
+
+class RectIndex:
+    """
+    A static grid of rects stored as flat arrays, so a batch of points can be matched with the rects near them in
+    a few vectorized calls.
+
+    Each rect is bucketed in every cell its rect, grown by `margin`, touches. A point then only has to look in its own
+    cell to find every rect that a box of half-size `margin` centered on it could overlap.
+
+    Attributes:
+        rects       : (n, 4) array of [left, top, right, bottom].
+        cell_size   : Width and height of a cell in pixels.
+        margin      : How far outside a rect a point can be and still be returned with it.
+        origin      : World position of cell (0, 0).
+        shape       : Number of cells (columns, rows).
+        cell_start  : Where each cell's items start in cell_items, cell i ends where cell i + 1 starts.
+        cell_items  : Rect indices, grouped by cell.
+
+    Methods:
+    -------
+    __init__        : Build the grid.
+    from_arrays     : Wrap a grid built earlier, without bucketing the rects again.
+    query_points    : Candidate (point, rect) pairs for a batch of points.
+    candidate_pairs : Candidate pairs for a batch of boxes, falling back to every rect for boxes the grid can't cover.
+    """
+
+    def __init__(self, rects: list[pygame.Rect], cell_size: int, margin: float = 0) -> None:
+        """
+        Build the grid.
+        :param rects: Rects to index.
+        :param cell_size: Width and height of a cell in pixels.
+        :param margin: How far outside a rect a point can be and still be returned with it.
+        """
+        self.rects = np.array([[r.left, r.top, r.right, r.bottom] for r in rects], dtype=float).reshape(-1, 4)
+        self.cell_size = cell_size
+        self.margin = margin
+
+        grown = self.rects + (-margin, -margin, margin, margin)
+        if len(grown):
+            self.origin = np.floor(grown[:, :2].min(axis=0))
+            last = np.floor((grown[:, 2:].max(axis=0) - self.origin) / cell_size).astype(int)
+        else:
+            self.origin = np.zeros(2)
+            last = np.zeros(2, dtype=int)
+        self.shape = (int(last[0]) + 1, int(last[1]) + 1)
+
+        # Bucket every rect in the cells it touches
+        first = np.floor((grown[:, :2] - self.origin) / cell_size).astype(int)
+        end = np.floor((grown[:, 2:] - self.origin) / cell_size).astype(int)
+        keys, items = [], []
+        for i, ((x0, y0), (x1, y1)) in enumerate(zip(first.tolist(), end.tolist())):
+            for y in range(y0, y1 + 1):
+                keys.extend(y * self.shape[0] + x for x in range(x0, x1 + 1))
+                items.extend([i] * (x1 - x0 + 1))
+
+        keys = np.array(keys, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        self.cell_items = np.array(items, dtype=np.int64)[order]
+        self.cell_start = np.searchsorted(keys[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    @classmethod
+    def from_arrays(cls, rects: np.ndarray, cell_size: int, margin: float, origin: np.ndarray,
+                    shape: tuple[int, int], cell_start: np.ndarray, cell_items: np.ndarray) -> 'RectIndex':
+        """
+        Wrap a grid built earlier, without bucketing the rects again.
+        :return: RectIndex
+        """
+        index = cls.__new__(cls)
+        index.rects = rects
+        index.cell_size = cell_size
+        index.margin = margin
+        index.origin = origin
+        index.shape = shape
+        index.cell_start = cell_start
+        index.cell_items = cell_items
+        return index
+
+    def __len__(self) -> int:
+        return len(self.rects)
+
+    def cells_of(self, points: np.ndarray) -> np.ndarray:
+        """
+        :param points: (n, 2) world positions.
+        :return: (n,) cell number of each point, -1 outside the grid.
+        """
+        cell = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        inside = (cell >= 0).all(axis=1) & (cell[:, 0] < self.shape[0]) & (cell[:, 1] < self.shape[1])
+        return np.where(inside, cell[:, 1] * self.shape[0] + cell[:, 0], -1)
+
+    def query_points(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Candidate pairs between points and the rects bucketed in their cell.
+        :param points: (n, 2) world positions.
+        :return: Point indices and rect indices of the same length.
+        """
+        cells = self.cells_of(points)
+        inside = np.flatnonzero(cells >= 0)
+        cells = cells[inside]
+        start = self.cell_start[cells]
+        point, offset = expand(start, self.cell_start[cells + 1] - start)
+        return inside[point], self.cell_items[offset]
+
+    def candidate_pairs(self, points: np.ndarray, reach: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Candidate pairs between boxes and the rects they could touch.
+
+        Boxes that reach further from their point than the margin the grid was built with are paired with every rect.
+        :param points: (n, 2) box centers.
+        :param reach: (n,) how far each box extends from its center during the query, in any direction.
+        :return: Box indices and rect indices of the same length.
+        """
+        m = len(self)
+        point, rect = self.query_points(points)
+        far = np.flatnonzero(reach > self.margin)
+        if len(far):
+            point = np.concatenate([point, np.repeat(far, m)])
+            rect = np.concatenate([rect, np.tile(np.arange(m), len(far))])
+        return point, rect
+
+
+class PointGrid:
+    """
+    Points sorted by the cell they are in, rebuilt every time the points move.
+
+    Attributes:
+        cell_size   : Width and height of a cell in pixels.
+        order       : Point indices sorted by cell.
+        keys        : Sorted cell number of each point in order.
+        columns     : Number of columns, used to number the cells.
+        origin      : Cell (x, y) of the top-left cell.
+
+    Methods:
+    -------
+    __init__    : Bucket the points.
+    query_rect  : Indices of the points whose cell touches a rect.
+    pairs       : Candidate pairs of points in the same or neighbouring cells.
+    near        : Candidate pairs between other points and the points in the grid.
+    """
+
+    def __init__(self, points: np.ndarray, cell_size: int) -> None:
+        """
+        Bucket the points.
+        :param points: (n, 2) world positions.
+        :param cell_size: Width and height of a cell in pixels, pairs only finds points closer than this.
+        """
+        self.cell_size = cell_size
+        cell = np.floor(points / cell_size).astype(np.int64)
+        if len(cell):
+            # Leave an empty column on each side so neighbour lookups never wrap into the next row
+            self.origin = cell.min(axis=0) - 1
+            cell -= self.origin
+            self.columns = int(cell[:, 0].max()) + 2
+        else:
+            self.origin = np.zeros(2, dtype=np.int64)
+            self.columns = 1
+
+        keys = cell[:, 1] * self.columns + cell[:, 0]
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def query_rect(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        """
+        :return: Indices of the points in every cell the rect touches, unsorted.
+        """
+        size = self.cell_size
+        x0 = max(int(left // size - self.origin[0]), 0)
+        x1 = min(int(right // size - self.origin[0]), self.columns - 1)
+        y0 = int(top // size - self.origin[1])
+        y1 = int(bottom // size - self.origin[1])
+        if x0 > x1:
+            return self.order[:0]
+
+        rows = np.arange(y0, y1 + 1) * self.columns
+        lo = np.searchsorted(self.keys, rows + x0, "left")
+        hi = np.searchsorted(self.keys, rows + x1, "right")
+        return self.order[expand(lo, hi - lo)[1]]
+
+    def pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair of points in the same or neighbouring cells, each pair once.
+        :return: Two index arrays of the same length.
+        """
+        n = len(self.keys)
+        firsts, seconds = [], []
+        for dx, dy in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):
+            target = self.keys + dy * self.columns + dx
+            lo = np.searchsorted(self.keys, target, "left")
+            hi = np.searchsorted(self.keys, target, "right")
+            if dx == dy == 0:
+                lo = np.arange(1, n + 1)
+            first, second = expand(lo, np.maximum(hi - lo, 0))
+            firsts.append(self.order[first])
+            seconds.append(self.order[second])
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def near(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every point of the grid in the same or a neighbouring cell of each of another set of points.
+        :param points: (m, 2) world positions.
+        :return: Indices into points and indices of the grid points, of the same length.
+        """
+        cell = np.floor(points / self.cell_size).astype(np.int64) - self.origin
+        # Points left or right of every grid point would wrap into the next row, they have no neighbours anyway
+        inside = np.flatnonzero((cell[:, 0] >= 0) & (cell[:, 0] < self.columns))
+        keys = cell[inside, 1] * self.columns + cell[inside, 0]
+
+        firsts, seconds = [], []
+        for dy in (-1, 0, 1):
+            lo = np.searchsorted(self.keys, keys + dy * self.columns - 1, "left")
+            hi = np.searchsorted(self.keys, keys + dy * self.columns + 1, "right")
+            first, second = expand(lo, hi - lo)
+            firsts.append(inside[first])
+            seconds.append(self.order[second])
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def expand(start: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Turn ranges into flat index lists: range i covers start[i] to start[i] + counts[i].
+    :return: The range each entry came from, and the entry itself.
+    """
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(len(counts)), counts)
+    within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(start, counts) + within
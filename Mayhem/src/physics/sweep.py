@@ -0,0 +1,73 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import numpy as np
+
+
+def sweep_boxes(starts: np.ndarray, deltas: np.ndarray, half: np.ndarray, rects: np.ndarray) -> np.ndarray:
+    """
+    Swept box against rect test, for matching rows of the inputs.
+
+    A box with half-size `half` moving from `starts` by `deltas` touches a rect exactly when its center crosses the
+    rect grown by `half`, so each row is a segment against rect test (slab method). Touching an edge does not count,
+    same as Rect.colliderect.
+
+    :param starts: (n, 2) centers at the start of the tick.
+    :param deltas: (n, 2) movement during the tick.
+    :param half: (2,) or (n, 2) half width and height of the moving boxes.
+    :param rects: (n, 4) [left, top, right, bottom] of the rects to test.
+    :return: (n,) fraction of the movement at which each box first touches its rect, inf if it never does.
+    """
+    low = rects[:, :2] - half
+    high = rects[:, 2:] + half
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t1 = (low - starts) / deltas
+        t2 = (high - starts) / deltas
+    enter = np.minimum(t1, t2)
+    leave = np.maximum(t1, t2)
+
+    # Not moving along an axis: the slab either always or never contains the center
+    still = deltas == 0
+    if still.any():
+        inside = (starts > low) & (starts < high)
+        enter = np.where(still, np.where(inside, -np.inf, np.inf), enter)
+        leave = np.where(still, np.where(inside, np.inf, -np.inf), leave)
+
+    enter = enter.max(axis=1)
+    leave = leave.min(axis=1)
+    hit = (enter < leave) & (leave > 0) & (enter < 1)
+    return np.where(hit, np.maximum(enter, 0), np.inf)
+
+
+def earliest(owners: np.ndarray, times: np.ndarray, targets: np.ndarray, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce swept test results to the first hit of each moving box.
+    :param owners: (m,) moving box of each test.
+    :param times: (m,) result of sweep_boxes.
+    :param targets: (m,) rect of each test.
+    :param count: Number of moving boxes.
+    :return: (count,) time of the first hit, inf for none, and (count,) the rect hit first, -1 for none.
+    """
+    first = np.full(count, np.inf)
+    np.minimum.at(first, owners, times)
+
+    target = np.full(count, -1, dtype=np.int64)
+    winner = np.isfinite(times) & (times == first[owners])
+    target[owners[winner]] = targets[winner]
+    return first, target
+
+
+def overlaps(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise overlap test between two sets of [left, top, right, bottom] rects, same rules as Rect.colliderect.
+    :return: (len(a), len(b)) boolean array
+    """
+    return ((a[:, None, 0] < b[None, :, 2]) & (b[None, :, 0] < a[:, None, 2]) &
+            (a[:, None, 1] < b[None, :, 3]) & (b[None, :, 1] < a[:, None, 3]))
+
+
+def overlap_pairs(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Overlap test between matching rows of two sets of [left, top, right, bottom] rects.
+    :return: (len(a),) boolean array
+    """
+    return (a[:, 0] < b[:, 2]) & (b[:, 0] < a[:, 2]) & (a[:, 1] < b[:, 3]) & (b[:, 1] < a[:, 3])
@@ -0,0 +1,179 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import csv
+import json
+import time
+from typing import Callable, TYPE_CHECKING
+import numpy as np
+import pygame
+
+# Phases of a frame, in the order they run. Times are exclusive: a phase called from inside another is not counted
+# twice, so draw does not include the HUD.
+PHASES = ("events", "input", "move", "collisions", "bullets", "particles", "draw", "hud", "flip")
+PERCENTILES = (50, 95, 99)
+
+
+class FrameProfiler:
+    """
+    Times each phase of the game loop and keeps the last frames in a fixed-size ring buffer.
+
+    Nothing is timed until attach wraps the methods of a running game, so a game without a profiler runs exactly the
+    same code as before. A frame ends when the screen is flipped.
+
+    Attributes:
+        capacity    : Number of frames kept.
+        times       : (capacity, len(PHASES)) seconds spent in each phase per frame.
+        frames      : Number of frames recorded, the newest is at (frames - 1) % capacity.
+        current     : Seconds spent in each phase so far this frame.
+
+    Methods:
+    -------
+    __init__    : Allocate the ring buffer.
+    attach      : Wrap the phases of a game with timers.
+    wrap        : Time a function as a phase.
+    end_frame   : Store the current frame in the ring buffer.
+    recent      : Phase times of the frames kept.
+    summary     : p50, p95 and p99 of each phase in milliseconds.
+    draw        : Draw the summary as an overlay.
+    export      : Write the frames kept to a CSV or JSON file.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Allocate the ring buffer.
+        :param capacity: Number of frames kept
+        """
+        self.capacity = capacity
+        self.times = np.zeros((capacity, len(PHASES)))
+        self.frames = 0
+        self.current = [0.0] * len(PHASES)
+        self._stack = []
+        self._summary = None
+        self._shown = None
+
+    def attach(self, game: 'Game') -> None:
+        """
+        Wrap the phases of a game and its current scene with timers.
+        :param game: A Game with pump_events and present
+        :return:
+        """
+        game.pump_events = self.wrap(game.pump_events, "events")
+        game.present = self.wrap(game.present, "flip", end_frame=True)
+
+        scene = game.current_scene
+        for player in getattr(scene, "players", ()):
+            player.input = self.wrap(player.input, "input")
+            player.move = self.wrap(player.move, "move")
+            player.spriteCollisions = self.wrap(player.spriteCollisions, "collisions")
+        fleet = getattr(scene, "fleet", None)
+        if fleet is not None:
+            fleet.input = self.wrap(fleet.input, "input")
+            fleet.move = self.wrap(fleet.move, "move")
+            fleet.collisions = self.wrap(fleet.collisions, "collisions")
+        if hasattr(scene, "bullets"):
+            scene.bullets.update = self.wrap(scene.bullets.update, "bullets")
+        if getattr(scene, "particles", None) is not None:
+            scene.particles.update = self.wrap(scene.particles.update, "particles")
+        scene.draw = self.wrap(scene.draw, "draw")
+        for name in ("player_display", "debug_display"):
+            if hasattr(scene, name):
+                setattr(scene, name, self.wrap(getattr(scene, name), "hud"))
+
+    def wrap(self, func: Callable, phase: str, end_frame: bool = False) -> Callable:
+        """
+        :param func: Function to time
+        :param phase: One of PHASES
+        :param end_frame: End the frame after each call
+        :return: A function that calls func and adds its time, minus the time of phases inside it, to the phase
+        """
+        index = PHASES.index(phase)
+        current = self.current
+        stack = self._stack
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            stack.append(0.0)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                current[index] += elapsed - stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                if end_frame:
+                    self.end_frame()
+        return timed
+
+    def end_frame(self) -> None:
+        """
+        Store the current frame in the ring buffer and start the next one.
+        :return:
+        """
+        self.times[self.frames % self.capacity] = self.current
+        self.frames += 1
+        self.current[:] = [0.0] * len(PHASES)
+        self._summary = None
+
+    def recent(self) -> np.ndarray:
+        """
+        :return: (frames kept, len(PHASES)) seconds per phase, oldest first.
+        """
+        if self.frames <= self.capacity:
+            return self.times[:self.frames]
+        start = self.frames % self.capacity
+        return np.concatenate([self.times[start:], self.times[:start]])
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        :return: p50, p95 and p99 in milliseconds for each phase and for the whole frame.
+        """
+        if self._summary is None:
+            times = self.recent() * 1000
+            if len(times) == 0:
+                times = np.zeros((1, len(PHASES)))
+            columns = np.column_stack([times, times.sum(axis=1)])
+            values = np.percentile(columns, PERCENTILES, axis=0)
+            self._summary = {name: {f"p{p}": float(v) for p, v in zip(PERCENTILES, values[:, i])}
+                             for i, name in enumerate(PHASES + ("total",))}
+        return self._summary
+
+    def draw(self, screen: pygame.Surface, text: 'TextCache', pos: tuple[int, int] = (10, 70)) -> list[pygame.Rect]:
+        """
+        Draw the summary as one line per phase.
+        :param screen: Surface to draw on
+        :param text: Text cache of the scene
+        :param pos: Top left of the overlay
+        :return: The areas drawn on
+        """
+        # The percentiles only change noticeably over many frames, refreshing them twice a second keeps the text cached
+        if self.frames % 30 == 0 or self._shown is None:
+            self._shown = [[name] + [f"{value:.2f}" for value in row.values()] for name, row in self.summary().items()]
+
+        x, y = pos
+        drawn = []
+        for row in [["phase (ms)"] + [f"p{p}" for p in PERCENTILES]] + self._shown:
+            for column, cell in enumerate(row):
+                drawn.append(screen.blit(text.render(cell), (x + (80 + (column - 1) * 45 if column else 0), y)))
+            y += 16
+        return drawn
+
+    def export(self, path: str) -> None:
+        """
+        Write the frames kept to a file, CSV with one row per frame or JSON with the summary and every frame.
+        :param path: File ending in .csv or .json
+        :return:
+        """
+        times = self.recent() * 1000
+        if path.endswith(".json"):
+            with open(path, "w") as file:
+                json.dump({"phases": PHASES, "summary": self.summary(), "frames_ms": times.round(4).tolist()}, file)
+        else:
+            with open(path, "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(PHASES)
+                writer.writerows(times.round(4).tolist())
+
+
+if TYPE_CHECKING:
+    from game import Game
+    from render.text_cache import TextCache
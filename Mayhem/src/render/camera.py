@@ -0,0 +1,105 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+from config import *
+from render.chunks import ChunkedLayer
+from render.frame_state import FrameState, draw_frame
+
+# Color and width of the line between split screen views
+DIVIDER_COLOR = (0, 0, 0)
+DIVIDER_WIDTH = 2
+
+
+class Camera:
+    """
+    The part of the world one view of the window shows, centered on the ships it follows as far as the edges of the
+    world allow. A world smaller than the view is centered in it.
+
+    Attributes:
+        world       : Size of the world.
+        view        : Area of the window the camera draws in, in RESOLUTION pixels.
+        center      : World point at the center of the view.
+
+    Methods:
+    -------
+    __init__    : Place the camera in the middle of the world.
+    follow      : Center the camera on a point.
+    offset      : Canvas pixel of the world drawn at the top left of the view.
+    """
+
+    def __init__(self, world: tuple[int, int], view: pygame.Rect) -> None:
+        """
+        Place the camera in the middle of the world.
+        :param world: Size of the world
+        :param view: Area of the window the camera draws in
+        """
+        self.world = world
+        self.view = view
+        self.center = (world[0] / 2, world[1] / 2)
+
+    def follow(self, point: tuple[float, float]) -> None:
+        """
+        Center the camera on a point, keeping the view inside the world.
+        :param point: World point
+        :return:
+        """
+        center = []
+        for axis in range(2):
+            half = self.view.size[axis] / 2
+            if self.world[axis] <= 2 * half:
+                center.append(self.world[axis] / 2)
+            else:
+                center.append(min(max(float(point[axis]), half), self.world[axis] - half))
+        self.center = (center[0], center[1])
+
+    def offset(self, scale: float = 1.0) -> tuple[int, int]:
+        """
+        :param scale: Scale of the canvas
+        :return: Canvas pixel of the world drawn at the top left of the view.
+        """
+        return (round((self.center[0] - self.view.width / 2) * scale),
+                round((self.center[1] - self.view.height / 2) * scale))
+
+
+def split_views(count: int, resolution: tuple[int, int] = RESOLUTION) -> list[pygame.Rect]:
+    """
+    :param count: Number of views
+    :param resolution: Size of the window
+    :return: Areas of the window for the views, side by side with a divider between them.
+    """
+    width, height = resolution
+    edges = [round(i * width / count) for i in range(count + 1)]
+    return [pygame.Rect(left + (DIVIDER_WIDTH // 2 if i else 0), 0,
+                        right - left - (DIVIDER_WIDTH // 2 if i else 0) - (DIVIDER_WIDTH // 2 if i < count - 1 else 0),
+                        height)
+            for i, (left, right) in enumerate(zip(edges, edges[1:]))]
+
+
+def draw_views(surface: pygame.Surface, cameras: list[Camera], layer: ChunkedLayer, state: FrameState,
+               alpha: float = 1.0, scale: float = 1.0) -> None:
+    """
+    Draw a frame state through every camera: each camera follows the ships of its entry in state.focus, and its view
+    is covered with the chunks of the static layer under it before the particles, ships and bullets in it are drawn.
+    :param surface: The canvas
+    :param cameras: A camera for each view
+    :param layer: The static layer of the world
+    :param state: The frame state to draw
+    :param alpha: How far the frame is from the previous tick to the current one
+    :param scale: Scale of the canvas, see Viewport
+    :return:
+    """
+    position = state.current if alpha >= 1 else state.previous + (state.current - state.previous) * alpha
+    for camera, ships in zip(cameras, state.focus):
+        if ships:
+            camera.follow(position[list(ships)].mean(axis=0))
+
+        view = pygame.Rect(round(camera.view.left * scale), round(camera.view.top * scale),
+                           round(camera.view.width * scale), round(camera.view.height * scale))
+        target = surface.subsurface(view.clip(surface.get_rect()))
+        offset = camera.offset(scale)
+        layer.draw(target, offset, scale)
+        draw_frame(target, state, alpha, scale, offset)
+    layer.end_frame()
+
+    for camera in cameras[1:]:
+        left = round((camera.view.left - DIVIDER_WIDTH // 2) * scale)
+        surface.fill(DIVIDER_COLOR, (left, 0, max(1, round(DIVIDER_WIDTH * scale)), surface.get_height()))
@@ -0,0 +1,147 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+from config import *
+from sprites.static_group import StaticGroup
+
+
+class ChunkedLayer:
+    """
+    The background, walls and fuel pads of a world larger than the window, cut into square chunks that are rendered
+    the first time a view scrolls over them.
+
+    The walls and fuel pads are bucketed by the chunks they touch once, so rendering a chunk only fills the rects in
+    it. Chunks are rendered at the scale of the canvas. At the end of every frame the chunks more than
+    STATIC_CHUNK_MARGIN chunks away from every view are dropped and one missing chunk inside the margin is rendered
+    ahead of time, so the memory and time drawing takes depend on the size of the window and not on the size of the
+    world.
+
+    Attributes:
+        background  : Background color.
+        groups      : StaticGroups drawn on top of the background, in order.
+        chunk_size  : Width and height of a chunk in world pixels.
+        chunks      : Rendered chunks by (column, row, scale).
+        _index      : (rect, color) of every wall and fuel pad by the (column, row) of the chunks it touches.
+        _wanted     : (scale, first column, first row, last column, last row) of the chunks around each view drawn
+                      this frame.
+
+    Methods:
+    -------
+    __init__    : Bucket the groups.
+    refresh     : Bucket the groups again and drop every chunk if any of them has changed.
+    chunk       : A rendered chunk.
+    draw        : Draw the chunks under a view.
+    end_frame   : Drop the chunks far from every view and render one close to a view.
+    """
+
+    def __init__(self, background: tuple[int, int, int], *groups: StaticGroup,
+                 chunk_size: int = STATIC_CHUNK_SIZE) -> None:
+        """
+        Bucket the groups.
+        :param background: Background color.
+        :param groups: StaticGroups drawn on top of the background, in order.
+        :param chunk_size: Width and height of a chunk in world pixels.
+        """
+        self.background = background
+        self.groups = groups
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        self._index = {}
+        self._versions = None
+        self._wanted = []
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Bucket the walls and fuel pads again if a sprite has been added to or removed from any of the groups.
+        :return: True if the groups have changed.
+        """
+        versions = tuple(group.version for group in self.groups)
+        if versions == self._versions:
+            return False
+
+        self._versions = versions
+        self.chunks.clear()
+        self._index = {}
+        size = self.chunk_size
+        for group in self.groups:
+            for sprite in group:
+                rect = sprite.rect
+                for column in range(rect.left // size, (rect.right - 1) // size + 1):
+                    for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                        self._index.setdefault((column, row), []).append((rect, sprite.color))
+        return True
+
+    def chunk(self, column: int, row: int, scale: float) -> pygame.Surface:
+        """
+        :param column: Column of the chunk
+        :param row: Row of the chunk
+        :param scale: Scale of the canvas
+        :return: The chunk rendered at the scale, rendered now if it has not been yet.
+        """
+        key = (column, row, scale)
+        surface = self.chunks.get(key)
+        if surface is not None:
+            return surface
+
+        # Chunk edges are rounded the same way for neighbouring chunks, so scaled chunks meet without gaps
+        size = self.chunk_size
+        left, top = round(column * size * scale), round(row * size * scale)
+        right, bottom = round((column + 1) * size * scale), round((row + 1) * size * scale)
+        surface = pygame.Surface((right - left, bottom - top))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        surface.fill(self.background)
+        bounds = surface.get_rect()
+        for rect, color in self._index.get((column, row), ()):
+            x, y = round(rect.left * scale), round(rect.top * scale)
+            scaled = pygame.Rect(x - left, y - top, round(rect.right * scale) - x, round(rect.bottom * scale) - y)
+            surface.fill(color, scaled.clip(bounds))
+        self.chunks[key] = surface
+        return surface
+
+    def draw(self, surface: pygame.Surface, offset: tuple[int, int], scale: float = 1.0) -> None:
+        """
+        Draw the chunks under a view, covering the whole surface.
+        :param surface: The surface of the view
+        :param offset: Canvas pixel of the world drawn at the top left of the surface
+        :param scale: Scale of the canvas
+        :return:
+        """
+        step = self.chunk_size * scale
+        width, height = surface.get_size()
+        first_column, first_row = int(offset[0] // step), int(offset[1] // step)
+        last_column, last_row = int((offset[0] + width - 1) // step), int((offset[1] + height - 1) // step)
+        surface.blits([(self.chunk(column, row, scale),
+                        (round(column * self.chunk_size * scale) - offset[0],
+                         round(row * self.chunk_size * scale) - offset[1]))
+                       for column in range(first_column, last_column + 1)
+                       for row in range(first_row, last_row + 1)], False)
+
+        margin = STATIC_CHUNK_MARGIN
+        self._wanted.append((scale, first_column - margin, first_row - margin, last_column + margin, last_row + margin))
+
+    def end_frame(self) -> None:
+        """
+        Drop the chunks that are not within STATIC_CHUNK_MARGIN chunks of a view drawn this frame, including every
+        chunk of another scale, and render the first missing chunk that is.
+        :return:
+        """
+        if not self._wanted:
+            return
+        wanted = self._wanted
+        self._wanted = []
+
+        def near(key: tuple[int, int, float]) -> bool:
+            column, row, scale = key
+            return any(scale == view[0] and view[1] <= column <= view[3] and view[2] <= row <= view[4]
+                       for view in wanted)
+
+        for key in [key for key in self.chunks if not near(key)]:
+            del self.chunks[key]
+
+        for scale, first_column, first_row, last_column, last_row in wanted:
+            for column in range(first_column, last_column + 1):
+                for row in range(first_row, last_row + 1):
+                    if (column, row, scale) not in self.chunks:
+                        self.chunk(column, row, scale)
+                        return
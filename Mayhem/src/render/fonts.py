@@ -0,0 +1,69 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import json
+import os
+import pygame
+from config import *
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fonts already loaded by this process, by (name, size). Fonts can not be used once pygame has quit, so they are
+# forgotten then.
+_fonts = {}
+
+
+def font_cache_path() -> str:
+    """
+    :return: The file resolved font paths are kept in.
+    """
+    directory = os.path.join(SOURCE_DIR, ".cache") if ASSET_CACHE_DIR is None else ASSET_CACHE_DIR
+    return os.path.join(directory, "fonts.json")
+
+
+def load_font(name: str, size: int) -> pygame.font.Font:
+    """
+    The same font as pygame.font.SysFont(name, size), without searching the system fonts on every launch.
+
+    pygame.font.SysFont lists every installed font (by running fc-list on Linux) the first time it is called in a
+    process. The file a name resolves to is kept in the asset cache instead, so only the first launch searches. A font
+    that is not installed is cached as missing and the default font is used, like SysFont does. Delete the cache to
+    pick up newly installed fonts.
+    :param name: Font name
+    :param size: Size in points
+    :return: Font
+    """
+    font = _fonts.get((name, size))
+    if font is None:
+        if not _fonts:
+            # pygame drops its quit functions once it has called them, so this is registered again after every quit
+            pygame.register_quit(_fonts.clear)
+        path = _resolve(name)
+        font = _fonts[(name, size)] = pygame.font.Font(path or None, size)
+    return font
+
+
+def _resolve(name: str) -> str:
+    """
+    :return: Path of the font file for a name, "" when no installed font matches.
+    """
+    cache = font_cache_path()
+    try:
+        with open(cache) as file:
+            paths = json.load(file)
+    except (OSError, ValueError):
+        paths = {}
+
+    path = paths.get(name)
+    if path is not None and (path == "" or os.path.exists(path)):
+        return path
+
+    paths[name] = path = pygame.font.match_font(name) or ""
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        temporary = f"{cache}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(paths, file, indent=2)
+        os.replace(temporary, cache)
+    except OSError:
+        # Not being able to write the cache only means the next launch searches again
+        pass
+    return path
@@ -0,0 +1,206 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+from typing import TYPE_CHECKING, NamedTuple
+import numpy as np
+import pygame
+from sprites.bullets import Bullets
+from sprites.particles import Particles
+from render.viewport import scaled_image
+
+# Size of the grid squares particles mark as drawn on, see draw_particles
+PARTICLE_DIRTY_CELL = 64
+# Share of the squares marked at which the whole surface is returned as drawn on instead
+PARTICLE_DIRTY_SHARE = 0.25
+
+
+class FrameState(NamedTuple):
+    """
+    Everything a frame draws of a tick, copied out of the match. A frame can be drawn from it while the next ticks are
+    simulated, so drawing never reads a ship or bullet the simulation is changing.
+
+    Attributes:
+        tick        : Tick the state was copied at.
+        images      : Image of every ship.
+        previous    : (ships, 2) ship centers at the previous tick.
+        current     : (ships, 2) ship centers.
+        topleft     : (ships, 2) where each ship is drawn at the tick itself.
+        bullets     : (bullets, 4) position and velocity of every bullet.
+        particles   : (particles, 5) position, velocity and index into Particles.get_images of every particle.
+        hud         : (text, position) of every HUD line.
+        lines       : (color, start, end) of every debug line.
+        focus       : Ships each camera follows, one entry per view, see render.camera (empty without cameras).
+    """
+    tick: int
+    images: list[pygame.Surface]
+    previous: np.ndarray
+    current: np.ndarray
+    topleft: np.ndarray
+    bullets: np.ndarray
+    particles: np.ndarray
+    hud: tuple[tuple[str, tuple[int, int]], ...]
+    lines: tuple[tuple[tuple[int, int, int], tuple[float, float], tuple[float, float]], ...]
+    focus: tuple[tuple[int, ...], ...] = ()
+
+
+class FrameBuffers:
+    """
+    Two sets of arrays frame states are copied into, used in turn. The state drawn last frame stays untouched while the
+    next one is written, so the simulation can copy a state out while the previous one is drawn, and no arrays are
+    allocated per frame once they are big enough.
+
+    Attributes:
+        _slots      : Arrays of each set by name.
+        _back       : The set the next state is written to.
+
+    Methods:
+    -------
+    __init__    : Create the two empty sets.
+    array       : An array of the set being written.
+    swap        : Start writing the other set.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create the two empty sets.
+        """
+        self._slots = ({}, {})
+        self._back = 0
+
+    def array(self, name: str, rows: int, columns: int, dtype: type = float) -> np.ndarray:
+        """
+        :param name: Name of the array in the set
+        :param rows: Rows needed
+        :param columns: Columns of the array
+        :param dtype: Type of the values
+        :return: A (rows, columns) view of the set being written, the array grows to twice the rows when too small.
+        """
+        slot = self._slots[self._back]
+        array = slot.get(name)
+        if array is None or len(array) < rows:
+            array = slot[name] = np.empty((max(2 * rows, 16), columns), dtype=dtype)
+        return array[:rows]
+
+    def swap(self) -> None:
+        """
+        Start writing the other set, a state stays valid until the set after it has been written.
+        :return:
+        """
+        self._back ^= 1
+
+
+def draw_frame(surface: pygame.Surface, state: FrameState, alpha: float = 1.0, scale: float = 1.0,
+               offset: tuple[int, int] = (0, 0)) -> list[pygame.Rect]:
+    """
+    Draw the particles, ships and bullets of a frame state. With an offset the surface is the view of a camera on a
+    larger world, and only what is on it is drawn.
+    :param surface: Surface to draw on
+    :param state: The state to draw
+    :param alpha: How far the frame is from the previous tick to the current one, ships and bullets are drawn that far
+    along their last step
+    :param scale: Scale of the surface, see Viewport
+    :param offset: Canvas pixel of the world drawn at the top left of the surface, see Camera.offset
+    :return: The areas drawn on.
+    """
+    drawn = draw_particles(surface, state.particles, alpha, scale, offset)
+
+    images = state.images if scale == 1 else [scaled_image(image, scale) for image in state.images]
+    if alpha >= 1 and scale == 1 and offset == (0, 0):
+        topleft = state.topleft.astype(int).tolist()
+    else:
+        pos = state.current if alpha >= 1 else state.previous + (state.current - state.previous) * alpha
+        sizes = np.array([image.get_size() for image in images], dtype=float).reshape(-1, 2)
+        corners = np.round(pos * scale) - sizes // 2 - offset
+        if offset != (0, 0):
+            # Only the ships on the view of the camera are drawn
+            visible = np.flatnonzero(_on_surface(surface, corners, sizes.max(initial=0)))
+            images = [images[i] for i in visible.tolist()]
+            corners = corners[visible]
+        topleft = corners.astype(int).tolist()
+    drawn += surface.blits(list(zip(images, topleft)))
+
+    bullets = state.bullets
+    if len(bullets):
+        # Bullets move in straight lines, so their position last tick is one velocity back
+        pos = bullets[:, :2] if alpha >= 1 else bullets[:, :2] - bullets[:, 2:] * (1 - alpha)
+        image = scaled_image(Bullets.get_image(), scale)
+        corners = np.round(pos * scale) - np.array(image.get_size()) // 2 - offset
+        if offset != (0, 0):
+            corners = corners[_on_surface(surface, corners, max(image.get_size()))]
+        drawn += surface.blits([(image, xy) for xy in corners.astype(int).tolist()])
+    return drawn
+
+
+def _on_surface(surface: pygame.Surface, corners: np.ndarray, size: float) -> np.ndarray:
+    """
+    :param surface: Surface drawn on
+    :param corners: (n, 2) top left corners images are drawn at
+    :param size: Largest width or height of the images
+    :return: (n,) True for the images that overlap the surface.
+    """
+    width, height = surface.get_size()
+    return ((corners[:, 0] > -size) & (corners[:, 0] < width) &
+            (corners[:, 1] > -size) & (corners[:, 1] < height))
+
+
+def draw_particles(surface: pygame.Surface, particles: np.ndarray, alpha: float = 1.0, scale: float = 1.0,
+                   offset: tuple[int, int] = (0, 0)) -> list[pygame.Rect]:
+    """
+    Draw particles with one batched blit. Thousands of particles would make thousands of dirty rects, so the areas
+    drawn on are returned as the squares of a coarse grid the particles are in instead, or as the whole surface once
+    that is cheaper to restore.
+    :param surface: Surface to draw on
+    :param particles: (particles, 5) rows of FrameState.particles
+    :param alpha: How far the frame is from the previous tick to the current one
+    :param scale: Scale of the surface, see Viewport
+    :param offset: Canvas pixel of the world drawn at the top left of the surface
+    :return: The areas drawn on.
+    """
+    if len(particles) == 0:
+        return []
+    images = [scaled_image(image, scale) for image in Particles.get_images()]
+    size = max(max(image.get_size()) for image in images)
+    pos = particles[:, :2] if alpha >= 1 else particles[:, :2] - particles[:, 2:4] * (1 - alpha)
+    topleft = (np.round(pos * scale) - size // 2 - offset).astype(int)
+    kind = particles[:, 4].astype(int)
+    if offset != (0, 0):
+        # Particles off the view of the camera are left out of the blit
+        visible = _on_surface(surface, topleft, size)
+        topleft, kind = topleft[visible], kind[visible]
+    surface.blits(list(zip([images[i] for i in kind.tolist()], topleft.tolist())), False)
+
+    # Mark the squares of the grid over the surface, particles off the surface are not drawn on it
+    width, height = surface.get_size()
+    columns, rows = -(-width // PARTICLE_DIRTY_CELL), -(-height // PARTICLE_DIRTY_CELL)
+    cells = topleft // PARTICLE_DIRTY_CELL
+    inside = (cells[:, 0] >= -1) & (cells[:, 0] < columns) & (cells[:, 1] >= -1) & (cells[:, 1] < rows)
+    grid = np.zeros((rows + 1, columns + 1), dtype=bool)
+    grid[cells[inside, 1] + 1, cells[inside, 0] + 1] = True
+    row, column = np.nonzero(grid)
+    if len(row) > grid.size * PARTICLE_DIRTY_SHARE:
+        # Restoring many overlapping squares costs more than restoring the whole surface once
+        return [surface.get_rect()]
+    extent = PARTICLE_DIRTY_CELL + size
+    return [pygame.Rect(x, y, extent, extent)
+            for x, y in zip(((column - 1) * PARTICLE_DIRTY_CELL).tolist(), ((row - 1) * PARTICLE_DIRTY_CELL).tolist())]
+
+
+def draw_hud(surface: pygame.Surface, text: 'TextCache', state: FrameState, scale: float = 1.0,
+             offset: tuple[int, int] = (0, 0)) -> list[pygame.Rect]:
+    """
+    Draw the HUD text and debug lines of a frame state.
+    :param surface: Surface to draw on
+    :param text: Text cache of the scene
+    :param state: The state to draw
+    :param scale: Scale of the surface, see Viewport
+    :param offset: Canvas pixel of the world at the top left of the surface, the debug lines are in the world
+    :return: The areas drawn on.
+    """
+    drawn = [surface.blit(scaled_image(text.render(line), scale), (round(x * scale), round(y * scale)))
+             for line, (x, y) in state.hud]
+    for color, (x1, y1), (x2, y2) in state.lines:
+        drawn.append(pygame.draw.aaline(surface, color, (x1 * scale - offset[0], y1 * scale - offset[1]),
+                                        (x2 * scale - offset[0], y2 * scale - offset[1]), 1))
+    return drawn
+
+
+if TYPE_CHECKING:
+    from render.text_cache import TextCache
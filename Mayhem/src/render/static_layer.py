@@ -0,0 +1,86 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+from sprites.static_group import StaticGroup
+from render.viewport import scale_surface
+
+
+class StaticLayer:
+    """
+    The background, walls and fuel pads baked into a single surface.
+
+    Attributes:
+        size        : Size of the layer.
+        background  : Background color.
+        groups      : StaticGroups drawn on top of the background, in order.
+        surface     : The baked layer.
+
+    Methods:
+    -------
+    __init__    : Bake the layer.
+    refresh     : Rebake the layer if any of the groups has changed.
+    scaled      : The layer at a scale.
+    restore     : Copy parts of the layer back onto a surface.
+    """
+
+    def __init__(self, size: tuple[int, int], background: tuple[int, int, int], *groups: StaticGroup,
+                 surface: pygame.Surface = None) -> None:
+        """
+        Bake the layer.
+        :param size: Size of the layer.
+        :param background: Background color.
+        :param groups: StaticGroups drawn on top of the background, in order.
+        :param surface: The groups already baked, like the layer of a compiled map. Used until a group changes.
+        """
+        self.size = size
+        self.background = background
+        self.groups = groups
+        self.surface = surface
+        self._versions = None
+        self._scaled = {}
+        if surface is not None:
+            self._versions = tuple(group.version for group in self.groups)
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Rebake the layer if a sprite has been added to or removed from any of the groups.
+        :return: True if the layer was rebaked.
+        """
+        versions = tuple(group.version for group in self.groups)
+        if versions == self._versions:
+            return False
+
+        self._versions = versions
+        self._scaled.clear()
+        if self.surface is None:
+            self.surface = pygame.Surface(self.size)
+            if pygame.display.get_surface() is not None:
+                self.surface = self.surface.convert()
+
+        self.surface.fill(self.background)
+        for group in self.groups:
+            group.draw(self.surface)
+        return True
+
+    def scaled(self, scale: float) -> pygame.Surface:
+        """
+        :param scale: Scale of the canvas the layer is drawn on
+        :return: The layer at that scale, scaled once until the layer is rebaked.
+        """
+        if scale == 1:
+            return self.surface
+        surface = self._scaled.get(scale)
+        if surface is None:
+            surface = self._scaled[scale] = scale_surface(self.surface, scale)
+        return surface
+
+    def restore(self, surface: pygame.Surface, rects: list[pygame.Rect], scale: float = 1.0) -> None:
+        """
+        Copy the layer back onto the parts of a surface that have been drawn over.
+        :param surface: Surface to restore, usually the screen.
+        :param rects: Areas to restore.
+        :param scale: Scale of the surface.
+        :return:
+        """
+        layer = self.scaled(scale)
+        surface.blits([(layer, rect, rect) for rect in rects], False)
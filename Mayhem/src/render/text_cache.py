@@ -0,0 +1,52 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+from collections import OrderedDict
+import pygame
+from config import *
+
+
+class TextCache:
+    """
+    Rendered text surfaces keyed by their content, so HUD text is only rendered again when it changes.
+
+    The least recently used surface is dropped once the cache holds `capacity` of them.
+
+    Attributes:
+        font        : Font used to render.
+        color       : Text color.
+        capacity    : Max number of surfaces kept.
+
+    Methods:
+    -------
+    __init__    : Create an empty cache.
+    render      : Rendered surface for a string.
+    """
+
+    def __init__(self, font: pygame.font.Font, color: tuple[int, int, int] = (0, 0, 0),
+                 capacity: int = HUD_TEXT_CACHE_SIZE) -> None:
+        """
+        Create an empty cache.
+        :param font: Font used to render.
+        :param color: Text color.
+        :param capacity: Max number of surfaces kept.
+        """
+        self.font = font
+        self.color = color
+        self.capacity = capacity
+        self._surfaces = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    def render(self, text: str) -> pygame.Surface:
+        """
+        :param text: Text to render.
+        :return: The rendered text, shared with every earlier call with the same text.
+        """
+        surface = self._surfaces.get(text)
+        if surface is None:
+            surface = self._surfaces[text] = self.font.render(text, True, self.color)
+            if len(self._surfaces) > self.capacity:
+                self._surfaces.popitem(last=False)
+        else:
+            self._surfaces.move_to_end(text)
+        return surface
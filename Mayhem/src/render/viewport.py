@@ -0,0 +1,180 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import weakref
+import pygame
+from config import *
+
+# Frames in a row drawn at a new size before the size can change again, so a single slow frame doesn't flicker
+SETTLE_FRAMES = 60
+# Weight of the newest frame in the average time a frame takes to draw
+DRAW_TIME_SMOOTHING = 0.1
+
+# Scaled copies of images by scale, dropped together with the image they were scaled from
+_scaled = {}
+
+
+def scale_surface(surface: pygame.Surface, scale: float) -> pygame.Surface:
+    """
+    :param surface: Surface to scale
+    :param scale: Scale of the copy, at least one pixel is kept either way
+    :return: A scaled copy of the surface, filtered when SMOOTH_SCALING is on and the surface allows it.
+    """
+    width, height = surface.get_size()
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if SMOOTH_SCALING and surface.get_bitsize() >= 24:
+        return pygame.transform.smoothscale(surface, size)
+    return pygame.transform.scale(surface, size)
+
+
+def scaled_image(image: pygame.Surface, scale: float) -> pygame.Surface:
+    """
+    A scaled copy of an image that never changes, like a rotated ship or a rendered line of HUD text. Copies are scaled
+    the first time they are asked for.
+    :param image: Image to scale
+    :param scale: Scale of the copy
+    :return: The image itself at scale 1, otherwise the scaled copy.
+    """
+    if scale == 1:
+        return image
+    images = _scaled.get(scale)
+    if images is None:
+        images = _scaled[scale] = weakref.WeakKeyDictionary()
+    scaled = images.get(image)
+    if scaled is None:
+        scaled = images[image] = scale_surface(image, scale)
+    return scaled
+
+
+class Viewport:
+    """
+    The window, and the canvas frames are drawn on before they are scaled up to it.
+
+    Frames are drawn at one of the RENDER_SCALES of RESOLUTION and scaled to fit the window once per frame, keeping
+    the aspect of the map with black bars around it. The players and bullets keep moving in RESOLUTION coordinates,
+    only drawing is scaled. When the canvas is as big as the window frames are drawn straight on the window instead,
+    and only the areas that changed are pushed to the display, like before there was a canvas.
+
+    The first scale is used at start. With more than one scale, the canvas drops to the next smaller one when drawing
+    and presenting take longer than RENDER_BUDGET of a frame at FPS, and goes back up once they take less than half.
+    With GPU_SCALING, SDL scales the window instead (pygame.SCALED), which is cheapest but keeps the first scale.
+
+    Attributes:
+        window      : The display surface.
+        canvas      : Surface frames are drawn on, the window itself when it has the size of the canvas.
+        scale       : Size of the canvas as a share of RESOLUTION.
+        level       : Index of the scale in RENDER_SCALES.
+        _fit        : Area of the window the canvas is scaled into.
+        _target     : The window inside _fit.
+        _draw_time  : Average seconds a frame took to draw and present at this scale, None right after a change.
+        _settle     : Frames left before the scale may change again.
+
+    Methods:
+    -------
+    __init__    : Open the window.
+    resize      : Fit the canvas to the window after it has been resized.
+    present     : Push a drawn frame to the display.
+    adapt       : Pick the scale for the next frames from the time the last one took.
+    """
+
+    def __init__(self, resolution: tuple[int, int] = RESOLUTION) -> None:
+        """
+        Open the window at the resolution of the map.
+        :param resolution: Size of the map
+        """
+        self.resolution = resolution
+        self.level = 0
+        self.scale = RENDER_SCALES[0]
+        self.canvas = None
+        self._draw_time = None
+        self._settle = SETTLE_FRAMES
+
+        flags = pygame.RESIZABLE if WINDOW_RESIZABLE else 0
+        if GPU_SCALING:
+            self.window = pygame.display.set_mode(self.canvas_size(), flags | pygame.SCALED)
+        else:
+            self.window = pygame.display.set_mode(resolution, flags)
+        self._layout()
+
+    def canvas_size(self) -> tuple[int, int]:
+        """
+        :return: Size of the canvas at the current scale.
+        """
+        return round(self.resolution[0] * self.scale), round(self.resolution[1] * self.scale)
+
+    def resize(self) -> bool:
+        """
+        Fit the canvas to the window after it has been resized.
+        :return: True if the canvas has changed, and has to be drawn in full.
+        """
+        self.window = pygame.display.get_surface()
+        return self._layout()
+
+    def present(self, changed: list[pygame.Rect] | None) -> None:
+        """
+        Push a drawn frame to the display.
+        :param changed: Areas of the canvas that changed, None if all of it did
+        :return:
+        """
+        if self.canvas is self.window:
+            # Only push the parts of the screen that changed, unless everything did
+            if changed is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(changed)
+            return
+
+        if SMOOTH_SCALING and self.canvas.get_bitsize() >= 24:
+            pygame.transform.smoothscale(self.canvas, self._fit.size, self._target)
+        else:
+            pygame.transform.scale(self.canvas, self._fit.size, self._target)
+        pygame.display.update(self._fit)
+
+    def adapt(self, seconds: float) -> bool:
+        """
+        Pick the scale for the next frames.
+        :param seconds: Time the last frame took to draw and present
+        :return: True if the canvas has changed, and has to be drawn in full.
+        """
+        if len(RENDER_SCALES) < 2 or GPU_SCALING or not FPS:
+            return False
+        if self._draw_time is None:
+            self._draw_time = seconds
+        self._draw_time += (seconds - self._draw_time) * DRAW_TIME_SMOOTHING
+        if self._settle > 0:
+            self._settle -= 1
+            return False
+
+        budget = RENDER_BUDGET / FPS
+        if self._draw_time > budget and self.level < len(RENDER_SCALES) - 1:
+            self.level += 1
+        elif self._draw_time < budget / 2 and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+        self.scale = RENDER_SCALES[self.level]
+        self._draw_time = None
+        self._settle = SETTLE_FRAMES
+        return self._layout()
+
+    def _layout(self) -> bool:
+        """
+        Size the canvas for the scale and fit it into the window.
+        :return: True if the canvas has changed.
+        """
+        size = self.canvas_size()
+        previous = self.canvas
+        if GPU_SCALING or size == self.window.get_size():
+            self.canvas = self.window
+            self._fit = self._target = None
+            return self.canvas is not previous
+
+        width, height = self.window.get_size()
+        fit = min(width / size[0], height / size[1])
+        self._fit = pygame.Rect(0, 0, round(size[0] * fit), round(size[1] * fit))
+        self._fit.center = (width // 2, height // 2)
+        self._target = self.window.subsurface(self._fit)
+        self.window.fill((0, 0, 0))
+        pygame.display.flip()
+
+        if previous is None or previous is self.window or previous.get_size() != size:
+            self.canvas = pygame.Surface(size).convert()
+        return self.canvas is not previous
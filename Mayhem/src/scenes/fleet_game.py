@@ -0,0 +1,238 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import numpy as np
+import pygame
+from config import*
+from typing import TYPE_CHECKING
+from sprites.fleet import Fleet
+from sprites.bullets import Bullets
+from sprites.particles import Particles
+from maps.compiler import CompiledMap, load_map
+from physics.spatial_hash import SpatialHash
+from physics.sweep import overlaps
+from render.text_cache import TextCache
+from render.fonts import load_font
+from render.frame_state import FrameState, FrameBuffers, draw_hud
+from scenes.world_scene import WorldScene
+from sim.policies import random_actions
+from sim.bots import nav_actions
+
+# Distance between the points ships can spawn on
+SPAWN_SPACING = 40
+
+
+class FleetGame(WorldScene):
+    """
+    A match with many ships on one map. The first ships are played from the keyboard with the PLAYER_CONTROLS, every
+    other ship is a bot pressing random keys, or flying with the navigation grid of the map if FLEET_BOTS is "nav".
+
+    Attributes:
+        game            : The main game class
+        font            : front style & size
+        text            : Cache of rendered HUD text (None when headless)
+        game_map        : The compiled map the match is played on
+        objects         : Walls of the map
+        fuel_pads       : Fuel pads of the map
+        pad_rects       : (pads, 4) rects of the fuel pads, in group order
+        spatial_hash    : Holds the wall index the bullets and ships collide with
+        spawn_points    : (ships, 2) respawn point of each ship
+        bullets         : Array-backed store for every bullet, ship i is owner i
+        particles       : Array-backed store for the particles of effects (None when headless)
+        telemetry       : TelemetryBus the events of the ships are appended to (None when not recorded)
+        fleet           : Every ship of the match
+        humans          : Number of ships played from the keyboard
+        bots            : Returns the actions of every ship for a tick
+        static_layer    : Background, walls and fuel pads baked into one surface (None when headless or scrolling)
+        chunks          : Background, walls and fuel pads of a scrolling world, rendered in chunks (None otherwise)
+        cameras         : Views on a world larger than the window or split between players (None otherwise)
+        dirty_rects     : Screen areas drawn over last frame, restored from the static layer next frame
+        frames          : Buffers the frame states are copied into
+
+    Methods:
+    -------
+    __init__            : Initializes the map, ships and bullets.
+    handle_events       : Step every ship with the keyboard and bot input.
+    update              : Update the bullets for each frame.
+    capture             : Copy what a frame draws of the current tick.
+    draw                : Draw the ships, bullets and the HUD.
+    reset               : Start a new match with the same map.
+    player_display      : Scores of the keyboard players and the leading ship.
+    debug_display       : FPS counter and debug overlays.
+    """
+
+    def __init__(self, game: 'Game', ships: int = FLEET_SHIPS, map_name: str = None, humans: int = None,
+                 seed: int = 0) -> None:
+        """
+        Initializes the map, ships and bullets.
+        :param game:
+        :param ships: Number of ships
+        :param map_name: Map to play on, MAP by default
+        :param humans: Ships played from the keyboard, every set of PLAYER_CONTROLS by default and none when headless
+        :param seed: Seed of the bots
+        :raise ValueError: FLEET_BOTS is neither "random" nor "nav".
+        """
+        self.game = game
+        self.particles = Particles() if PARTICLES and not self.game.headless else None
+        self.telemetry = None
+
+        self.game_map = load_map(map_name or MAP, self.game.resolution)
+        self.font = None if self.game.headless else load_font("arial", 14)
+        self.text = None if self.game.headless else TextCache(self.font)
+
+        self.objects = self.game_map.objects()
+        self.fuel_pads = self.game_map.fuel_pads()
+        self.pad_rects = np.array([[p.rect.left, p.rect.top, p.rect.right, p.rect.bottom] for p in self.fuel_pads],
+                                  dtype=float).reshape(-1, 4)
+        self.spatial_hash = SpatialHash()
+        self.spatial_hash.insert_static(self.objects, self.fuel_pads, walls=self.game_map.wall_index)
+
+        self.spawn_points = spread_spawns(self.game_map, ships, self.pad_rects)
+        self.bullets = Bullets(self)
+        self.bullets.restore(np.zeros((0, 2)), np.zeros((0, 2)), np.zeros(0), np.zeros(0), np.zeros(0, dtype=int),
+                             list(range(ships)))
+        self.fleet = Fleet(self, self.spawn_points)
+
+        if humans is None:
+            humans = 0 if self.game.headless else len(PLAYER_CONTROLS)
+        self.humans = min(humans, ships, len(PLAYER_CONTROLS))
+        if FLEET_BOTS == "nav":
+            self.bots = nav_actions(self)
+        elif FLEET_BOTS == "random":
+            self.bots = random_actions(seed, ships, FLEET_BOT_HOLD)
+        else:
+            raise ValueError(f'FLEET_BOTS must be "random" or "nav", not {FLEET_BOTS!r}')
+
+        # A world the size of the window is drawn from one layer, larger worlds and split screens scroll with cameras
+        self.setup_view(self.humans if SPLIT_SCREEN and self.humans > 1 else 1)
+        self.frames = FrameBuffers()
+
+    def handle_events(self, keys: tuple[bool, ...]) -> None:
+        """
+        Step every ship, the keyboard players with their controls and the others with the bots.
+        :param keys: keyboard
+        :return:
+        """
+        actions = self.bots(self.game.tick)
+        for ship, controls in enumerate(PLAYER_CONTROLS[:self.humans]):
+            actions[ship] = [keys[key] for key in controls]
+        self.fleet.update(actions)
+
+    def update(self) -> None:
+        """
+        Update the objects that move on their own each frame.
+        :return:
+        """
+        self.bullets.update()
+        if self.particles is not None:
+            self.particles.update()
+
+    def capture(self) -> FrameState:
+        """
+        Copy what a frame draws of the current tick: the ships, bullets and HUD text.
+        :return: The frame state, it stays valid until the second capture after it.
+        """
+        frames = self.frames
+        fleet = self.fleet
+        previous = frames.array("previous", fleet.count, 2)
+        current = frames.array("current", fleet.count, 2)
+        topleft = frames.array("topleft", fleet.count, 2)
+        images = fleet.capture(previous, current, topleft)
+        bullets = frames.array("bullets", self.bullets.count, 4)
+        self.bullets.capture(bullets)
+        particles = frames.array("particles", self.particles.count() if self.particles is not None else 0, 5)
+        if len(particles):
+            self.particles.capture(particles)
+        frames.swap()
+
+        leader = int(np.argmax(fleet.score))
+        scores = "       ".join(
+            ["Player " + str(i + 1) + ": " + str(fleet.score[i]) for i in range(self.humans)] +
+            ["Ships: " + str(fleet.count), "Best: Ship " + str(leader + 1) + ": " + str(fleet.score[leader])])
+        hud = ((scores, ((RESOLUTION[0] // 2) - 100, RESOLUTION[1] - 100)),)
+        if self.humans:
+            fuel = "       ".join("Fuel: " + str(round(fleet.fuel[i]/FUEL*100)) + "%" for i in range(self.humans))
+            hud += ((fuel, ((RESOLUTION[0] // 2) - 100, RESOLUTION[1] - 80)),)
+        # Split views follow one keyboard player each, a single view follows them all or the leading ship
+        focus = ()
+        if self.cameras is not None:
+            focus = ((tuple(range(self.humans)) or (leader,),) if len(self.cameras) == 1 else
+                     tuple((i,) for i in range(len(self.cameras))))
+        return FrameState(self.game.tick, images, previous, current, topleft, bullets, particles, hud, (), focus)
+
+    def draw(self, alpha: float = 1.0, state: FrameState = None) -> list[pygame.Rect] | None:
+        """
+        Draw the ships, bullets and HUD on top of the static layer, restoring only what was drawn over last frame, or
+        through the cameras on a scrolling world.
+        :param alpha: How far the frame is between the previous tick and the current one
+        :param state: The frame state to draw, the current tick by default
+        :return: The areas of the screen that changed, or None if the whole screen changed.
+        """
+        state = self.capture() if state is None else state
+        return self.draw_world(state, alpha)
+
+    def reset(self) -> None:
+        """
+        Start a new match with the same map: bullets are removed and every ship respawns with its stats reset.
+        :return:
+        """
+        self.bullets.clear()
+        self.fleet.reset()
+        if self.particles is not None:
+            self.particles.clear()
+
+    def player_display(self, state: FrameState) -> list[pygame.Rect]:
+        """
+        Displays score and fuel of the keyboard players and the best score of all ships
+        :param state: The frame state being drawn
+        :return: The areas drawn on
+        """
+        return draw_hud(self.game.screen, self.text, state, self.game.viewport.scale)
+
+    def debug_display(self, state: FrameState) -> list[pygame.Rect]:
+        """
+        Displays the FPS counter and the phase times when they are turned on
+        :param state: The frame state being drawn
+        :return: The areas drawn on
+        """
+        screen = self.game.screen
+        drawn = []
+        if SHOW_FPS:
+            fps = self.text.render(str(int(self.game.clock.get_fps())))
+            drawn.append(screen.blit(fps, (10, fps.get_height()-40)))
+        if DEBUG_MODE and self.game.profiler:
+            drawn += self.game.profiler.draw(screen, self.text)
+        return drawn
+
+
+def spread_spawns(game_map: CompiledMap, ships: int, pad_rects: np.ndarray) -> np.ndarray:
+    """
+    Spawn points for every ship: the spawn points of the map first, then free points spread over the whole map.
+    :param game_map: Map of the match
+    :param ships: Number of ships
+    :param pad_rects: Rects of the fuel pads
+    :return: (ships, 2) spawn points
+    :raise ValueError: The map has no room for that many ships.
+    """
+    spawns = game_map.spawn_points[:ships]
+    if ships <= len(spawns):
+        return spawns.copy()
+
+    # Points on a grid whose surroundings touch no wall, fuel pad or spawn point of the map
+    width, height = game_map.size
+    xs, ys = np.meshgrid(np.arange(SPAWN_SPACING, width - SPAWN_SPACING / 2, SPAWN_SPACING),
+                         np.arange(SPAWN_SPACING, height - SPAWN_SPACING / 2, SPAWN_SPACING))
+    points = np.column_stack([xs.ravel(), ys.ravel()])
+    reach = max(SIZE)
+    boxes = np.concatenate([points - reach, points + reach], axis=1)
+    blocked = np.concatenate([game_map.wall_index.rects, pad_rects,
+                              np.concatenate([spawns - reach, spawns + reach], axis=1)])
+    free = points[~overlaps(boxes, blocked).any(axis=1)]
+
+    missing = ships - len(spawns)
+    if missing > len(free):
+        raise ValueError(f"The map has room for {len(free) + len(spawns)} ships, not {ships}")
+    picked = free[np.linspace(0, len(free) - 1, missing).round().astype(int)]
+    return np.concatenate([spawns, picked])
+
+
+if TYPE_CHECKING:
+    from game import Game
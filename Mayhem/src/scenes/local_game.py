@@ -3,102 +3,213 @@ import pygame
 from config import*
 from typing import TYPE_CHECKING
 from sprites.player import Player
-from sprites.object import Object
-from sprites.fuel_pad import FuelPad
-
-class LocalGame():
+from sprites.bullets import Bullets
+from sprites.particles import Particles
+from maps.compiler import load_map
+from physics.spatial_hash import SpatialHash
+from render.text_cache import TextCache
+from render.fonts import load_font
+from render.frame_state import FrameState, FrameBuffers, draw_hud
+from scenes.world_scene import WorldScene
+
+class LocalGame(WorldScene):
     """
     The class represents a game screen, where players and objects are defined.
 
     Attributes:
         game            : The main game class (would switch between other scenes if we had them)
         font            : front style & size
+        text            : Cache of rendered HUD text (None when headless)
+        game_map        : The compiled map the match is played on
+        spawn_points    : Respawn point of each player, indexed by player id
         players         : Defined players and added in sprite group
-        bullets         : Sprite group for bullets
+        bullets         : Array-backed store for every bullet
+        particles       : Array-backed store for the particles of effects (None when headless)
+        telemetry       : TelemetryBus the events of the players are appended to (None when not recorded)
         objects         : Defined and insert objects in sprite group
+        fuel_pads       : Fuel pads in sprite group
         all_sprites     : Collected sprite group
+        spatial_hash    : Broadphase grid for walls, fuel pads and players
+        bots            : Plays the BOT_PLAYERS (None when every player is on the keyboard)
+        static_layer    : Background, walls and fuel pads baked into one surface (None when headless or scrolling)
+        chunks          : Background, walls and fuel pads of a scrolling world, rendered in chunks (None otherwise)
+        cameras         : Views on a world larger than the window or split between players (None otherwise)
+        dirty_rects     : Screen areas drawn over last frame, restored from the static layer next frame
+        frames          : Buffers the frame states are copied into
 
     Methods:
     -------
     __init__            : Initializes objects to be include to the game screen.
-    update              : Draw and update objects for each frame.
+    update              : Update the bullets for each frame.
+    refresh_static      : Rebuild the caches of walls and fuel pads if the map has changed.
+    capture             : Copy what a frame draws of the current tick.
+    draw                : Draw the moving objects and the HUD for each frame.
     handle_events       : Keys input for control the player.
+    reset               : Start a new match with the same map.
     player_display      : Player status on fuel left and current score.
-    map                 : Create Objects in the game as map.
+    debug_display       : FPS counter and debug overlays.
 
     """
 
-    def __init__(self, game: 'Game') -> None:
+    def __init__(self, game: 'Game', map_name: str = None) -> None:
         """
         Initializes objects to be include to the game screen.
         :param game:
+        :param map_name: Map to play on, MAP by default
         """
         self.game = game
 
-        # Create a font object
-        self.font = pygame.font.SysFont("arial", 14)
+        # Effects are only drawn, so headless matches go without
+        self.particles = Particles() if PARTICLES and not self.game.headless else None
+
+        # Events are only streamed to a file when the game or headless run asks for it
+        self.telemetry = None
+
+        # Walls, fuel pads, spawn points and the static layer come from the compiled map
+        self.game_map = load_map(map_name or MAP, self.game.resolution)
+        self.spawn_points = self.game_map.spawn_points.tolist()
+
+        # Create a font object (headless matches never draw, so they skip the font lookup), the font file is cached
+        self.font = None if self.game.headless else load_font("arial", 14)
+        self.text = None if self.game.headless else TextCache(self.font)
 
         # Create player and add to group
-        self.player = Player(0, [150, 750], self)
-        self.player2 = Player(1, [850, 750], self)
+        self.player = Player(0, self.spawn_points[0], self)
+        self.player2 = Player(1, self.spawn_points[1], self)
         self.players = pygame.sprite.Group(self.player)
         self.players.add(self.player2)
 
 
-        self.bullets = pygame.sprite.Group()
+        self.bullets = Bullets(self)
+
+        # Walls (border walls first) and fuel pads
+        self.objects = self.game_map.objects()
+        self.fuel_pads = self.game_map.fuel_pads()
 
-        # Border walls
-        self.objects = pygame.sprite.Group(Object(1, (self.game.resolution[0]/2, self.game.resolution[1]+10), (self.game.resolution[0], 40)))
-        Object(2, (-10, self.game.resolution[1]/2), (40, self.game.resolution[1]), self.objects)
-        Object(3, (self.game.resolution[0]+10, self.game.resolution[1]/2), (40, self.game.resolution[1]), self.objects)
-        Object(4, (self.game.resolution[0]/2, -10), (self.game.resolution[0], 40), self.objects)
-        Object(5, (350, 450), (200, 50), self.objects)
-        self.map()
+        # Add all sprite also to a single group
+        self.all_sprites = pygame.sprite.Group(self.objects, self.players, self.fuel_pads)
 
+        # Walls and fuel pads never move, so they are bucketed and drawn once
+        self.spatial_hash = SpatialHash()
+        self.spatial_hash.insert_static(self.objects, self.fuel_pads, walls=self.game_map.wall_index)
+        self.static_versions = (self.objects.version, self.fuel_pads.version)
+        for player in self.players:
+            self.spatial_hash.update_dynamic(player)
 
-        # Fuel pads
-        self.fuel_pads = pygame.sprite.Group(FuelPad(1, (150, 795), (200, 10)))
-        FuelPad(2, (850, 795), (200, 10), self.fuel_pads)
+        # Bots are imported only when a player is a bot, like the modules Game only uses for some settings
+        self.bots = None
+        if BOT_PLAYERS:
+            from sim.bots import PlayerBots
+            self.bots = PlayerBots(self, BOT_PLAYERS)
 
-        # Add all sprite also to a single group
-        self.all_sprites = self.objects.copy()
-        self.all_sprites.add(self.players)
-        self.all_sprites.add(self.fuel_pads)
-        self.all_sprites.add(self.bullets)
+        # A world the size of the window is drawn from one layer, larger worlds and split screens scroll with cameras
+        self.setup_view(len(self.players) if SPLIT_SCREEN else 1)
+        self.frames = FrameBuffers()
 
 
     def update(self) -> None:
         """
-        Draw and update objects each frame.
+        Update the objects that move on their own each frame.
         :return:
         """
-        self.game.screen.fill(BACKGROUND_COLOR)
+        self.refresh_static()
         self.bullets.update()
+        if self.particles is not None:
+            self.particles.update()
 
-        self.all_sprites.draw(self.game.screen)
-        self.player_display()
-
-        if SHOW_FPS:
-            fps = self.font.render(str(int(self.game.clock.get_fps())), True, (0, 0, 0))
-            self.game.screen.blit(fps, (10, fps.get_height()-40))
+    def refresh_static(self) -> None:
+        """
+        Rebucket the walls and fuel pads if any have been added or removed since the last frame.
+        :return:
+        """
+        versions = (self.objects.version, self.fuel_pads.version)
+        if versions != self.static_versions:
+            self.static_versions = versions
+            self.spatial_hash.replace_static(self.objects, self.fuel_pads)
 
+    def capture(self) -> FrameState:
+        """
+        Copy what a frame draws of the current tick: the players, bullets and HUD text.
+        :return: The frame state, it stays valid until the second capture after it.
+        """
+        frames = self.frames
+        players = self.players.sprites()
+        previous = frames.array("previous", len(players), 2)
+        current = frames.array("current", len(players), 2)
+        topleft = frames.array("topleft", len(players), 2)
+        for i, player in enumerate(players):
+            previous[i] = player.previous_pos
+            current[i] = player.pos
+            topleft[i] = player.rect.topleft
+        bullets = frames.array("bullets", self.bullets.count, 4)
+        self.bullets.capture(bullets)
+        particles = frames.array("particles", self.particles.count() if self.particles is not None else 0, 5)
+        if len(particles):
+            self.particles.capture(particles)
+        frames.swap()
+
+        scores = "       ".join("Player " + str(player.id + 1) + ": " + str(player.score) for player in players)
+        fuel = "       ".join("Fuel: " + str(round(player.fuel/FUEL*100)) + "%" for player in players)
+        hud = ((scores, ((RESOLUTION[0] // 2) - 100, RESOLUTION[1] - 100)),
+               (fuel, ((RESOLUTION[0] // 2) - 100, RESOLUTION[1] - 80)))
+        lines = ()
         if DEBUG_MODE:
-            # CURSOR DEBUG
-            cursor_pos = pygame.mouse.get_pos()
-            cursor_pos_text = self.font.render(str(cursor_pos), True, (0,0,0))
-            self.game.screen.blit(cursor_pos_text, (10, 50))
-
             # Player 1 DEBUG STATS
-            player_debug_stats_str = self.font.render("("+str(round(self.player.pos[0]))+", "+str(round(self.player.pos[1]))+") "+str(round(self.player.get_angle()))+" "+str(self.player.inertia_vec.length()), True, (0,0,0))
-            self.game.screen.blit(player_debug_stats_str, (400,40))
-
+            hud += (("("+str(round(self.player.pos[0]))+", "+str(round(self.player.pos[1]))+") "+str(round(self.player.get_angle()))+" "+str(self.player.inertia_vec.length()), (400, 40)),)
 
             # DEBUG VECTOR FOR INERTIA
             debug_vec = self.player.inertia_vec.copy()
             debug_length = debug_vec.length()
             if debug_length > 0.1:
                 debug_vec.scale_to_length(debug_length*15)
-            pygame.draw.aaline(self.game.screen, (255, 0, 0), self.player.pos, ((self.player.pos[0]+debug_vec.x), (self.player.pos[1]+debug_vec.y)), 1)
+            lines = (((255, 0, 0), tuple(self.player.pos),
+                      ((self.player.pos[0]+debug_vec.x), (self.player.pos[1]+debug_vec.y))),)
+        # One view follows every player, split views follow one player each
+        focus = ()
+        if self.cameras is not None:
+            focus = ((tuple(range(len(players))),) if len(self.cameras) == 1 else
+                     tuple((i,) for i in range(len(self.cameras))))
+        return FrameState(self.game.tick, [player.image for player in players], previous, current, topleft, bullets,
+                          particles, hud, lines, focus)
+
+    def draw(self, alpha: float = 1.0, state: FrameState = None) -> list[pygame.Rect] | None:
+        """
+        Draw the moving objects and the HUD each frame on top of the static layer.
+
+        Only the areas drawn over last frame are restored from the static layer, so the walls and fuel pads are not
+        redrawn every frame. With cameras every view is drawn whole from the chunks under it instead.
+        :param alpha: How far the frame is between the previous tick and the current one, players and bullets are
+        drawn that far along their last step.
+        :param state: The frame state to draw, the current tick by default. Game.run draws states captured on the
+        simulation thread when PIPELINE_RENDER is on.
+        :return: The areas of the screen that changed, or None if the whole screen changed.
+        """
+        state = self.capture() if state is None else state
+        return self.draw_world(state, alpha)
+
+    def debug_display(self, state: FrameState) -> list[pygame.Rect]:
+        """
+        Displays the FPS counter and the debug overlays when they are turned on
+        :param state: The frame state being drawn
+        :return: The areas drawn on
+        """
+        screen = self.game.screen
+        drawn = []
+        if SHOW_FPS:
+            fps = self.text.render(str(int(self.game.clock.get_fps())))
+            drawn.append(screen.blit(fps, (10, fps.get_height()-40)))
+
+        if DEBUG_MODE:
+            # CURSOR DEBUG
+            cursor_pos = pygame.mouse.get_pos()
+            cursor_pos_text = self.text.render(str(cursor_pos))
+            drawn.append(screen.blit(cursor_pos_text, (10, 50)))
+
+            # PHASE TIMES
+            if self.game.profiler:
+                drawn += self.game.profiler.draw(screen, self.text)
+
+        return drawn
 
     def handle_events(self, keys: tuple[bool, ...]) -> None:
         """
@@ -106,43 +217,33 @@ class LocalGame():
         :param keys: keyboard
         :return:
         """
-        # Player Controls
+        # Player Controls, bots press the keys of the players they play
+        if self.bots:
+            keys = self.bots.keys(keys)
         self.players.update(keys)
 
-    def player_display(self) -> None:
+    def reset(self) -> None:
         """
-        Displays score and fuel of both players
+        Start a new match with the same map: bullets are removed and every player respawns with its stats reset.
         :return:
         """
-        scores = self.font.render(
-            "Player 1: " + str(self.player.score) + "       "
-            "Player 2: " + str(self.player2.score), True, (0, 0, 0))
-
-        fuel = self.font.render(
-            "Fuel: " + str(round(self.player.fuel/FUEL*100)) + "%       " +
-            "Fuel: " + str(round(self.player2.fuel/FUEL*100)) + "%", True, (0, 0, 0))
-
-
-        self.game.screen.blit(scores, ((RESOLUTION[0] // 2) - 100, RESOLUTION[1] - 100))
-        self.game.screen.blit(fuel,   ((RESOLUTION[0] // 2) - 100, RESOLUTION[1] - 80))
-
-    def map(self) -> None:
+        self.bullets.clear()
+        for player in self.players:
+            player.reset()
+            self.spatial_hash.update_dynamic(player)
+        if self.particles is not None:
+            self.particles.clear()
+
+    def player_display(self, state: FrameState) -> list[pygame.Rect]:
         """
-        Used Objects class that define the game map
-        :return:
+        Displays score and fuel of every player and the debug stats, the text is only rendered again when a value
+        changes
+        :param state: The frame state being drawn
+        :return: The areas drawn on
         """
-        Object(6.0, (150,650), (200, 3), self.objects)
-        Object(6.1, (330, 650), (3, 75), self.objects)
-        Object(6.2, (330, 750), (3, 40), self.objects)
-        Object(6.3, (170, 550), (3, 40), self.objects)
-
-        Object(6.3, (455, 550), (300, 3), self.objects)
-        Object(6.3, (670, 645), (300, 3), self.objects)
-
-        Object(6.3, (898, 447), (3, 150), self.objects)
-        Object(6.3, (623, 383), (200, 3), self.objects)
-        Object(6.3, (160, 343), (200, 3), self.objects)
-        Object(6.3, (341, 193), (3, 100), self.objects)
+        scale = self.game.viewport.scale
+        offset = self.cameras[0].offset(scale) if self.cameras is not None else (0, 0)
+        return draw_hud(self.game.screen, self.text, state, scale, offset)
 
 if TYPE_CHECKING:
     from game import Game
@@ -0,0 +1,154 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+from config import*
+from typing import TYPE_CHECKING
+from sprites.object import Object
+from sprites.fuel_pad import FuelPad
+from sprites.bullets import Bullets
+from sprites.rotation_cache import RotationCache
+from sprites.static_group import StaticGroup
+from render.static_layer import StaticLayer
+from render.text_cache import TextCache
+from render.fonts import load_font
+from render.viewport import scaled_image
+from sim.replay import key_mask
+from net.client import NetClient
+
+class NetworkGame():
+    """
+    A game screen for a match hosted on a server: the local keys are sent to the server, and the players and bullets
+    are drawn from the states it sends back.
+
+    Attributes:
+        game            : The main game class
+        client          : Connection to the server
+        font            : front style & size
+        text            : Cache of rendered HUD text
+        rotations       : Shared rotated images of the player ship
+        objects         : Walls of the match, built once the server has sent the map
+        fuel_pads       : Fuel pads of the match, built once the server has sent the map
+        static_layer    : Background, walls and fuel pads baked into one surface
+        dirty_rects     : Screen areas drawn over last frame, restored from the static layer next frame
+
+    Methods:
+    -------
+    __init__            : Initializes the scene.
+    handle_events       : Send the keys of the local player to the server.
+    update              : Receive states from the server.
+    build_map           : Create the walls and fuel pads sent by the server.
+    draw                : Draw the interpolated state and the HUD.
+    player_display      : Player status on fuel left and current score.
+
+    """
+
+    def __init__(self, game: 'Game', client: NetClient) -> None:
+        """
+        Initializes the scene.
+        :param game:
+        :param client: Connection to the server
+        """
+        self.game = game
+        self.client = client
+
+        self.font = load_font("arial", 14)
+        self.text = TextCache(self.font)
+        self.rotations = RotationCache.shared(SIZE, COLOR)
+
+        self.objects = None
+        self.fuel_pads = None
+        self.static_layer = None
+        self.dirty_rects = None
+
+    def handle_events(self, keys: tuple[bool, ...]) -> None:
+        """
+        Send the keys of the local player to the server, the local player always uses the player 1 controls.
+        :param keys: keyboard
+        :return:
+        """
+        self.client.send_input(key_mask(keys, 1)[0])
+
+    def update(self) -> None:
+        """
+        Receive states from the server.
+        :return:
+        """
+        self.client.poll()
+        if self.static_layer is None and self.client.layout is not None:
+            self.build_map(self.client.layout)
+
+    def build_map(self, layout: dict) -> None:
+        """
+        Create the walls and fuel pads sent by the server and bake them.
+        :param layout: Map sent by the server
+        :return:
+        """
+        self.objects = StaticGroup(Object(id, (x, y), (w, h)) for id, x, y, w, h in layout["objects"])
+        self.fuel_pads = StaticGroup(FuelPad(id, (x, y), (w, h)) for id, x, y, w, h in layout["fuel_pads"])
+        self.static_layer = StaticLayer(self.game.resolution, BACKGROUND_COLOR, self.objects, self.fuel_pads)
+        self.dirty_rects = None
+
+    def draw(self, alpha: float = 1.0, state: None = None) -> list[pygame.Rect] | None:
+        """
+        Draw the interpolated state and the HUD on top of the static layer.
+        :param alpha: Not used, states from the server are interpolated by the time they arrived
+        :param state: Not used, the match is simulated by the server so there is no frame state to pipeline
+        :return: The areas of the screen that changed, or None if the whole screen changed.
+        """
+        screen = self.game.screen
+        state = self.client.render_state()
+        if self.static_layer is None or state is None:
+            screen.fill(BACKGROUND_COLOR)
+            message = self.client.rejected or "Connecting to " + ":".join(map(str, self.client.address)) + "..."
+            screen.blit(self.text.render(message), (10, 10))
+            return None
+
+        scale = self.game.viewport.scale
+        full_redraw = self.static_layer.refresh() or self.dirty_rects is None
+        if full_redraw:
+            screen.blit(self.static_layer.scaled(scale), (0, 0))
+        else:
+            self.static_layer.restore(screen, self.dirty_rects, scale)
+
+        players, bullets = state
+        blits = []
+        for x, y, dir_x, dir_y, fuel, score in players:
+            # Same angle as Player.get_angle
+            angle = (pygame.math.Vector2(dir_x, dir_y).angle_to(pygame.math.Vector2(0, -1)) + 90) % 360
+            image = scaled_image(self.rotations.image(self.rotations.quantize(angle - 90)), scale)
+            blits.append((image, image.get_rect(center=(round(x * scale), round(y * scale)))))
+
+        bullet_image = scaled_image(Bullets.get_image(), scale)
+        blits += [(bullet_image, bullet_image.get_rect(center=(round(x * scale), round(y * scale))))
+                  for x, y, _ in bullets]
+
+        drawn = screen.blits(blits)
+        drawn += self.player_display(players)
+
+        if SHOW_FPS:
+            fps = self.text.render(str(int(self.game.clock.get_fps())))
+            drawn.append(screen.blit(fps, (10, fps.get_height()-40)))
+
+        changed = None if full_redraw else self.dirty_rects + drawn
+        self.dirty_rects = drawn
+        return changed
+
+    def player_display(self, players: tuple) -> list[pygame.Rect]:
+        """
+        Displays score and fuel of every player, the text is only rendered again when a value changes
+        :param players: Player rows of the state being drawn
+        :return: The areas drawn on
+        """
+        scores = self.text.render("       ".join(
+            "Player " + str(i + 1) + ("*" if i == self.client.player_id else "") + ": " + str(score)
+            for i, (*_, score) in enumerate(players)))
+
+        fuel = self.text.render("       ".join(
+            "Fuel: " + str(round(fuel/FUEL*100)) + "%" for *_, fuel, _ in players))
+
+        scale = self.game.viewport.scale
+        left = round(((RESOLUTION[0] // 2) - 100) * scale)
+        return [self.game.screen.blit(scaled_image(scores, scale), (left, round((RESOLUTION[1] - 100) * scale))),
+                self.game.screen.blit(scaled_image(fuel, scale),   (left, round((RESOLUTION[1] - 80) * scale)))]
+
+if TYPE_CHECKING:
+    from game import Game
@@ -0,0 +1,76 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+from config import *
+from render.static_layer import StaticLayer
+from render.chunks import ChunkedLayer
+from render.camera import Camera, split_views, draw_views
+from render.frame_state import FrameState, draw_frame
+
+
+class WorldScene:
+    """
+    Drawing shared by the scenes that play a compiled map in this process. A world the size of the window is drawn on
+    top of one static layer, restoring only what was drawn over last frame. A larger world or a split screen is drawn
+    whole through cameras, from the chunks of the walls and fuel pads under each view.
+
+    The scene sets game, game_map, objects and fuel_pads before setup_view, and draws its HUD with
+    player_display(state) and debug_display(state).
+
+    Attributes:
+        static_layer    : Background, walls and fuel pads baked into one surface (None when headless or scrolling)
+        chunks          : Background, walls and fuel pads of a scrolling world, rendered in chunks (None otherwise)
+        cameras         : Views on a world larger than the window or split between players (None otherwise)
+        dirty_rects     : Screen areas drawn over last frame, restored from the static layer next frame
+
+    Methods:
+    -------
+    setup_view          : Build the layers the world is drawn from.
+    draw_world          : Draw a frame state and the HUD.
+    """
+
+    def setup_view(self, views: int) -> None:
+        """
+        Build the layers the world is drawn from, headless scenes draw nothing and build none.
+        :param views: Number of views side by side, one per player with SPLIT_SCREEN
+        :return:
+        """
+        self.static_layer = self.chunks = self.cameras = None
+        if not self.game.headless:
+            if views > 1 or self.game_map.size != tuple(self.game.resolution):
+                self.chunks = ChunkedLayer(BACKGROUND_COLOR, self.objects, self.fuel_pads)
+                self.cameras = [Camera(self.game_map.size, view) for view in split_views(views, self.game.resolution)]
+            else:
+                self.static_layer = StaticLayer(self.game.resolution, BACKGROUND_COLOR, self.objects, self.fuel_pads,
+                                                surface=self.game_map.layer_surface())
+        self.dirty_rects = None
+
+    def draw_world(self, state: FrameState, alpha: float = 1.0) -> list[pygame.Rect] | None:
+        """
+        Draw a frame state and the HUD on the screen of the game.
+        :param state: The frame state to draw
+        :param alpha: How far the frame is between the previous tick and the current one
+        :return: The areas of the screen that changed, or None if the whole screen changed.
+        """
+        screen = self.game.screen
+        scale = self.game.viewport.scale
+        if self.cameras is not None:
+            # Scrolling views change every pixel they show, so the whole screen is drawn
+            self.chunks.refresh()
+            draw_views(screen, self.cameras, self.chunks, state, alpha, scale)
+            self.player_display(state)
+            self.debug_display(state)
+            return None
+
+        full_redraw = self.static_layer.refresh() or self.dirty_rects is None
+        if full_redraw:
+            screen.blit(self.static_layer.scaled(scale), (0, 0))
+        else:
+            self.static_layer.restore(screen, self.dirty_rects, scale)
+
+        drawn = draw_frame(screen, state, alpha, scale)
+        drawn += self.player_display(state)
+        drawn += self.debug_display(state)
+
+        changed = None if full_redraw else self.dirty_rects + drawn
+        self.dirty_rects = drawn
+        return changed
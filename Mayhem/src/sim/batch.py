@@ -0,0 +1,195 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import ast
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from typing import Any, Iterable, Iterator, NamedTuple
+
+
+class MatchSpec(NamedTuple):
+    """
+    Everything a worker needs to play one headless match.
+
+    Attributes:
+        seed        : Seed for the input policy.
+        ticks       : Length of the match in ticks.
+        policy      : Name of the input policy in sim.policies.POLICIES.
+        overrides   : Config values to change for this match, as (name, value) pairs.
+    """
+    seed: int
+    ticks: int
+    policy: str = "random"
+    overrides: tuple[tuple[str, Any], ...] = ()
+
+
+def _init_worker() -> None:
+    """
+    Runs once in every worker process, before any pygame module is imported.
+    :return:
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+
+def run_match(spec: MatchSpec) -> dict:
+    """
+    Play a single headless match and summarize it.
+    :param spec: The match to play.
+    :return: Compact summary with one entry per player, or per ship of a fleet match, in each list.
+    """
+    # Imported here so the parent process never has to load pygame
+    from sim.headless import HeadlessGame
+    from sim.overrides import overridden
+    from sim.policies import POLICIES
+
+    with overridden(dict(spec.overrides)):
+        game = HeadlessGame(seed=spec.seed)
+        tps = game.run(spec.ticks, POLICIES[spec.policy](spec.seed))
+
+    summary = {"seed": spec.seed, "overrides": spec.overrides, "ticks": spec.ticks, "ticks_per_second": tps}
+
+    # Fleet ships are played by their own bots and keep their stats in arrays, one entry per ship
+    fleet = getattr(game.current_scene, "fleet", None)
+    if fleet is not None:
+        return {**summary,
+                "scores": fleet.score.tolist(),
+                "respawns": fleet.respawns.tolist(),
+                "landings": fleet.landings.tolist(),
+                "fuel_used": fleet.fuel_used.tolist()}
+
+    players = sorted(game.current_scene.players, key=lambda p: p.id)
+    return {**summary,
+            "scores": [p.score for p in players],
+            "respawns": [p.respawns for p in players],
+            "landings": [p.landings for p in players],
+            "fuel_used": [p.fuel_used for p in players]}
+
+
+def run_batch(specs: Iterable[MatchSpec], workers: int = None, chunksize: int = 4) -> Iterator[dict]:
+    """
+    Spread matches over a pool of processes and yield the summaries as they finish, in no particular order.
+    :param specs: Matches to play.
+    :param workers: Number of processes, defaults to one per core.
+    :param chunksize: Matches handed to a worker at a time.
+    :return: Match summaries from run_match.
+    """
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=_init_worker) as pool:
+        yield from pool.imap_unordered(run_match, specs, chunksize)
+
+
+class Report:
+    """
+    Aggregates match summaries per set of config overrides.
+
+    Attributes:
+        groups      : Running totals for each set of overrides.
+
+    Methods:
+    -------
+    add         : Add a match summary.
+    rows        : Averages per set of overrides.
+    """
+
+    FIELDS = ("scores", "respawns", "landings", "fuel_used")
+
+    def __init__(self) -> None:
+        self.groups = {}
+
+    def add(self, summary: dict) -> None:
+        """
+        Add a match summary to the totals of its overrides.
+        :param summary: Result of run_match.
+        :return:
+        """
+        group = self.groups.setdefault(tuple(map(tuple, summary["overrides"])), {
+            "matches": 0, "ticks": 0, "seconds": 0.0, **{field: None for field in self.FIELDS}})
+        group["matches"] += 1
+        group["ticks"] += summary["ticks"]
+        group["seconds"] += summary["ticks"] / summary["ticks_per_second"]
+        for field in self.FIELDS:
+            totals = group[field] or [0] * len(summary[field])
+            group[field] = [total + value for total, value in zip(totals, summary[field])]
+
+    def rows(self) -> list[dict]:
+        """
+        :return: One row of per-match averages for each set of overrides.
+        """
+        rows = []
+        for overrides, group in self.groups.items():
+            matches = group["matches"]
+            row = {"overrides": dict(overrides), "matches": matches,
+                   "ticks_per_second": group["ticks"] / group["seconds"] if group["seconds"] else 0.0}
+            for field in self.FIELDS:
+                row[field] = [total / matches for total in group[field]]
+            rows.append(row)
+        return rows
+
+    def __str__(self) -> str:
+        lines = []
+        for row in self.rows():
+            overrides = ", ".join(f"{name}={value}" for name, value in row["overrides"].items()) or "defaults"
+            lines.append(f"{overrides}: {row['matches']} matches, {row['ticks_per_second']:.0f} ticks/s per worker")
+            for field in self.FIELDS:
+                lines.append(f"    {field:<10}" + "".join(f"{value:>12.2f}" for value in row[field]))
+        return "\n".join(lines)
+
+
+def sweep(settings: dict[str, list[Any]]) -> list[tuple[tuple[str, Any], ...]]:
+    """
+    Every combination of the given setting values.
+    :param settings: Values to try for each setting name.
+    :return: One overrides tuple per combination.
+    """
+    names = sorted(settings)
+    return [tuple(zip(names, values)) for values in itertools.product(*(settings[name] for name in names))]
+
+
+def _parse_value(text: str) -> Any:
+    # Anything that is not a Python literal, like a map name, is taken as a string
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text.strip()
+
+
+def _parse_setting(text: str) -> tuple[str, list[Any]]:
+    name, _, values = text.partition("=")
+    return name.strip(), [_parse_value(value) for value in values.split(";")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run many headless matches over all cores and report averages.")
+    parser.add_argument("--matches", type=int, default=100, help="matches per set of settings")
+    parser.add_argument("--ticks", type=int, default=3600, help="ticks per match")
+    parser.add_argument("--policy", default="random", help="input policy: idle, demo or random")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=V1;V2",
+                        help="config values to sweep, can be given several times")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, one per core by default")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    combinations = sweep(dict(map(_parse_setting, args.set)))
+    specs = [MatchSpec(seed, args.ticks, args.policy, overrides)
+             for overrides in combinations for seed in range(args.matches)]
+
+    report = Report()
+    start = time.perf_counter()
+    for done, summary in enumerate(run_batch(specs, args.workers), 1):
+        report.add(summary)
+        if done % max(len(specs) // 10, 1) == 0:
+            print(f"{done}/{len(specs)} matches")
+    elapsed = time.perf_counter() - start
+
+    print(report)
+    print(f"{len(specs)} matches in {elapsed:.1f} s")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report.rows(), file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
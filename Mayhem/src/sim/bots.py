@@ -0,0 +1,201 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+from typing import TYPE_CHECKING, Callable
+import numpy as np
+from config import *
+from maps.navigation import NavGrid
+
+
+# Where a bot waits to shoot from, beside and above its target, as a share of BOT_SHOOT_RANGE
+HUNT_OFFSET = (0.8, 0.35)
+# Clearance in cells a bot needs to start turning towards a target
+TURN_CLEARANCE = 2
+# Furthest tilt from straight up in degrees a bot turns to, further when facing a target
+MAX_TILT = 100
+AIM_TILT = 115
+# A bot backs away from a target closer than this many ship sizes
+KEEP_AWAY = 2.5
+
+
+def steer(nav: NavGrid, pos: np.ndarray, direction: np.ndarray, inertia: np.ndarray, fuel: np.ndarray,
+          stationary: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    The keys bots press this tick, for many ships at once. A bot flies to the nearest fuel pad and lands when it is low
+    on fuel, stays landed until it is full, and otherwise flies to a point level with its target, on the side it comes
+    from, and shoots at it once it is in range.
+
+    Thrust pulls a ship's movement towards the way it faces, so a bot turns to face the movement it wants plus a lift
+    against gravity, and only thrusts once it faces close enough to that.
+    :param nav: Navigation grid of the map
+    :param pos: (n, 2) ship centers
+    :param direction: (n, 2) facing of each ship
+    :param inertia: (n, 2) movement per tick
+    :param fuel: (n,) fuel left
+    :param stationary: (n,) True for ships landed on a fuel pad
+    :param targets: (n, 2) position of the ship each bot hunts, NaN for none
+    :return: (n, 4) flags in PLAYER_CONTROLS order: power, left, right, shoot.
+    """
+    n = len(pos)
+    actions = np.zeros((n, 4), dtype=bool)
+    refuel = (fuel < FUEL * BOT_REFUEL) | (stationary & (fuel < FUEL))
+
+    # Distance and way to fly, to the pads or along the field to each bot's target
+    distance, way, clearance = nav.lookup(pos, nav.pads)
+    hunting = np.flatnonzero(~refuel & ~np.isnan(targets).any(axis=1))
+    side = np.where(pos[hunting, 0] < targets[hunting, 0], -1, 1)
+    offsets = np.column_stack([side * HUNT_OFFSET[0], np.full(len(side), -HUNT_OFFSET[1])])
+    beside = targets[hunting] + offsets * BOT_SHOOT_RANGE
+    sectors = nav.sector(beside)
+    for sector in np.unique(sectors).tolist():
+        bots = hunting[sectors == sector]
+        distance[bots], way[bots], _ = nav.lookup(pos[bots], nav.toward(sector))
+
+    # Slow down near walls, looking BOT_LOOKAHEAD ticks ahead so there is time to brake, and on the way in to a pad,
+    # a pad has to be touched slowly to land on it
+    _, _, ahead = nav.lookup(pos + inertia * BOT_LOOKAHEAD, nav.pads)
+    speed = BOT_SPEED * np.clip(np.minimum(clearance, ahead) / 3, 1 / 3, 1)
+    speed = np.where(refuel, np.clip(distance / (2 * nav.cell_size), 1, speed), speed)
+    way[refuel & (distance == 0)] = (0, 1)
+    velocity = way * speed[:, None]
+
+    # Back away from a target close enough to crash into
+    offset = targets - pos
+    gap = np.hypot(offset[:, 0], offset[:, 1])
+    close = gap < KEEP_AWAY * max(SIZE)
+    velocity[close] = -offset[close] / gap[close, None] * BOT_SPEED
+
+    # The change of movement wanted, against gravity as well. Ships turn slowly, so the nose is kept up on the way.
+    need = velocity - inertia
+    need[:, 1] -= G_ACCELERATION
+    aim = need - (0, BOT_SPEED / 2)
+
+    # Further away but in range, face the target while not falling. A bot starts turning in open space, and keeps on
+    # once it faces the target roughly.
+    facing = direction / np.maximum(np.hypot(direction[:, 0], direction[:, 1]), 1e-9)[:, None]
+    off_target = np.degrees(np.arccos(np.clip((facing * offset).sum(axis=1) / np.maximum(gap, 1e-9), -1, 1)))
+    in_range = ~close & (gap < BOT_SHOOT_RANGE) & (distance < 2 * BOT_SHOOT_RANGE)
+    engaged = (~refuel & in_range & (np.abs(inertia[:, 1]) < 0.5)
+               & ((np.minimum(clearance, ahead) >= TURN_CLEARANCE) | (off_target < 45)))
+    aim[engaged] = offset[engaged]
+
+    # Tilts are measured from straight up, positive to the right. A ship facing down has no lift and takes long to
+    # turn back, so bots never aim further than a little below level and always turn over the top.
+    tilt = np.degrees(np.arctan2(aim[:, 0], -aim[:, 1]))
+    limit = np.where(engaged, AIM_TILT, MAX_TILT)
+    tilt = np.clip(tilt, -limit, limit)
+    turn = tilt - np.degrees(np.arctan2(facing[:, 0], -facing[:, 1]))
+    actions[:, 1] = turn < -ROTATION_STEP / 2
+    actions[:, 2] = turn > ROTATION_STEP / 2
+
+    # Thrust pushes the way the ship faces, only use it when that helps. While facing a target that is only to keep
+    # from falling.
+    helps = need[:, 0] * facing[:, 0] + need[:, 1] * facing[:, 1] > SPEED_ACCELERATION / 2
+    hover = (inertia[:, 1] > 0.2) & (facing[:, 1] < -0.5)
+    # Thrusting with the movement close to the facing vector snaps the ship to MAX_SPEED, see Player.input
+    snaps = np.hypot(*(direction - inertia).T) <= SPEED_ACCELERATION
+    actions[:, 0] = np.where(engaged, hover, helps & (np.abs(turn) < 60)) & ~snaps & (fuel > 0)
+
+    # Shoot whenever the target is in range and in front
+    actions[:, 3] = in_range & (off_target < BOT_AIM_ANGLE)
+
+    # Landed: wait for a full tank, then take off
+    actions[stationary] = False
+    actions[stationary, 0] = ~refuel[stationary]
+    return actions
+
+
+class PlayerBots:
+    """
+    Bots playing some of the players of a LocalGame, so bots and keyboard players can be mixed. They press the same
+    PLAYER_CONTROLS keys a person would, which keeps replays, rollback and network play working unchanged.
+
+    A bot hunts the nearest other player. It only looks at the state of the match, so the same match always gets the
+    same keys.
+
+    Attributes:
+        match       : The LocalGame the bots play in.
+        nav         : Navigation grid of the match's map.
+        ids         : Ids of the players the bots play.
+
+    Methods:
+    -------
+    __init__    : Pick the players the bots play.
+    keys        : The keyboard with the keys of the bot players replaced.
+    """
+
+    def __init__(self, match: 'LocalGame', ids: tuple[int, ...] = BOT_PLAYERS) -> None:
+        """
+        Pick the players the bots play.
+        :param match: The LocalGame the bots play in
+        :param ids: Ids of the players the bots play
+        """
+        self.match = match
+        self.nav = match.game_map.navigation()
+        self.ids = tuple(ids)
+
+    def keys(self, keys: tuple[bool, ...]) -> 'BotKeys':
+        """
+        :param keys: keyboard
+        :return: The keyboard with the keys of the bot players replaced by what the bots press.
+        """
+        players = sorted(self.match.players, key=lambda player: player.id)
+        bots = [player for player in players if player.id in self.ids]
+        pos = np.array([player.pos for player in players], dtype=float)
+        targets = np.full((len(bots), 2), np.nan)
+        for i, bot in enumerate(bots):
+            others = [j for j, player in enumerate(players) if player is not bot]
+            if others:
+                gaps = np.hypot(*(pos[others] - bot.pos).T)
+                targets[i] = pos[others[int(np.argmin(gaps))]]
+
+        actions = steer(self.nav, np.array([bot.pos for bot in bots], dtype=float),
+                        np.array([bot.direction_vec for bot in bots], dtype=float),
+                        np.array([bot.inertia_vec for bot in bots], dtype=float),
+                        np.array([bot.fuel for bot in bots], dtype=float),
+                        np.array([bot.stationary for bot in bots]), targets)
+        pressed = {key: bool(held) for bot, action in zip(bots, actions)
+                   for key, held in zip(PLAYER_CONTROLS[bot.id], action)}
+        return BotKeys(keys, pressed)
+
+
+class BotKeys:
+    """
+    The keyboard with the keys of bot players replaced, read exactly like the pygame key tuple.
+
+    Attributes:
+        keys        : The keyboard the other players read.
+        pressed     : Whether each key of a bot player is held.
+    """
+
+    def __init__(self, keys: tuple[bool, ...], pressed: dict[int, bool]) -> None:
+        self.keys = keys
+        self.pressed = pressed
+
+    def __getitem__(self, key: int) -> bool:
+        held = self.pressed.get(key)
+        return self.keys[key] if held is None else held
+
+
+def nav_actions(match: 'FleetGame') -> Callable[[int], np.ndarray]:
+    """
+    Batched bots for a fleet that fly with the map's navigation grid like PlayerBots. To keep the fields looked up
+    few, every ship hunts the ship with the best score, and the leader hunts the second best.
+    :param match: The FleetGame the ships play in
+    :return: Returns the (ships, 4) power, left, right, shoot flags for a tick.
+    """
+    nav = match.game_map.navigation()
+
+    def script(tick: int) -> np.ndarray:
+        fleet = match.fleet
+        targets = np.full((fleet.count, 2), np.nan)
+        if fleet.count > 1:
+            leader, second = np.argsort(-fleet.score, kind="stable")[:2]
+            targets[:] = fleet.pos[leader]
+            targets[leader] = fleet.pos[second]
+        return steer(nav, fleet.pos, fleet.direction, fleet.inertia, fleet.fuel, fleet.stationary, targets)
+
+    return script
+
+
+if TYPE_CHECKING:
+    from scenes.local_game import LocalGame
+    from scenes.fleet_game import FleetGame
@@ -0,0 +1,6 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+
+# Kinds of events the players and fleets log, kept apart from the telemetry bus so the sprites can name them without
+# importing it. See sim.telemetry for what each kind stores.
+SHOT, HIT, SCORE, BOUNCE, LANDING, CRASH_WALL, CRASH_PAD, CRASH_SHIP, REFILL = range(9)
+KINDS = ("shot", "hit", "score", "bounce", "landing", "crash_wall", "crash_pad", "crash_ship", "refill")
@@ -0,0 +1,159 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import time
+from typing import Callable, Iterable
+from config import *
+from scenes.local_game import LocalGame
+
+
+class ScriptedKeys:
+    """
+    Stand-in for pygame.key.get_pressed() that reports a scripted set of keys as pressed.
+
+    Attributes:
+        pressed     : Set of pygame key constants that are held down.
+
+    Methods:
+    -------
+    __init__        : Initializes the key state.
+    __getitem__     : True if the key is pressed, used exactly like the pygame key tuple.
+    from_actions    : Build the key state from per player [power, left, right, shoot] flags.
+    """
+
+    def __init__(self, pressed: Iterable[int] = ()) -> None:
+        """
+        Initializes the key state.
+        :param pressed: pygame key constants that are held down
+        """
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self.pressed
+
+    @classmethod
+    def from_actions(cls, actions: Iterable[Iterable[bool]]) -> 'ScriptedKeys':
+        """
+        Build the key state from one [power, left, right, shoot] entry per player, in PLAYER_CONTROLS order.
+        :param actions: Flags for each player
+        :return: ScriptedKeys
+        """
+        return cls(key for controls, action in zip(PLAYER_CONTROLS, actions)
+                   for key, held in zip(controls, action) if held)
+
+
+NO_KEYS = ScriptedKeys()
+
+
+def demo_script(tick: int) -> ScriptedKeys:
+    """
+    Default script: both players boost in bursts, turn and shoot whenever they can.
+    :param tick: Current simulation tick
+    :return: Key state for this tick
+    """
+    boost = tick % 90 < 20
+    turn = tick % 240 < 40
+    return ScriptedKeys.from_actions([[boost, turn, False, True],
+                                      [boost, False, turn, True]])
+
+
+class HeadlessGame:
+    """
+    A stand-in for Game that steps a LocalGame, or a FleetGame when FLEET_SHIPS is set, without a display surface, fonts
+    or frame cap.
+
+    Attributes:
+        resolution      : Size of the playfield, the border walls are placed from it.
+        headless        : Always True, scenes use it to skip everything that draws.
+        screen          : Always None.
+        clock           : Always None.
+        running         : Kept for parity with Game.
+        tick            : Number of simulated ticks.
+        current_scene   : The match being simulated.
+        recorder        : ReplayRecorder the input of every tick is written to, None when not recording.
+
+    Methods:
+    -------
+    __init__        : Initializes the match.
+    step            : Simulate a single tick.
+    run             : Simulate a number of ticks as fast as possible and return ticks per second.
+    """
+
+    def __init__(self, scene: type = None, seed: int = 0) -> None:
+        """
+        Initializes the match.
+        :param scene: Scene class to simulate, picked from FLEET_SHIPS like Game does by default
+        :param seed: Seed of the bots of a fleet match
+        """
+        self.resolution = RESOLUTION
+        self.headless = True
+        self.screen = None
+        self.clock = None
+        self.running = True
+        self.tick = 0
+
+        if scene is None and FLEET_SHIPS:
+            from scenes.fleet_game import FleetGame
+            self.current_scene = FleetGame(self, FLEET_SHIPS, seed=seed)
+        else:
+            self.current_scene = (scene or LocalGame)(self)
+        self.recorder = None
+
+    def step(self, keys) -> None:
+        """
+        Simulate a single tick: player input, movement and collisions, then bullets.
+        :param keys: Key state indexable by pygame key constants
+        :return:
+        """
+        if self.recorder:
+            self.recorder.record(keys)
+        self.current_scene.handle_events(keys)
+        self.current_scene.update()
+        self.tick += 1
+
+    def run(self, ticks: int, script: Callable[[int], ScriptedKeys] = demo_script) -> float:
+        """
+        Simulate a number of ticks with no frame cap.
+        :param ticks: Number of ticks to simulate
+        :param script: Returns the key state for a given tick
+        :return: Ticks per second
+        """
+        start = time.perf_counter()
+        for _ in range(ticks):
+            self.step(script(self.tick))
+        elapsed = time.perf_counter() - start
+
+        return ticks / elapsed if elapsed > 0 else float("inf")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a headless, uncapped match and report ticks per second.")
+    parser.add_argument("--ticks", type=int, default=10000, help="number of ticks to simulate")
+    parser.add_argument("--record", default=None, help="write a replay of the match to this file")
+    parser.add_argument("--telemetry", default=None, help="stream the events of the match to this file")
+    args = parser.parse_args()
+
+    game = HeadlessGame()
+    if args.record and FLEET_SHIPS:
+        parser.error("replays hold two player matches, --record does not work with FLEET_SHIPS")
+    if args.record:
+        from sim.replay import ReplayRecorder
+        game.recorder = ReplayRecorder(args.record, game.current_scene)
+    if args.telemetry:
+        from sim.telemetry import TelemetryBus
+        game.current_scene.telemetry = TelemetryBus(args.telemetry, FLEET_SHIPS or len(game.current_scene.players))
+    tps = game.run(args.ticks)
+    if game.recorder:
+        game.recorder.close()
+    if game.current_scene.telemetry:
+        game.current_scene.telemetry.close()
+    print(f"{args.ticks} ticks, {tps:.0f} ticks/s")
+    if FLEET_SHIPS:
+        score = game.current_scene.fleet.score
+        print(f"scores: best {score.max()}, worst {score.min()}, mean {score.mean():.2f} of {len(score)} ships")
+    else:
+        players = game.current_scene.players.sprites()
+        print("scores: " + ", ".join(f"Player {p.id + 1}: {p.score}" for p in players))
+
+
+if __name__ == "__main__":
+    main()
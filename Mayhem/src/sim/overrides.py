@@ -0,0 +1,52 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import os
+import sys
+from contextlib import contextmanager
+from typing import Any, Iterator
+import config
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(config.__file__))
+
+
+def _game_modules() -> Iterator:
+    """
+    :return: Every loaded module that is part of the game, they all copy the config values with `from config import *`.
+    """
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.abspath(path).startswith(SOURCE_DIR):
+            yield module
+
+
+def apply_overrides(values: dict[str, Any]) -> dict[str, Any]:
+    """
+    Change config values for every game module that has already been loaded.
+
+    Values derived from another setting in config.py (like G_ACCELERATION from TICK_RATE) are not recalculated, override
+    them as well.
+    :param values: New value for each setting name.
+    :return: The previous values, pass them back in to undo the change.
+    """
+    previous = {}
+    for name, value in values.items():
+        if not hasattr(config, name):
+            raise KeyError(f"Unknown setting {name}")
+        previous[name] = getattr(config, name)
+
+        for module in _game_modules():
+            if module is config or module.__dict__.get(name) is previous[name]:
+                setattr(module, name, value)
+    return previous
+
+
+@contextmanager
+def overridden(values: dict[str, Any]) -> Iterator[None]:
+    """
+    Context manager that applies config overrides and undoes them on exit.
+    :param values: New value for each setting name.
+    """
+    previous = apply_overrides(values)
+    try:
+        yield
+    finally:
+        apply_overrides(previous)
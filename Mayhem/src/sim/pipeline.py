@@ -0,0 +1,69 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from render.frame_state import FrameState
+
+
+class SimulationThread:
+    """
+    Simulates the ticks of a frame on a thread of its own while the frame before them is drawn.
+
+    The game loop still samples the keyboard and decides how many ticks are due every frame, and hands both over here,
+    so the match gets the same keys for the same ticks it would get without the thread. The ticks of a frame run in
+    order on the one thread and end by copying a frame state out of the match. The next frame draws that state, so
+    drawing only reads the copy while the match moves on: frames are shown one frame later than they are simulated.
+    pygame releases the GIL while it blits and flips, so most of the drawing overlaps with the simulation.
+
+    Attributes:
+        game        : The game whose current scene is simulated
+        executor    : The simulation thread
+        pending     : The ticks being simulated, resolves to (state, alpha) of the frame to draw next
+
+    Methods:
+    -------
+    __init__    : Start the thread with a copy of the first tick.
+    advance     : Swap the finished ticks for the ticks of this frame.
+    close       : Wait for the last ticks and stop the thread.
+    """
+
+    def __init__(self, game: 'Game') -> None:
+        """
+        Start the thread with a copy of the first tick.
+        :param game: The game whose current scene is simulated
+        """
+        self.game = game
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="simulation")
+        self.pending = self.executor.submit(self._simulate, None, 0, 1.0)
+
+    def advance(self, keys: tuple[bool, ...], ticks: int, alpha: float) -> tuple[FrameState, float]:
+        """
+        Wait for the ticks of the previous frame, then start simulating the ticks of this one.
+        :param keys: keyboard sampled this frame
+        :param ticks: Ticks due this frame
+        :param alpha: How far this frame is between its last two ticks
+        :return: The state to draw now and how far between ticks to draw it, both of the previous frame.
+        """
+        drawn = self.pending.result()
+        self.pending = self.executor.submit(self._simulate, keys, ticks, alpha)
+        return drawn
+
+    def close(self) -> None:
+        """
+        Wait for the ticks still being simulated and stop the thread.
+        :return:
+        """
+        self.pending.result()
+        self.executor.shutdown()
+
+    def _simulate(self, keys: tuple[bool, ...], ticks: int, alpha: float) -> tuple[FrameState, float]:
+        """
+        Runs on the simulation thread.
+        :return: State of the last tick and the alpha to draw it with.
+        """
+        for _ in range(ticks):
+            self.game.step(keys)
+        return self.game.current_scene.capture(), alpha
+
+
+if TYPE_CHECKING:
+    from game import Game
@@ -0,0 +1,74 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import random
+from typing import Callable
+import numpy as np
+from config import *
+from sim.headless import ScriptedKeys, NO_KEYS, demo_script
+
+
+def idle_policy(seed: int) -> Callable[[int], ScriptedKeys]:
+    """
+    Nobody presses anything.
+    :param seed: Unused, every policy takes one.
+    :return: Script for HeadlessGame.run
+    """
+    return lambda tick: NO_KEYS
+
+
+def demo_policy(seed: int) -> Callable[[int], ScriptedKeys]:
+    """
+    The default headless script: boost in bursts, turn and shoot.
+    :param seed: Unused, every policy takes one.
+    :return: Script for HeadlessGame.run
+    """
+    return demo_script
+
+
+def random_policy(seed: int, hold: int = 15) -> Callable[[int], ScriptedKeys]:
+    """
+    Every player presses a random set of keys, held for `hold` ticks at a time.
+    :param seed: Seed for the random generator, the same seed always gives the same inputs.
+    :param hold: Number of ticks a set of keys is held.
+    :return: Script for HeadlessGame.run
+    """
+    rng = random.Random(seed)
+    current = NO_KEYS
+
+    def script(tick: int) -> ScriptedKeys:
+        nonlocal current
+        if tick % hold == 0:
+            current = ScriptedKeys.from_actions(
+                [rng.random() < 0.45, rng.random() < 0.3, rng.random() < 0.3, rng.random() < 0.6]
+                for _ in PLAYER_CONTROLS)
+        return current
+
+    return script
+
+
+def random_actions(seed: int, ships: int, hold: int = 15) -> Callable[[int], np.ndarray]:
+    """
+    Batched random_policy for a fleet: every ship holds a random set of keys for `hold` ticks, the ships change keys
+    on different ticks.
+    :param seed: Seed for the random generator, the same seed always gives the same actions.
+    :param ships: Number of ships.
+    :param hold: Number of ticks a set of keys is held.
+    :return: Returns the (ships, 4) power, left, right, shoot flags for a tick. The array is reused every call.
+    """
+    rng = np.random.default_rng(seed)
+    chance = np.array([0.45, 0.3, 0.3, 0.6])
+    phase = rng.integers(0, hold, ships)
+    actions = np.zeros((ships, 4), dtype=bool)
+
+    def script(tick: int) -> np.ndarray:
+        change = np.flatnonzero(phase == tick % hold)
+        actions[change] = rng.random((len(change), 4)) < chance
+        return actions
+
+    return script
+
+
+POLICIES = {
+    "idle": idle_policy,
+    "demo": demo_policy,
+    "random": random_policy,
+}
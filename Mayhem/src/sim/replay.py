@@ -0,0 +1,373 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import json
+import os
+import struct
+import time
+from typing import Any, BinaryIO
+import config
+from config import *
+from scenes.local_game import LocalGame
+from sim.headless import HeadlessGame, ScriptedKeys
+from sim.overrides import apply_overrides
+from sim import snapshot
+
+# File layout: MAGIC, FILE_HEADER (version, length of the JSON header), the JSON header, then a stream of blocks.
+# An INPUT block holds the key masks of a run of ticks, a KEYFRAME block holds the match state before a tick.
+MAGIC = b"MAYHEMRP"
+VERSION = 1
+FILE_HEADER = struct.Struct("<HI")
+INPUT = b"I"
+KEYFRAME = b"K"
+INPUT_HEADER = struct.Struct("<I")
+KEYFRAME_HEADER = struct.Struct("<II")
+
+# Settings added after replays were first recorded, with the value that matches how older versions played. A replay
+# whose config does not have one of them was recorded with that value.
+LEGACY_DEFAULTS = {"MASK_COLLISIONS": False}
+
+
+def _config_values() -> dict[str, Any]:
+    """
+    :return: Every setting in config.py that can be stored as JSON.
+    """
+    values = {}
+    for name in dir(config):
+        if name.isupper():
+            try:
+                values[name] = json.loads(json.dumps(getattr(config, name)))
+            except TypeError:
+                pass
+    return values
+
+
+def map_layout(scene: 'LocalGame') -> dict[str, list]:
+    """
+    :param scene: A match.
+    :return: The id, position and size of every wall and fuel pad.
+    """
+    return {"objects": [[o.id, *o.pos, *o.dimensions] for o in scene.objects],
+            "fuel_pads": [[f.id, *f.pos, *f.dimensions] for f in scene.fuel_pads]}
+
+
+def key_mask(keys, players: int) -> bytes:
+    """
+    Pack the PLAYER_CONTROLS keys of each player into 4 bits, two players per byte.
+    :param keys: Key state indexable by pygame key constants
+    :param players: Number of players
+    :return: The packed key state of one tick
+    """
+    mask = 0
+    for player in range(players):
+        for bit, key in enumerate(PLAYER_CONTROLS[player]):
+            if keys[key]:
+                mask |= 1 << (player * 4 + bit)
+    return mask.to_bytes(_tick_size(players), "little")
+
+
+def _tick_size(players: int) -> int:
+    return (players * 4 + 7) // 8
+
+
+class ReplayRecorder:
+    """
+    Streams the input of a match to a replay file as it is played.
+
+    Each tick costs 4 bits per player, a keyframe with the full match state is written every keyframe_interval
+    ticks so playback can seek without simulating from the start.
+
+    Attributes:
+        scene               : The match being recorded.
+        file                : The open replay file.
+        players             : Number of players.
+        tick_size           : Bytes per tick.
+        keyframe_interval   : Ticks between keyframes.
+        buffer_ticks        : Ticks of input collected before they are written.
+        tick                : Number of recorded ticks.
+        inputs              : Input not yet written.
+
+    Methods:
+    -------
+    __init__        : Open the replay file and write the header.
+    record          : Record the key state of the coming tick.
+    flush           : Write the buffered input.
+    close           : Write the remaining input and close the file.
+    """
+
+    def __init__(self, path: str, scene: 'LocalGame', keyframe_interval: int = REPLAY_KEYFRAME_INTERVAL,
+                 buffer_ticks: int = REPLAY_BUFFER_TICKS) -> None:
+        """
+        Open the replay file and write the header.
+        :param path: Replay file
+        :param scene: The match to record, before its first tick
+        :param keyframe_interval: Ticks between keyframes
+        :param buffer_ticks: Ticks of input collected before they are written
+        """
+        self.scene = scene
+        self.players = len(scene.players)
+        self.tick_size = _tick_size(self.players)
+        self.keyframe_interval = keyframe_interval
+        self.buffer_ticks = buffer_ticks
+        self.tick = 0
+        self.inputs = bytearray()
+
+        header = json.dumps({"players": self.players,
+                             "keyframe_interval": keyframe_interval,
+                             "config": _config_values(),
+                             "map": map_layout(scene)}).encode()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + FILE_HEADER.pack(VERSION, len(header)) + header)
+
+    def record(self, keys) -> None:
+        """
+        Record the key state of the coming tick, call it before the match is stepped with the same keys.
+        :param keys: Key state indexable by pygame key constants
+        :return:
+        """
+        if self.tick % self.keyframe_interval == 0:
+            self.flush()
+            state = snapshot.capture(self.scene)
+            self.file.write(KEYFRAME + KEYFRAME_HEADER.pack(self.tick, len(state)) + state)
+
+        self.inputs += key_mask(keys, self.players)
+        self.tick += 1
+        if len(self.inputs) >= self.buffer_ticks * self.tick_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered input as one block.
+        :return:
+        """
+        if self.inputs:
+            self.file.write(INPUT + INPUT_HEADER.pack(len(self.inputs) // self.tick_size) + self.inputs)
+            self.inputs = bytearray()
+
+    def close(self) -> None:
+        """
+        Write the remaining input and close the file.
+        :return:
+        """
+        self.flush()
+        self.file.close()
+
+
+class Replay:
+    """
+    A loaded replay file.
+
+    Attributes:
+        header      : Players, keyframe interval, config and map the match was recorded with.
+        players     : Number of players.
+        tick_size   : Bytes per tick.
+        inputs      : Packed key state of every tick.
+        keyframes   : Match state by tick.
+
+    Methods:
+    -------
+    __init__        : Read a replay file.
+    ticks           : Number of recorded ticks.
+    keys            : Packed key state of a tick.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Read a replay file.
+        :param path: Replay file
+        """
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a replay file")
+            version, length = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+            if version != VERSION:
+                raise ValueError(f"Unsupported replay version {version}")
+
+            self.header = json.loads(file.read(length))
+            self.players = self.header["players"]
+            self.tick_size = _tick_size(self.players)
+            self.inputs = bytearray()
+            self.keyframes = {}
+            self._read_blocks(file)
+
+    def _read_blocks(self, file: BinaryIO) -> None:
+        """
+        Read input and keyframe blocks until the end of the file, a block cut short by a crash is ignored.
+        :param file: Replay file positioned after the header
+        :return:
+        """
+        while kind := file.read(1):
+            if kind == INPUT:
+                raw = file.read(INPUT_HEADER.size)
+                if len(raw) < INPUT_HEADER.size:
+                    return
+                block = file.read(INPUT_HEADER.unpack(raw)[0] * self.tick_size)
+                self.inputs += block[:len(block) - len(block) % self.tick_size]
+            elif kind == KEYFRAME:
+                raw = file.read(KEYFRAME_HEADER.size)
+                if len(raw) < KEYFRAME_HEADER.size:
+                    return
+                tick, length = KEYFRAME_HEADER.unpack(raw)
+                state = file.read(length)
+                if len(state) < length:
+                    return
+                self.keyframes[tick] = state
+            else:
+                raise ValueError(f"Corrupt replay block {kind!r}")
+
+    @property
+    def ticks(self) -> int:
+        return len(self.inputs) // self.tick_size
+
+    def keys(self, tick: int) -> bytes:
+        """
+        :param tick: Recorded tick
+        :return: Packed key state of the tick
+        """
+        return bytes(self.inputs[tick * self.tick_size:(tick + 1) * self.tick_size])
+
+
+class ReplayPlayer:
+    """
+    Plays a replay back through Player.update with no frame cap.
+
+    The settings the replay was recorded with are applied while it plays, use it as a context manager (or call
+    close) to undo them.
+
+    Attributes:
+        replay      : The loaded replay.
+        game        : Headless game the match is simulated in.
+        scene       : The match.
+        tick        : Next tick to simulate.
+
+    Methods:
+    -------
+    __init__        : Apply the recorded settings and set up the match.
+    step            : Simulate the next recorded tick.
+    seek            : Jump to a tick from the nearest keyframe before it.
+    run             : Simulate up to a tick and return ticks per second.
+    close           : Undo the recorded settings.
+    """
+
+    def __init__(self, replay: Replay | str) -> None:
+        """
+        Apply the recorded settings and set up the match.
+        :param replay: A Replay or the path to one
+        """
+        self.replay = Replay(replay) if isinstance(replay, str) else replay
+
+        current = _config_values()
+        recorded = {**LEGACY_DEFAULTS, **self.replay.header["config"]}
+        changed = {name: value for name, value in recorded.items()
+                   if name in current and current[name] != value}
+        for name, value in changed.items():
+            if isinstance(getattr(config, name), tuple):
+                changed[name] = tuple(value)
+        self._previous = apply_overrides(changed)
+
+        self.game = HeadlessGame(LocalGame)
+        self.scene = self.game.current_scene
+        if json.loads(json.dumps(map_layout(self.scene))) != self.replay.header["map"]:
+            self.close()
+            raise ValueError("The replay was recorded on a different map")
+
+        # Key states are shared between every tick with the same packed input
+        self._keys = {}
+        self.tick = 0
+
+    def _keys_for(self, packed: bytes) -> ScriptedKeys:
+        keys = self._keys.get(packed)
+        if keys is None:
+            mask = int.from_bytes(packed, "little")
+            keys = self._keys[packed] = ScriptedKeys.from_actions(
+                [[mask >> (player * 4 + bit) & 1 for bit in range(4)] for player in range(self.replay.players)])
+        return keys
+
+    def step(self) -> None:
+        """
+        Simulate the next recorded tick.
+        :return:
+        """
+        self.game.step(self._keys_for(self.replay.keys(self.tick)))
+        self.tick += 1
+
+    def seek(self, tick: int) -> None:
+        """
+        Jump to a tick: the match is restored from the nearest keyframe at or before it and simulated from there.
+        :param tick: Tick to jump to, the state before that tick is simulated
+        :return:
+        """
+        tick = max(0, min(tick, self.replay.ticks))
+        if tick < self.tick:
+            start = max((k for k in self.replay.keyframes if k <= tick), default=None)
+            if start is None:
+                raise ValueError("The replay has no keyframe to seek from")
+            snapshot.restore(self.scene, self.replay.keyframes[start])
+            self.tick = start
+        else:
+            later = [k for k in self.replay.keyframes if self.tick < k <= tick]
+            if later:
+                snapshot.restore(self.scene, self.replay.keyframes[max(later)])
+                self.tick = max(later)
+
+        while self.tick < tick:
+            self.step()
+
+    def run(self, until: int | None = None) -> float:
+        """
+        Simulate as fast as possible up to a tick.
+        :param until: Tick to stop at, the end of the replay by default
+        :return: Ticks per second
+        """
+        until = self.replay.ticks if until is None else min(until, self.replay.ticks)
+        ticks = until - self.tick
+        start = time.perf_counter()
+        while self.tick < until:
+            self.step()
+        elapsed = time.perf_counter() - start
+
+        return ticks / elapsed if elapsed > 0 else float("inf")
+
+    def close(self) -> None:
+        """
+        Undo the recorded settings.
+        :return:
+        """
+        if self._previous is not None:
+            apply_overrides(self._previous)
+            self._previous = None
+
+    def __enter__(self) -> 'ReplayPlayer':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def new_replay_path() -> str:
+    """
+    :return: A path in REPLAY_DIR named after the current time.
+    """
+    return os.path.join(REPLAY_DIR, time.strftime("%Y%m%d-%H%M%S") + ".mrp")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Play a replay back with no frame cap and print the result.")
+    parser.add_argument("path", help="replay file")
+    parser.add_argument("--seek", type=int, default=None, help="jump to this tick first")
+    args = parser.parse_args()
+
+    with ReplayPlayer(args.path) as player:
+        if args.seek is not None:
+            player.seek(args.seek)
+        tps = player.run()
+        players = sorted(player.scene.players, key=lambda p: p.id)
+        print(f"{player.replay.ticks} ticks, {len(player.replay.keyframes)} keyframes, {tps:.0f} ticks/s")
+        print("scores: " + ", ".join(f"Player {p.id + 1}: {p.score}" for p in players))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import struct
+import numpy as np
+from config import *
+from typing import TYPE_CHECKING
+
+# Fixed layout of a snapshot: a header, one PLAYER record per player sorted by id, then one BULLET record per live
+# bullet in the order they were shot. Bullet owners are stored as the position of the player in that sorted order.
+HEADER = struct.Struct("<2I")
+PLAYER = struct.Struct("<10d6q2i?")
+BULLET = np.dtype([("pos", "<f8", (2,)), ("velocity", "<f8", (2,)), ("speed", "<f8"),
+                   ("distance_traveled", "<f8"), ("owner", "<i4")])
+
+
+def players_of(scene: 'LocalGame') -> list['Player']:
+    """
+    :param scene: A match.
+    :return: The players sorted by id, the order they are stored in.
+    """
+    return sorted(scene.players, key=lambda p: p.id)
+
+
+def size(players: int, bullets: int) -> int:
+    """
+    :param players: Number of players.
+    :param bullets: Number of live bullets.
+    :return: Bytes needed for a snapshot.
+    """
+    return HEADER.size + players * PLAYER.size + bullets * BULLET.itemsize
+
+
+def capture_into(scene: 'LocalGame', buffer: bytearray, players: list['Player'] = None) -> int:
+    """
+    Write the full simulation state of a match into a preallocated buffer.
+    :param scene: The match.
+    :param buffer: Writable buffer of at least size() bytes.
+    :param players: Result of players_of, pass it in when capturing the same match repeatedly.
+    :return: Number of bytes written.
+    """
+    players = players or players_of(scene)
+    bullets = scene.bullets
+    n = bullets.count
+
+    HEADER.pack_into(buffer, 0, len(players), n)
+    offset = HEADER.size
+    for p in players:
+        PLAYER.pack_into(
+            buffer, offset,
+            p.pos[0], p.pos[1], p.direction_vec.x, p.direction_vec.y, p.inertia_vec.x, p.inertia_vec.y,
+            p.step[0], p.step[1], p.collision_cooldown, p.fuel,
+            p.score, p.bounces, p.shoot_cooldown, p.respawns, p.landings, p.fuel_used,
+            p.rect.centerx, p.rect.centery, p.stationary)
+        offset += PLAYER.size
+
+    if n:
+        records = np.frombuffer(buffer, BULLET, n, offset)
+        records["pos"] = bullets.pos[:n]
+        records["velocity"] = bullets.velocity[:n]
+        records["speed"] = bullets.speed[:n]
+        records["distance_traveled"] = bullets.distance_traveled[:n]
+        if bullets.owners == players:
+            records["owner"] = bullets.owner[:n]
+        else:
+            records["owner"] = np.array([players.index(o) for o in bullets.owners])[bullets.owner[:n]]
+    return offset + n * BULLET.itemsize
+
+
+def capture(scene: 'LocalGame') -> bytes:
+    """
+    Capture the full simulation state of a match.
+    :param scene: The match.
+    :return: The state as a compact binary buffer.
+    """
+    players = players_of(scene)
+    buffer = bytearray(size(len(players), scene.bullets.count))
+    capture_into(scene, buffer, players)
+    return bytes(buffer)
+
+
+def restore(scene: 'LocalGame', data, players: list['Player'] = None) -> None:
+    """
+    Put a match back in a captured state.
+    :param scene: The match, with the same players as when the state was captured.
+    :param data: Result of capture, or a buffer filled by capture_into.
+    :param players: Result of players_of, pass it in when restoring the same match repeatedly.
+    :return:
+    """
+    players = players or players_of(scene)
+    count, n = HEADER.unpack_from(data)
+    if count != len(players):
+        raise ValueError(f"Snapshot has {count} players, the match has {len(players)}")
+
+    offset = HEADER.size
+    for p in players:
+        (x, y, dir_x, dir_y, vx, vy, step_x, step_y, p.collision_cooldown, p.fuel,
+         p.score, p.bounces, p.shoot_cooldown, p.respawns, p.landings, p.fuel_used,
+         center_x, center_y, p.stationary) = PLAYER.unpack_from(data, offset)
+        offset += PLAYER.size
+
+        p.pos = [x, y]
+        p.previous_pos = (x, y)
+        p.direction_vec.update(dir_x, dir_y)
+        p.inertia_vec.update(vx, vy)
+        p.step = (step_x, step_y)
+        p.updateRotation()
+        p.rect.center = (center_x, center_y)
+        scene.spatial_hash.update_dynamic(p)
+
+    records = np.frombuffer(data, BULLET, n, offset)
+    scene.bullets.restore(records["pos"], records["velocity"], records["speed"], records["distance_traveled"],
+                          records["owner"], players)
+
+
+class SnapshotRing:
+    """
+    Snapshots of the last ticks of a match, kept in preallocated buffers that are reused as the ring wraps.
+
+    Attributes:
+        scene       : The match.
+        length      : Number of ticks kept.
+        players     : Players sorted by id.
+        slots       : One buffer per tick, only reallocated when the bullets no longer fit.
+        ticks       : Tick stored in each slot, -1 for none.
+
+    Methods:
+    -------
+    __init__        : Allocate the buffers.
+    push            : Capture the state of a tick.
+    get             : The snapshot of a tick.
+    restore         : Rewind the match to a tick.
+    """
+
+    def __init__(self, scene: 'LocalGame', length: int = SNAPSHOT_RING_SIZE) -> None:
+        """
+        Allocate the buffers, each with room for as many bullets as the match has preallocated.
+        :param scene: The match.
+        :param length: Number of ticks kept.
+        """
+        self.scene = scene
+        self.length = length
+        self.players = players_of(scene)
+        self.slots = [bytearray(size(len(self.players), scene.bullets.capacity)) for _ in range(length)]
+        self.ticks = [-1] * length
+
+    def __contains__(self, tick: int) -> bool:
+        return tick >= 0 and self.ticks[tick % self.length] == tick
+
+    def push(self, tick: int) -> None:
+        """
+        Capture the current state as the state of a tick, replacing the oldest snapshot.
+        :param tick: Tick the state belongs to.
+        :return:
+        """
+        slot = tick % self.length
+        if len(self.slots[slot]) < size(len(self.players), self.scene.bullets.count):
+            self.slots[slot] = bytearray(size(len(self.players), self.scene.bullets.capacity))
+
+        capture_into(self.scene, self.slots[slot], self.players)
+        self.ticks[slot] = tick
+
+    def get(self, tick: int) -> bytearray:
+        """
+        :param tick: A tick in the ring.
+        :return: The buffer holding the snapshot, it is overwritten once the ring wraps around.
+        """
+        if tick not in self:
+            raise KeyError(f"Tick {tick} is not in the snapshot ring")
+        return self.slots[tick % self.length]
+
+    def restore(self, tick: int) -> None:
+        """
+        Rewind the match to a tick. Snapshots of later ticks are dropped, they belong to the timeline being replaced.
+        :param tick: A tick in the ring.
+        :return:
+        """
+        restore(self.scene, self.get(tick), self.players)
+        for slot, stored in enumerate(self.ticks):
+            if stored > tick:
+                self.ticks[slot] = -1
+
+
+if TYPE_CHECKING:
+    from scenes.local_game import LocalGame
+    from sprites.player import Player
@@ -0,0 +1,347 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import argparse
+import json
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from config import *
+from sim.events import KINDS
+
+# File layout: MAGIC, FILE_HEADER (version, length of the JSON header), the JSON header, then chunks of the same size.
+# A chunk holds the number of events in it, the events dropped before it and each column of chunk_rows events, so the
+# chunks can be memory-mapped as one array of records.
+MAGIC = b"MAYHEMTL"
+VERSION = 1
+FILE_HEADER = struct.Struct("<HI")
+
+# Seconds a full chunk waits for the writer to free one before events are dropped. The writer may only be waiting for
+# the GIL, waiting lets it run.
+WRITE_WAIT = 0.002
+
+# Columns of an event. Player is the id of the player or index of the fleet ship the event happened to, x and y are
+# where it was. Walls and fuel pads are numbered in the order of their groups. Value and other depend on the kind:
+#   shot        value -, other -
+#   hit         value -, other the player that shot
+#   score       value the change of the score, other the player that was shot for a point
+#   bounce      value the speed, other the fuel pad
+#   landing     value the speed, other the fuel pad
+#   crash_wall  value the speed, other the wall crashed into
+#   crash_pad   value the speed, other the fuel pad crashed into
+#   crash_ship  value the speed, other the player crashed into
+#   refill      value the fuel, other -
+COLUMNS = (("tick", "<u4"), ("kind", "u1"), ("player", "<u2"), ("other", "<i2"),
+           ("x", "<f4"), ("y", "<f4"), ("value", "<f4"))
+
+
+def chunk_dtype(rows: int, columns: tuple[tuple[str, str], ...] = COLUMNS) -> np.dtype:
+    """
+    :param rows: Events per chunk
+    :param columns: Name and type of each column
+    :return: The record type of a chunk, as it is stored in the file.
+    """
+    return np.dtype([("rows", "<u4"), ("dropped", "<u4")] + [(name, kind, (rows,)) for name, kind in columns])
+
+
+class TelemetryBus:
+    """
+    Streams the events of a match to a telemetry file while it is played.
+
+    Events are appended to the columns of a chunk of fixed size. A full chunk is handed to a writer thread and the
+    next free chunk is filled meanwhile, there are only ever max_chunks chunks so memory stays the same however long a
+    match runs. When every chunk is still waiting to be written, a full chunk waits up to WRITE_WAIT for the writer,
+    after that events are dropped and counted in the next chunk instead of holding up the match.
+
+    Events are recorded as ticks are simulated, ticks simulated again after a rollback are recorded again.
+
+    Attributes:
+        file        : The open telemetry file.
+        chunk_rows  : Events per chunk.
+        dropped     : Events dropped so far.
+        executor    : The writer thread.
+        free        : Chunks ready to be filled.
+        writes      : Chunks being written.
+        _chunk      : Chunk being filled, None while every chunk is being written.
+        _columns    : Columns of the chunk being filled, in COLUMNS order.
+        _row        : Events in the chunk being filled.
+        _reported   : Dropped events already counted in a chunk.
+
+    Methods:
+    -------
+    __init__    : Open the file, write the header and allocate the chunks.
+    emit        : Append an event.
+    emit_many   : Append events of many fleet ships at once.
+    flush       : Hand the chunk being filled to the writer.
+    close       : Write the remaining events and close the file.
+    """
+
+    def __init__(self, path: str, players: int, chunk_rows: int = TELEMETRY_CHUNK_ROWS,
+                 max_chunks: int = TELEMETRY_CHUNKS) -> None:
+        """
+        Open the file, write the header and allocate the chunks.
+        :param path: Telemetry file
+        :param players: Number of players or fleet ships in the match
+        :param chunk_rows: Events per chunk
+        :param max_chunks: Chunks in memory at most
+        """
+        self.chunk_rows = chunk_rows
+        self.dropped = 0
+        self._reported = 0
+
+        header = json.dumps({"players": players,
+                             "tick_rate": TICK_RATE,
+                             "chunk_rows": chunk_rows,
+                             "columns": COLUMNS,
+                             "kinds": KINDS}).encode()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + FILE_HEADER.pack(VERSION, len(header)) + header)
+
+        dtype = chunk_dtype(chunk_rows)
+        self.free = deque(np.zeros(1, dtype=dtype) for _ in range(max(1, max_chunks)))
+        self.writes = deque()
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="telemetry")
+        self._chunk = None
+        self._next_chunk()
+
+    def emit(self, tick: int, kind: int, player: int, x: float, y: float, value: float = 0.0,
+             other: int = -1) -> None:
+        """
+        Append an event, see COLUMNS.
+        :param tick: Tick the event happened in
+        :param kind: One of the event kinds
+        :param player: Player the event happened to
+        :param x: Where it happened
+        :param y: Where it happened
+        :param value: Depends on the kind
+        :param other: Depends on the kind
+        :return:
+        """
+        if self._chunk is None and not self._next_chunk():
+            self.dropped += 1
+            return
+        row = self._row
+        tick_column, kind_column, player_column, other_column, x_column, y_column, value_column = self._columns
+        tick_column[row] = tick
+        kind_column[row] = kind
+        player_column[row] = player
+        other_column[row] = other
+        x_column[row] = x
+        y_column[row] = y
+        value_column[row] = value
+        self._row = row + 1
+        if self._row == self.chunk_rows:
+            self.flush()
+
+    def emit_many(self, tick: int, kind: np.ndarray | list[int] | int, players: np.ndarray, pos: np.ndarray,
+                  value: np.ndarray | list[float] | float = 0.0, other: np.ndarray | list[int] | int = -1) -> None:
+        """
+        Append events of many fleet ships at once, a fleet appends all the events of a tick in one call.
+        :param tick: Tick the events happened in
+        :param kind: (n,) or one event kind for every event
+        :param players: (n,) ships the events happened to
+        :param pos: (n, 2) where they happened
+        :param value: (n,) or one value for every event
+        :param other: (n,) or one other for every event
+        :return:
+        """
+        n = len(players)
+        row = self._row
+        if self._chunk is not None and row + n < self.chunk_rows:
+            # Usually all of them fit in the chunk being filled
+            tick_column, kind_column, player_column, other_column, x_column, y_column, value_column = self._columns
+            stop = row + n
+            tick_column[row:stop] = tick
+            kind_column[row:stop] = kind
+            player_column[row:stop] = players
+            other_column[row:stop] = other
+            x_column[row:stop] = pos[:, 0]
+            y_column[row:stop] = pos[:, 1]
+            value_column[row:stop] = value
+            self._row = stop
+            return
+
+        kinds = np.broadcast_to(kind, (n,))
+        values = np.broadcast_to(value, (n,))
+        others = np.broadcast_to(other, (n,))
+        start = 0
+        while start < n:
+            if self._chunk is None and not self._next_chunk():
+                self.dropped += n - start
+                return
+            row = self._row
+            end = min(n, start + self.chunk_rows - row)
+            stop = row + end - start
+            tick_column, kind_column, player_column, other_column, x_column, y_column, value_column = self._columns
+            tick_column[row:stop] = tick
+            kind_column[row:stop] = kinds[start:end]
+            player_column[row:stop] = players[start:end]
+            other_column[row:stop] = others[start:end]
+            x_column[row:stop] = pos[start:end, 0]
+            y_column[row:stop] = pos[start:end, 1]
+            value_column[row:stop] = values[start:end]
+            self._row = stop
+            if stop == self.chunk_rows:
+                self.flush()
+            start = end
+
+    def flush(self) -> None:
+        """
+        Hand the chunk being filled to the writer thread. Chunks are stored whole, so flushing a chunk that is not full
+        leaves unused rows in the file.
+        :return:
+        """
+        if self._chunk is None or self._row == 0:
+            return
+        chunk = self._chunk
+        chunk["rows"] = self._row
+        self.writes.append(self.executor.submit(self._write, chunk))
+        self._chunk = None
+        self._next_chunk(WRITE_WAIT)
+
+    def close(self) -> None:
+        """
+        Write the remaining events, wait for the writer and close the file.
+        :return:
+        """
+        self.flush()
+        if self._chunk is None and self.dropped > self._reported:
+            # Events dropped since the last chunk are counted in an empty one
+            chunk = self._wait_for_chunk()
+            chunk["rows"] = 0
+            self.writes.append(self.executor.submit(self._write, chunk))
+        while self.writes:
+            self.writes.popleft().result()
+        self.executor.shutdown()
+        self.file.close()
+
+    def _next_chunk(self, timeout: float = 0.0) -> bool:
+        """
+        Start filling a free chunk, and raise the error of any write that failed.
+        :param timeout: Seconds to wait for the writer when every chunk is being written
+        :return: False if every chunk is still being written.
+        """
+        if not self.free and timeout and self.writes:
+            wait(self.writes, timeout, FIRST_COMPLETED)
+        while self.writes and self.writes[0].done():
+            self.writes.popleft().result()
+        if not self.free:
+            return False
+        self._chunk = self.free.popleft()
+        self._chunk["dropped"] = self.dropped - self._reported
+        self._reported = self.dropped
+        self._columns = tuple(self._chunk[name][0] for name, _ in COLUMNS)
+        self._row = 0
+        return True
+
+    def _wait_for_chunk(self) -> np.ndarray:
+        """
+        :return: A free chunk, once the writer has written one.
+        """
+        while not self.free:
+            self.writes.popleft().result()
+        chunk = self.free.popleft()
+        chunk["dropped"] = self.dropped - self._reported
+        self._reported = self.dropped
+        return chunk
+
+    def _write(self, chunk: np.ndarray) -> None:
+        """
+        Runs on the writer thread: write a chunk and give it back to be filled again.
+        :param chunk: The chunk to write
+        :return:
+        """
+        self.file.write(chunk.tobytes())
+        self.free.append(chunk)
+
+
+class TelemetryLog:
+    """
+    A telemetry file, memory-mapped so even a file of a week-long run can be scanned without reading it into memory.
+    A chunk cut short by a crash is ignored.
+
+    Attributes:
+        header      : Players, tick rate, chunk size, columns and kinds the file was written with.
+        chunks      : Memory-mapped array of the chunks, see chunk_dtype.
+
+    Methods:
+    -------
+    __init__    : Map a telemetry file.
+    column      : Every event's value of a column.
+    dropped     : Number of events that were dropped.
+    counts      : Number of events of each kind.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Map a telemetry file.
+        :param path: Telemetry file
+        """
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a telemetry file")
+            version, length = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+            if version != VERSION:
+                raise ValueError(f"Unsupported telemetry version {version}")
+            self.header = json.loads(file.read(length))
+
+        dtype = chunk_dtype(self.header["chunk_rows"], [tuple(column) for column in self.header["columns"]])
+        offset = len(MAGIC) + FILE_HEADER.size + length
+        count = (os.path.getsize(path) - offset) // dtype.itemsize
+        self.chunks = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)) if count else \
+            np.zeros(0, dtype=dtype)
+        self._used = np.arange(self.header["chunk_rows"]) < self.chunks["rows"][:, None]
+
+    def __len__(self) -> int:
+        return int(self.chunks["rows"].sum())
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        :param name: Name of a column, see COLUMNS
+        :return: The value of the column of every event, in the order they happened.
+        """
+        return self.chunks[name][self._used]
+
+    def dropped(self) -> int:
+        """
+        :return: Number of events that were dropped because the writer fell behind.
+        """
+        return int(self.chunks["dropped"].sum())
+
+    def counts(self) -> dict[str, int]:
+        """
+        :return: Number of events of each kind by name.
+        """
+        counts = np.bincount(self.column("kind"), minlength=len(self.header["kinds"]))
+        return dict(zip(self.header["kinds"], counts.tolist()))
+
+
+def new_telemetry_path() -> str:
+    """
+    :return: A path in TELEMETRY_DIR named after the current time.
+    """
+    return os.path.join(TELEMETRY_DIR, time.strftime("%Y%m%d-%H%M%S") + ".mtl")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print a summary of a telemetry file.")
+    parser.add_argument("path", help="telemetry file")
+    args = parser.parse_args()
+
+    log = TelemetryLog(args.path)
+    ticks = log.column("tick")
+    span = f", ticks {ticks.min()} to {ticks.max()}" if len(ticks) else ""
+    print(f"{len(log)} events in {len(log.chunks)} chunks{span}, {log.dropped()} dropped")
+    player, kind = log.column("player"), log.column("kind")
+    for index, name in enumerate(log.header["kinds"]):
+        per_player = np.bincount(player[kind == index], minlength=log.header["players"])
+        print(f"{name:>10}: {int(per_player.sum()):8d}   per player {per_player.tolist()}")
+
+
+if __name__ == "__main__":
+    main()
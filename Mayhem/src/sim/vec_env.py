@@ -0,0 +1,130 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import numpy as np
+from config import *
+from scenes.local_game import LocalGame
+from sim.headless import HeadlessGame
+
+# Columns of the observation array, one row per player
+OBSERVATION_FIELDS = ("x", "y", "vx", "vy", "dir_x", "dir_y", "fuel", "score", "stationary", "shoot_cooldown")
+
+# Maps each control key to the (player, action) slot that holds it
+KEY_SLOTS = {key: (player, action) for player, controls in enumerate(PLAYER_CONTROLS)
+             for action, key in enumerate(controls)}
+
+
+class ActionKeys:
+    """
+    Key state read straight from one environment's row of the action array.
+
+    Attributes:
+        actions     : [power, left, right, shoot] flags per player, as nested lists.
+    """
+
+    def __init__(self) -> None:
+        self.actions = None
+
+    def __getitem__(self, key: int) -> bool:
+        slot = KEY_SLOTS.get(key)
+        return slot is not None and bool(self.actions[slot[0]][slot[1]])
+
+
+class VecEnv:
+    """
+    N independent headless matches stepped in lockstep from one action array.
+
+    The observation, reward and done arrays are allocated once and overwritten by every step and reset, copy them to
+    keep them. A match that is done is started again with LocalGame.reset before step returns, so the observation
+    returned with done=True already belongs to the new match.
+
+    Attributes:
+        num_envs        : Number of matches.
+        num_players     : Players per match.
+        max_ticks       : A match is done after this many ticks.
+        win_score       : A match is also done when a player reaches this score, None to disable.
+        games           : The HeadlessGame of each match.
+        ticks           : (num_envs,) ticks played in each match.
+        observation     : (num_envs, num_players, len(OBSERVATION_FIELDS)) float32 buffer.
+        reward          : (num_envs, num_players) float32 buffer, score gained this step.
+        done            : (num_envs,) bool buffer.
+
+    Methods:
+    -------
+    __init__    : Create the matches.
+    reset       : Start every match again.
+    step        : Advance every match by one tick.
+    """
+
+    def __init__(self, num_envs: int, max_ticks: int = 60 * TICK_RATE, win_score: int = None) -> None:
+        """
+        Create the matches.
+        :param num_envs: Number of matches.
+        :param max_ticks: A match is done after this many ticks.
+        :param win_score: A match is also done when a player reaches this score.
+        """
+        self.num_envs = num_envs
+        self.num_players = len(PLAYER_CONTROLS)
+        self.max_ticks = max_ticks
+        self.win_score = win_score
+
+        self.games = [HeadlessGame(LocalGame) for _ in range(num_envs)]
+        self._players = [sorted(game.current_scene.players, key=lambda p: p.id) for game in self.games]
+        self._keys = ActionKeys()
+
+        self.ticks = np.zeros(num_envs, dtype=np.int64)
+        self.observation = np.zeros((num_envs, self.num_players, len(OBSERVATION_FIELDS)), dtype=np.float32)
+        self.reward = np.zeros((num_envs, self.num_players), dtype=np.float32)
+        self.done = np.zeros(num_envs, dtype=bool)
+        self._scores = np.zeros((num_envs, self.num_players), dtype=np.int64)
+
+    def reset(self) -> np.ndarray:
+        """
+        Start every match again.
+        :return: The observation buffer.
+        """
+        for env in range(self.num_envs):
+            self._reset_env(env)
+        return self.observation
+
+    def _reset_env(self, env: int) -> None:
+        self.games[env].current_scene.reset()
+        self.ticks[env] = 0
+        self._scores[env] = 0
+        self._observe(env)
+
+    def _observe(self, env: int) -> None:
+        """
+        Write the state of every player in a match into the observation buffer.
+        :param env: Index of the match.
+        :return:
+        """
+        rows = self.observation[env]
+        for row, player in zip(rows, self._players[env]):
+            length = player.direction_vec.length() or 1
+            row[:] = (player.pos[0], player.pos[1], player.inertia_vec.x, player.inertia_vec.y,
+                      player.direction_vec.x / length, player.direction_vec.y / length,
+                      player.fuel / FUEL, player.score, player.stationary, player.shoot_cooldown)
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Advance every match by one tick.
+        :param actions: (num_envs, num_players, 4) flags in PLAYER_CONTROLS order: power, left, right, shoot.
+        :return: The observation, reward and done buffers.
+        """
+        keys = self._keys
+        for env, (game, env_actions) in enumerate(zip(self.games, np.asarray(actions, dtype=bool).tolist())):
+            keys.actions = env_actions
+            game.step(keys)
+            self.ticks[env] += 1
+
+            scores = [player.score for player in self._players[env]]
+            self.reward[env] = np.subtract(scores, self._scores[env])
+            self._scores[env] = scores
+
+            self.done[env] = self.ticks[env] >= self.max_ticks or (
+                self.win_score is not None and max(scores) >= self.win_score)
+            if self.done[env]:
+                self._reset_env(env)
+            else:
+                self._observe(env)
+
+        return self.observation, self.reward, self.done
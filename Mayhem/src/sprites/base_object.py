@@ -10,7 +10,8 @@ class BaseObject(pygame.sprite.Sprite):
         id          : Unique id for debugging purposes
         pos         : Position [x,y]
         dimensions  : Size [x,y]
-        image       : color
+        color       : Fill color
+        image       : Filled surface, only created the first time the object is drawn
         rect        : Body
 
     """
@@ -30,6 +31,15 @@ class BaseObject(pygame.sprite.Sprite):
         self.id = str(id)
         self.pos = [pos[0], pos[1]]
         self.dimensions = dimensions 
-        self.image = pygame.Surface(dimensions)
-        self.image.fill(color)
-        self.rect = self.image.get_rect(center=pos)
+        self.color = color
+        self._image = None
+        self.rect = pygame.Rect((0, 0), dimensions)
+        self.rect.center = pos
+
+    @property
+    def image(self) -> pygame.Surface:
+        # Maps are drawn from a pre-rendered layer, so most objects never need their own surface
+        if self._image is None:
+            self._image = pygame.Surface(self.dimensions)
+            self._image.fill(self.color)
+        return self._image
@@ -1,76 +1,439 @@
 """Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import numpy as np
 import pygame
 from config import *
 from typing import TYPE_CHECKING
-from sprites.object import Object
+from physics.spatial_hash import PointGrid
+from physics.sweep import sweep_boxes, earliest, overlaps, overlap_pairs
+from physics.masks import touches
 
 
-class Bullets(pygame.sprite.Sprite):
+class Bullets:
     """
-    A class representing bullets.
+    A class representing every bullet in a match, stored in preallocated arrays instead of one sprite per shot.
+
+    Bullets are kept in the first `count` slots in the order they were shot, so the newest bullet always has the
+    highest index.
 
     Attributes:
-        all_sprites             : The group containing every other sprite in the current game.
-        owner                   : The Player who shot the bullet.
-        direction_vec           : bullets movement direction.
-        pos                     : bullets position.
-        distance_traveled       : Tracks the distance a bullet as traveled, used to limit its lifetime.
-        image                   : Bullets model.
-        rect                    : Body that can reacts with other objects.
+        match                   : The LocalGame the bullets belong to.
+        capacity                : Number of preallocated slots, doubled when a shot does not fit.
+        count                   : Number of live bullets.
+        pos                     : (capacity, 2) bullet positions.
+        velocity                : (capacity, 2) movement per tick.
+        speed                   : (capacity,) length of each velocity, cached for distance tracking.
+        owner                   : (capacity,) index into owners of the Player who shot the bullet.
+        distance_traveled       : (capacity,) distance each bullet has traveled.
+        owners                  : Players that have shot, indexed by the owner array.
+        hit_time                : Fraction of the last move at which each fast bullet first touched a wall, inf for none.
+        hit_wall                : Index in the wall index of that wall, -1 for none.
+        images                  : Bullet model shared by every bullet, per BULLET_SIZE.
+        masks                   : Collision mask of the bullet model, shared by every bullet, per BULLET_SIZE.
 
     Methods:
     ------------------
-     __init__   : Initializes bullet.
-    update      : Update bullet position with the direction it has.
+    __init__    : Initializes the bullet arrays.
+    spawn       : Shoot a bullet from a player.
+    spawn_many  : Add a batch of bullets shot by owners already in the owner table.
+    update      : Move every bullet and remove the colliding ones in one batched step.
+    collision   : Find the bullets that hit a wall or another bullet.
+    impacts     : Sparks where bullets hit something.
+    hit         : Find the newest bullet overlapping a rect.
+    hits        : Find the newest bullet overlapping each of many rects.
+    kill        : Remove a single bullet, or several.
+    restore     : Replace every bullet, used to put a match back in a saved state.
+    capture     : Copy the position and velocity of every bullet for a frame.
     """
 
-    def __init__(self, owner: 'Player' , *groups) -> None:
+    images = {}
+    masks = {}
+
+    def __init__(self, match: 'LocalGame', capacity: int = BULLET_CAPACITY) -> None:
+        """
+        Initializes the bullet arrays.
+        :param match: The LocalGame the bullets belong to.
+        :param capacity: Number of bullets to preallocate room for.
+        """
+        self.match = match
+        self.capacity = capacity
+        self.count = 0
+
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.speed = np.zeros(capacity)
+        self.owner = np.zeros(capacity, dtype=np.int32)
+        self.distance_traveled = np.zeros(capacity)
+
+        self.owners = []
+        self._owner_index = {}
+
+        # Earliest wall each bullet touched during the last update, inf and -1 for none
+        self.hit_time = np.zeros(0)
+        self.hit_wall = np.zeros(0, dtype=np.int64)
+
+        # Bullet rects [left, top, right, bottom], refreshed by update, the box around all of them and the
+        # bullets bucketed by cell, both rebuilt lazily after the bullets move
+        self._rects = np.zeros((capacity, 4))
+        self._bounds = None
+        self._grid = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _grow(self) -> None:
         """
-        Initializes bullet
+        Double the capacity of every array.
+        :return:
+        """
+        self.capacity *= 2
+        for name in ("pos", "velocity", "speed", "owner", "distance_traveled", "_rects"):
+            old = getattr(self, name)
+            new = np.zeros((self.capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
 
+    def spawn(self, owner: 'Player') -> None:
+        """
+        Shoot a bullet from the owner's position in the direction it is facing.
         :param owner: A Player class.
-        :param groups: The sprite group.
+        :return:
+        """
+        if self.count == self.capacity:
+            self._grow()
+
+        if owner not in self._owner_index:
+            self._owner_index[owner] = len(self.owners)
+            self.owners.append(owner)
+
+        speed = BULLET_SPEED + owner.inertia_vec.length()
+        direction = owner.direction_vec.copy()
+        direction.scale_to_length(speed)
+
+        i = self.count
+        self.pos[i] = owner.pos
+        self.velocity[i] = direction
+        self.speed[i] = speed
+        self.owner[i] = self._owner_index[owner]
+        self.distance_traveled[i] = 0
+        self._update_rects(i, i + 1)
+        self.count += 1
+
+    def spawn_many(self, pos: np.ndarray, velocity: np.ndarray, speed: np.ndarray, owner: np.ndarray) -> None:
+        """
+        Add a batch of bullets after the live ones, in the order given.
+        :param pos: (k, 2) positions.
+        :param velocity: (k, 2) movement per tick.
+        :param speed: (k,) length of each velocity.
+        :param owner: (k,) index into owners of the shooter of each bullet.
+        :return:
         """
-        super().__init__(*groups)
+        k = len(owner)
+        while self.count + k > self.capacity:
+            self._grow()
 
-        self.all_sprites = groups[1] # all_sprites group is always at index 1
-        self.owner = owner
-        self.direction_vec = self.owner.direction_vec.copy()
-        self.direction_vec.scale_to_length(BULLET_SPEED + self.owner.inertia_vec.length())
+        i = self.count
+        self.pos[i:i + k] = pos
+        self.velocity[i:i + k] = velocity
+        self.speed[i:i + k] = speed
+        self.owner[i:i + k] = owner
+        self.distance_traveled[i:i + k] = 0
+        self.count += k
+        self._update_rects(i, i + k)
 
-        self.pos = self.owner.pos.copy()
-        self.distance_traveled = 0
+    def _update_rects(self, start: int, stop: int) -> None:
+        """
+        Recalculate the rects of a range of bullets the same way pygame centers a rect on a rounded position.
+        :return:
+        """
+        topleft = self._rects[start:stop, :2]
+        np.round(self.pos[start:stop], out=topleft)
+        topleft -= BULLET_SIZE // 2
+        np.add(topleft, BULLET_SIZE, out=self._rects[start:stop, 2:])
+        self._bounds = None
+        self._grid = None
 
-        self.image = pygame.Surface((BULLET_SIZE, BULLET_SIZE), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, (0,0,0), (BULLET_SIZE/2,BULLET_SIZE/2), BULLET_SIZE/2)
-        self.rect = self.image.get_rect(center=self.pos)
+    def _bullet_grid(self) -> PointGrid:
+        """
+        The live bullets bucketed by cell, rebuilt only after bullets have moved, spawned or been removed.
+        :return: PointGrid
+        """
+        if self._grid is None:
+            self._grid = PointGrid(self.pos[:self.count], BULLET_SIZE)
+        return self._grid
 
     def update(self) -> None:
         """
-        + Update bullet position with the direction it has.
+        + Update every bullet position with the direction it has.
         + Remove the colliding bullets.
         :return:
         """
-        self.pos[0] += self.direction_vec.x
-        self.pos[1] += self.direction_vec.y
-        self.distance_traveled += self.direction_vec.length()
-        self.rect.center = (round(self.pos[0]), round(self.pos[1]))
-        self.collision()
+        n = self.count
+        if n == 0:
+            return
+
+        self.pos[:n] += self.velocity[:n]
+        self.distance_traveled[:n] += self.speed[:n]
+        self._update_rects(0, n)
+
+        dead = self.collision()
+        if dead.any():
+            if self.match.particles is not None:
+                self.impacts(dead)
+            self._compact(~dead)
+
+    def collision(self) -> np.ndarray:
+        """
+        Handling collision with walls and other bullets.
+        :return: Boolean array with True for each bullet that should be removed.
+        """
+        n = self.count
+        rects = self._rects[:n]
+        dead = np.zeros(n, dtype=bool)
+
+        walls = self.match.spatial_hash.wall_index()
+        half = BULLET_SIZE / 2
+        velocity = self.velocity[:n]
+        step = np.abs(velocity).max(axis=1)
+
+        # Box around each bullet's whole move this tick. The move runs between the rounded positions the rects are
+        # placed at, so the swept test below agrees with the rect test.
+        start = np.round(self.pos[:n] - velocity)
+        end = rects[:, :2] + BULLET_SIZE // 2
+        path = np.concatenate([np.minimum(start, end) - half, np.maximum(start, end) + half], axis=1)
+
+        # Only keep the walls that touch that box, looking them up in the wall index unless there are so few walls
+        # and bullets that testing every pair is cheaper than the lookup
+        if n * len(walls) <= BROADPHASE_MIN_PAIRS:
+            bullet, wall = np.nonzero(overlaps(path, walls.rects))
+        else:
+            bullet, wall = walls.candidate_pairs(self.pos[:n], step + half)
+            near = overlap_pairs(path[bullet], walls.rects[wall])
+            bullet, wall = bullet[near], wall[near]
+
+        self.hit_time = np.full(n, np.inf)
+        self.hit_wall = np.full(n, -1, dtype=np.int64)
+        if len(bullet):
+            wall_rects = walls.rects[wall]
+            dead[bullet[overlap_pairs(rects[bullet], wall_rects)]] = True
+
+            # A bullet that moves further than its own size in a tick can skip over a thin wall, so its path is swept
+            fast = step[bullet] > BULLET_SIZE
+            if fast.any():
+                bullet, wall, wall_rects = bullet[fast], wall[fast], wall_rects[fast]
+                times = sweep_boxes(start[bullet], end[bullet] - start[bullet], half, wall_rects)
+                self.hit_time, self.hit_wall = earliest(bullet, times, wall, n)
+                dead |= np.isfinite(self.hit_time)
+
+        # Two bullets that touch destroy each other
+        if n > 1:
+            if n * n <= BROADPHASE_MIN_PAIRS:
+                touching = overlaps(rects, rects)
+                np.fill_diagonal(touching, False)
+                dead |= touching.any(axis=1)
+            else:
+                first, second = self._bullet_grid().pairs()
+                touching = overlap_pairs(rects[first], rects[second])
+                dead[first[touching]] = True
+                dead[second[touching]] = True
+
+        return dead
+
+    def impacts(self, dead: np.ndarray) -> None:
+        """
+        Emit sparks where the bullets that hit something this tick did, on the wall for bullets swept into one.
+        :param dead: Boolean array with True for each bullet that hit something.
+        :return:
+        """
+        n = self.count
+        pos = self.pos[:n][dead]
+        velocity = self.velocity[:n][dead]
+        if len(self.hit_time) == n:
+            # A swept bullet has already moved past the wall, it hit the wall that far along its move
+            time = self.hit_time[dead]
+            swept = np.isfinite(time)
+            pos[swept] -= velocity[swept] * (1 - time[swept, None])
+        self.match.particles.impact(pos, velocity)
+
+    def hit(self, rect: pygame.Rect, mask: pygame.mask.Mask = None) -> int:
+        """
+        Find the newest bullet overlapping a rect.
+        :param rect: The rect to test, usually a player's.
+        :param mask: Mask placed at the rect, bullets overlapping the rect must also touch it.
+        :return: Index of the bullet, or -1 if none overlap.
+        """
+        n = self.count
+        if n == 0:
+            return -1
+
+        # Cheap rejection against the box around every bullet before testing them one by one
+        if self._bounds is None:
+            r = self._rects[:n]
+            self._bounds = (*r[:, :2].min(axis=0).tolist(), *r[:, 2:].max(axis=0).tolist())
+        left, top, right, bottom = self._bounds
+        if not (left < rect.right and rect.left < right and top < rect.bottom and rect.top < bottom):
+            return -1
+
+        # Same switch as the bullet pairs in collision, so the bullet grid is only built when it pays off
+        if n * n <= BROADPHASE_MIN_PAIRS:
+            candidates = np.arange(n)
+        else:
+            half = BULLET_SIZE / 2
+            candidates = self._bullet_grid().query_rect(rect.left - half, rect.top - half,
+                                                        rect.right + half, rect.bottom + half)
+
+        r = self._rects[candidates]
+        overlapping = candidates[(r[:, 0] < rect.right) & (rect.left < r[:, 2]) &
+                                 (r[:, 1] < rect.bottom) & (rect.top < r[:, 3])]
+        if mask is None:
+            return int(overlapping.max()) if len(overlapping) else -1
+
+        bullet_mask = Bullets.get_mask()
+        for i in sorted(overlapping.tolist(), reverse=True):
+            x, y = self._rects[i, :2].tolist()
+            if touches(mask, rect.topleft, bullet_mask, (int(x), int(y))):
+                return i
+        return -1
+
+    def hits(self, rects: np.ndarray, masks: list[pygame.mask.Mask] = None) -> np.ndarray:
+        """
+        Find the newest bullet overlapping each of many rects, like calling hit for each of them.
+        :param rects: (m, 4) rects as [left, top, right, bottom].
+        :param masks: Mask placed at each rect, bullets overlapping a rect must also touch its mask.
+        :return: (m,) index of the newest bullet overlapping each rect, -1 for none.
+        """
+        n = self.count
+        newest = np.full(len(rects), -1, dtype=np.int64)
+        if n == 0 or len(rects) == 0:
+            return newest
+
+        # Same switch as the bullet pairs in collision. Otherwise the rects are bucketed by center in cells big enough
+        # that a bullet can only touch rects in its own or a neighbouring cell.
+        bullets = self._rects[:n]
+        if n * len(rects) <= BROADPHASE_MIN_PAIRS:
+            rect, bullet = np.nonzero(overlaps(rects, bullets))
+        else:
+            centers = (rects[:, :2] + rects[:, 2:]) / 2
+            reach = (rects[:, 2:] - rects[:, :2]).max() / 2 + BULLET_SIZE / 2
+            bullet, rect = PointGrid(centers, int(reach) + 1).near(self.pos[:n])
+            touching = overlap_pairs(rects[rect], bullets[bullet])
+            rect, bullet = rect[touching], bullet[touching]
+
+        # Only the few pairs whose rects overlap are tested pixel by pixel
+        if masks is not None and len(rect):
+            bullet_mask = Bullets.get_mask()
+            corners = rects[rect, :2].astype(int).tolist()
+            bullet_corners = bullets[bullet, :2].astype(int).tolist()
+            keep = [touches(masks[r], corner, bullet_mask, bullet_corner)
+                    for r, corner, bullet_corner in zip(rect.tolist(), corners, bullet_corners)]
+            keep = np.array(keep, dtype=bool)
+            rect, bullet = rect[keep], bullet[keep]
+
+        np.maximum.at(newest, rect, bullet)
+        return newest
+
+    def owner_of(self, index: int) -> 'Player':
+        """
+        :param index: Index of a live bullet.
+        :return: The Player who shot the bullet.
+        """
+        return self.owners[self.owner[index]]
+
+    def kill(self, index: int | np.ndarray) -> None:
+        """
+        Remove a single bullet, keeping the others in the order they were shot.
+        :param index: Index of a live bullet, or an array of them.
+        :return:
+        """
+        keep = np.ones(self.count, dtype=bool)
+        keep[index] = False
+        self._compact(keep)
+
+    def _compact(self, keep: np.ndarray) -> None:
+        """
+        Move the kept bullets to the front of the arrays.
+        :param keep: Boolean array over the live bullets.
+        :return:
+        """
+        n = self.count
+        remaining = int(keep.sum())
+        for array in (self.pos, self.velocity, self.speed, self.owner, self.distance_traveled, self._rects):
+            array[:remaining] = array[:n][keep]
+        self.count = remaining
+        self._bounds = None
+        self._grid = None
+
+    def clear(self) -> None:
+        """
+        Remove every bullet.
+        :return:
+        """
+        self.count = 0
 
-    def collision(self) -> None:
+    def restore(self, pos: np.ndarray, velocity: np.ndarray, speed: np.ndarray, distance_traveled: np.ndarray,
+                owner: np.ndarray, owners: list['Player']) -> None:
         """
-        Handling collision with other objects.
+        Replace every bullet, used to put a match back in a saved state.
+        :param pos: (n, 2) bullet positions, in the order they were shot.
+        :param velocity: (n, 2) movement per tick.
+        :param speed: (n,) length of each velocity.
+        :param distance_traveled: (n,) distance each bullet has traveled.
+        :param owner: (n,) index into owners of the Player who shot each bullet.
+        :param owners: Players indexed by owner, replaces the current owner table.
         :return:
         """
-        collision_all_sprite = pygame.sprite.spritecollide(self, self.all_sprites, False)
+        n = len(owner)
+        self.count = 0
+        while self.capacity < n:
+            self._grow()
 
-        for collision in collision_all_sprite:
-            if isinstance(collision, Object):
-                self.kill()
+        if self.owners != owners:
+            self.owners = list(owners)
+            self._owner_index = {player: i for i, player in enumerate(owners)}
 
-            if isinstance(collision, Bullets) and collision != self:
-                self.kill()
+        self.pos[:n] = pos
+        self.velocity[:n] = velocity
+        self.speed[:n] = speed
+        self.distance_traveled[:n] = distance_traveled
+        self.owner[:n] = owner
+        self.count = n
+        self._update_rects(0, n)
 
+    def capture(self, out: np.ndarray) -> None:
+        """
+        Copy what a frame draws of every bullet, see FrameState.
+        :param out: (count, 4) filled with the position and velocity of every bullet.
+        :return:
+        """
+        n = self.count
+        out[:, :2] = self.pos[:n]
+        out[:, 2:] = self.velocity[:n]
+
+    @staticmethod
+    def get_image() -> pygame.Surface:
+        """
+        The bullet model, rendered once per BULLET_SIZE and shared by every bullet.
+
+        Kept per size, so matches played with another BULLET_SIZE in the same process, like a batch sweep over it,
+        never get the model of the first.
+        :return: Surface
+        """
+        image = Bullets.images.get(BULLET_SIZE)
+        if image is None:
+            image = Bullets.images[BULLET_SIZE] = pygame.Surface((BULLET_SIZE, BULLET_SIZE), pygame.SRCALPHA)
+            pygame.draw.circle(image, (0, 0, 0), (BULLET_SIZE/2, BULLET_SIZE/2), BULLET_SIZE/2)
+        return image
+
+    @staticmethod
+    def get_mask() -> pygame.mask.Mask:
+        """
+        The collision mask of the bullet model, made once per BULLET_SIZE and shared by every bullet.
+        :return: Mask
+        """
+        mask = Bullets.masks.get(BULLET_SIZE)
+        if mask is None:
+            mask = Bullets.masks[BULLET_SIZE] = pygame.mask.from_surface(Bullets.get_image())
+        return mask
 
 if TYPE_CHECKING:
-    from sprites.player import Player
\ No newline at end of file
+    from sprites.player import Player
+    from scenes.local_game import LocalGame
@@ -0,0 +1,459 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import numpy as np
+import pygame
+from config import *
+from typing import TYPE_CHECKING
+from physics.spatial_hash import PointGrid
+from physics.sweep import overlaps, overlap_pairs
+from physics.masks import touches, touches_rect
+from sprites.rotation_cache import RotationCache
+from sim import events
+
+
+class Fleet:
+    """
+    Every ship of a many-player match, stored in arrays and stepped all at once instead of one Player sprite each.
+
+    Ships follow the same rules as Player: thrust, air friction, gravity, terminal velocity, rotation, landing on fuel
+    pads, crashing into walls and bouncing off each other. The difference is that every ship sees the state of the
+    others at the start of the tick, where players are stepped one after another. Ships never move further than
+    their own size in a tick, so they are not swept against thin walls. With MASK_COLLISIONS the rect hits are
+    confirmed pixel by pixel with the masks of the rotation cache, like Player.touching.
+
+    Ship i shoots bullets with owner i, and ship i is the ith entry of the bullet owner table.
+
+    Attributes:
+        match               : The FleetGame the ships belong to.
+        count               : Number of ships.
+        rotations           : Shared rotated images of the ship shape.
+        spawn_points        : (count, 2) respawn point of each ship.
+        pos                 : (count, 2) ship centers.
+        previous_pos        : (count, 2) ship centers at the end of the previous tick.
+        direction           : (count, 2) facing, its length is 1 at the start and MAX_SPEED after a respawn like Player.
+        inertia             : (count, 2) movement per tick.
+        heading             : (count,) rotation cache index of each ship's image.
+        fuel                : (count,) fuel left.
+        score               : (count,) ships shot minus times shot.
+        stationary          : (count,) True while landed on a fuel pad.
+        bounces             : (count,) bounces on a fuel pad since the last landing.
+        shoot_cooldown      : (count,) ticks until each ship can shoot again.
+        collision_cooldown  : (count,) ticks since the last bounce, counted down like Player.
+        respawns            : (count,) times each ship has respawned.
+        landings            : (count,) times each ship has landed.
+        fuel_used           : (count,) fuel each ship has burnt.
+        rects               : (count, 4) ship rects [left, top, right, bottom], placed like pygame centers a Rect.
+
+    Methods:
+    -------
+    __init__    : Allocate the ship arrays and place every ship on its spawn point.
+    update      : Step every ship by one tick.
+    input       : Thrust, rotate and shoot.
+    move        : Apply air friction and gravity, then move.
+    collisions  : Bullets, fuel pads, walls and other ships.
+    respawn     : Put ships back on their spawn points.
+    log_events  : Queue events of many ships for the telemetry of the match.
+    reset       : Respawn every ship and reset its stats for a new match.
+    capture     : Copy what a frame draws of every ship.
+    """
+
+    def __init__(self, match: 'FleetGame', spawn_points: np.ndarray, color=COLOR) -> None:
+        """
+        Allocate the ship arrays and place every ship on its spawn point.
+        :param match: The FleetGame the ships belong to.
+        :param spawn_points: (count, 2) respawn point of each ship.
+        :param color: Color of the ships.
+        """
+        self.match = match
+        self.count = len(spawn_points)
+        self.rotations = RotationCache.shared(SIZE, color)
+        self.spawn_points = np.asarray(spawn_points, dtype=float).reshape(-1, 2)
+
+        # Size of the image at every heading, the rect of a ship is the rect of its current image
+        self._sizes = np.array([self.rotations.image(step).get_size() for step in range(self.rotations.steps)])
+
+        n = self.count
+        self.pos = self.spawn_points.copy()
+        self.previous_pos = self.pos.copy()
+        self.direction = np.tile([0.0, -1.0], (n, 1))
+        self.inertia = np.zeros((n, 2))
+        self.heading = np.zeros(n, dtype=np.int64)
+        self.fuel = np.full(n, FUEL)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.stationary = np.zeros(n, dtype=bool)
+        self.bounces = np.zeros(n, dtype=np.int64)
+        self.shoot_cooldown = np.zeros(n, dtype=np.int64)
+        self.collision_cooldown = np.zeros(n)
+        self.respawns = np.zeros(n, dtype=np.int64)
+        self.landings = np.zeros(n, dtype=np.int64)
+        self.fuel_used = np.zeros(n, dtype=np.int64)
+        self.rects = np.zeros((n, 4))
+
+        # Events of the tick being stepped, appended to the telemetry all at once at the end of it
+        self._events = []
+
+        self._update_heading(np.arange(n))
+        self._update_rects()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def update(self, actions: np.ndarray) -> None:
+        """
+        Step every ship by one tick, in the same order as Player.update.
+        :param actions: (count, 4) flags in PLAYER_CONTROLS order: power, left, right, shoot.
+        :return:
+        """
+        self.previous_pos[:] = self.pos
+        self.input(np.asarray(actions, dtype=bool))
+        self.move()
+        self.collisions()
+
+        # Refuel while landed
+        refuel = self.stationary & (self.fuel < FUEL)
+        self.fuel[refuel] += 5
+        np.minimum(self.fuel, FUEL, out=self.fuel, where=~refuel)
+        if self.match.telemetry is not None:
+            if refuel.any():
+                full = np.flatnonzero(refuel & (self.fuel >= FUEL))
+                self.log_events(events.REFILL, full, self.fuel[full])
+            self._emit_events()
+
+        self.shoot_cooldown[self.shoot_cooldown > 0] -= 1
+
+    def input(self, actions: np.ndarray) -> None:
+        """
+        Thrust, rotate and shoot.
+        :param actions: (count, 4) bool flags: power, left, right, shoot.
+        :return:
+        """
+        power, left, right, shoot = actions.T
+
+        # Boosting burns fuel, a ship at rest is kicked in its direction (straight up off a fuel pad) and a moving ship
+        # is pulled towards its direction
+        boost = np.flatnonzero(power & (self.fuel > 0))
+        if len(boost):
+            self.fuel[boost] -= 3
+            self.fuel_used[boost] += 3
+
+            inertia = self.inertia[boost]
+            direction = self.direction[boost]
+            speed = np.hypot(inertia[:, 0], inertia[:, 1])
+            resting = speed == 0
+            landed = resting & self.stationary[boost]
+
+            length = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+            kick = np.where(landed[:, None], [0.0, -SPEED_ACCELERATION], direction / length * SPEED_ACCELERATION)
+
+            distance = np.hypot(*(direction - inertia).T)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = SPEED_ACCELERATION / distance
+                capped = inertia / speed[:, None] * MAX_SPEED
+            pulled = np.where((t > 1)[:, None], capped, inertia + (direction - inertia) * np.minimum(t, 1)[:, None])
+
+            self.inertia[boost] = np.where(resting[:, None], kick, pulled)
+            lift = boost[landed]
+            self.stationary[lift] = False
+            self.bounces[lift] = 0
+            self.collision_cooldown[lift] = TICK_RATE
+
+            if self.match.particles is not None:
+                self.match.particles.thrust(self.pos[boost], direction, self.inertia[boost])
+
+        # Rotate, landed ships can't turn
+        turn = (right.astype(int) - left.astype(int)) * ~self.stationary
+        turning = np.flatnonzero(turn)
+        if len(turning):
+            angle = np.radians(turn[turning] * ROTATION_STEP)
+            cos, sin = np.cos(angle), np.sin(angle)
+            x, y = self.direction[turning].T
+            self.direction[turning] = np.column_stack([x * cos - y * sin, x * sin + y * cos])
+            self._update_heading(turning)
+
+        # Shoot from the center of the ship in its direction, faster the faster the ship moves
+        shooting = np.flatnonzero(shoot & (self.shoot_cooldown == 0))
+        if len(shooting):
+            self.shoot_cooldown[shooting] = SHOOT_COOLDOWN
+            direction = self.direction[shooting]
+            inertia = self.inertia[shooting]
+            speed = BULLET_SPEED + np.hypot(inertia[:, 0], inertia[:, 1])
+            velocity = direction / np.hypot(direction[:, 0], direction[:, 1])[:, None] * speed[:, None]
+            self.match.bullets.spawn_many(self.pos[shooting], velocity, speed, shooting)
+            self.log_events(events.SHOT, shooting)
+
+    def move(self) -> None:
+        """
+        Apply air friction and gravity to every ship that is not landed, cap the fall speed and move.
+        :return:
+        """
+        flying = ~self.stationary
+        inertia = self.inertia
+
+        speed = np.hypot(inertia[:, 0], inertia[:, 1])
+        slowed = flying & (speed != 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(slowed, np.maximum(speed - AIR_FRICTION, 0) / speed, 1.0)
+        inertia *= scale[:, None]
+
+        inertia[flying, 1] += G_ACCELERATION
+        np.minimum(inertia[:, 1], TERMINAL_VELOCITY, out=inertia[:, 1])
+
+        self.pos[flying] += inertia[flying]
+        self._update_rects()
+
+    def collisions(self) -> None:
+        """
+        + The newest bullet touching a ship scores for its shooter, unless the ship shot it.
+        + Touching a fuel pad slowly and upright bounces the ship, lands it after three bounces, or respawns it.
+        + Touching a wall respawns the ship.
+        + Ships touching each other bounce back if fast enough, otherwise they respawn.
+        :return:
+        """
+        rects = self.rects
+        n = self.count
+        hit = np.zeros(n, dtype=bool)
+        recording = self.match.telemetry is not None
+
+        # Bullets, a bullet touching several ships only counts for the first of them
+        bullets = self.match.bullets
+        masks = [self.rotations.mask(step) for step in self.heading.tolist()] if MASK_COLLISIONS else None
+        newest = bullets.hits(rects, masks)
+        shot = np.flatnonzero(newest >= 0)
+        if len(shot):
+            shooter = bullets.owner[newest[shot]]
+            shot, shooter = shot[shooter != shot], shooter[shooter != shot]
+            _, first = np.unique(newest[shot], return_index=True)
+            shot, shooter = shot[first], shooter[first]
+            if len(shot):
+                self.log_events(events.HIT, shot, other=shooter)
+                np.add.at(self.score, shooter, 1)
+                self.log_events(events.SCORE, shooter, 1, shot)
+                bullets.kill(newest[shot])
+                if recording:
+                    self.log_events(events.SCORE, shot[self.score[shot] > 0], -1)
+                self.score[shot] = np.maximum(self.score[shot] - 1, 0)
+                hit[shot] = True
+
+        # Fuel pads, there are only a few so every ship is tested against every pad, the last pad touched counts
+        flying = ~self.stationary & ~hit
+        pads = self.match.pad_rects
+        on_pad = np.full(n, -1, dtype=np.int64)
+        if len(pads):
+            touching = overlaps(rects, pads) & flying[:, None]
+            if MASK_COLLISIONS:
+                ship, pad = np.nonzero(touching)
+                touching[ship, pad] = self._touching(ship, pads[pad])
+            any_pad = touching.any(axis=1)
+            on_pad[any_pad] = len(pads) - 1 - np.argmax(touching[any_pad, ::-1], axis=1)
+        landing = np.flatnonzero(on_pad >= 0)
+        if len(landing):
+            hit[self._land(landing, on_pad[landing])] = True
+
+        # Walls
+        crashing = flying & (on_pad < 0)
+        walls = self.match.spatial_hash.wall_index()
+        candidates = np.flatnonzero(crashing)
+        if len(candidates) and len(walls):
+            if len(candidates) * len(walls) <= BROADPHASE_MIN_PAIRS:
+                ship, wall = np.nonzero(overlaps(rects[candidates], walls.rects))
+            else:
+                reach = (rects[candidates, 2:] - rects[candidates, :2]).max(axis=1) / 2
+                ship, wall = walls.candidate_pairs(self.pos[candidates], reach)
+                touching = overlap_pairs(rects[candidates][ship], walls.rects[wall])
+                ship, wall = ship[touching], wall[touching]
+            if MASK_COLLISIONS and len(ship):
+                touching = self._touching(candidates[ship], walls.rects[wall])
+                ship, wall = ship[touching], wall[touching]
+            if recording and len(ship):
+                crashed, first = np.unique(candidates[ship], return_index=True)
+                self.log_events(events.CRASH_WALL, crashed, np.hypot(*self.inertia[crashed].T), wall[first])
+            hit[candidates[ship]] = True
+
+        # Other ships, every pair unless there are enough ships for the grid to pay off
+        if n > 1:
+            if n * n <= BROADPHASE_MIN_PAIRS:
+                first, second = np.nonzero(np.triu(overlaps(rects, rects), 1))
+            else:
+                size = int((rects[:, 2:] - rects[:, :2]).max()) + 1
+                first, second = PointGrid(self.pos, size).pairs()
+                touching = overlap_pairs(rects[first], rects[second])
+                first, second = first[touching], second[touching]
+            if MASK_COLLISIONS and len(first):
+                corners = rects[:, :2].astype(int).tolist()
+                touching = np.array([touches(masks[a], corners[a], masks[b], corners[b])
+                                     for a, b in zip(first.tolist(), second.tolist())], dtype=bool)
+                first, second = first[touching], second[touching]
+
+            bumped = np.zeros(n, dtype=bool)
+            bumped[first] = True
+            bumped[second] = True
+            bumped = np.flatnonzero(bumped)
+            self.collision_cooldown[bumped] = TICK_RATE
+            inertia = self.inertia[bumped]
+            fast = (inertia[:, 0] > 0.4) | (inertia[:, 1] > 0.4)
+            self.inertia[bumped[fast]] *= -1
+            crashed = bumped[~fast & ~hit[bumped]] if recording else ()
+            if len(crashed):
+                # A ship touching several others names the last one it was paired with
+                partner = np.zeros(n, dtype=np.int64)
+                partner[first] = second
+                partner[second] = first
+                self.log_events(events.CRASH_SHIP, crashed, np.hypot(*self.inertia[crashed].T), partner[crashed])
+            hit[bumped[~fast]] = True
+
+        self.collision_cooldown -= 1
+
+        crashed = np.flatnonzero(hit)
+        if len(crashed):
+            if recording:
+                self.log_events(events.SCORE, crashed[self.score[crashed] > 0], -1)
+            self.score[crashed] = np.maximum(self.score[crashed] - 1, 0)
+            self.respawn(crashed)
+
+    def _touching(self, ships: np.ndarray, rects: np.ndarray) -> np.ndarray:
+        """
+        Pixel test ships against solid rects their own rects already overlap, like Player.touching.
+        :param ships: Index of the ship of each pair.
+        :param rects: (len(ships), 4) rect of each pair.
+        :return: (len(ships),) True where the ship's image touches the rect.
+        """
+        corners = self.rects[ships, :2].astype(int).tolist()
+        return np.array([touches_rect(self.rotations.mask(step), corner, rect)
+                         for step, corner, rect in zip(self.heading[ships].tolist(), corners, rects.tolist())],
+                        dtype=bool)
+
+    def _land(self, ships: np.ndarray, pads: np.ndarray) -> np.ndarray:
+        """
+        Bounce, land or crash ships touching a fuel pad, like Player.fuelPadCollisions.
+        :param ships: Indices of the ships touching a pad.
+        :param pads: Index of the pad each ship touches.
+        :return: Indices of the ships that crashed.
+        """
+        x, y = self.direction[ships].T
+        # Same angle as Vector2.angle_to((0, -1)), which is not wrapped to -180..180
+        angle = -90 - np.degrees(np.arctan2(y, x))
+        inertia = self.inertia[ships]
+        speed = np.hypot(inertia[:, 0], inertia[:, 1])
+        gentle = (-MAX_LANDING_ANGLE < angle) & (angle < MAX_LANDING_ANGLE) & (speed < MAX_LANDING_SPEED)
+
+        landing = gentle & (self.bounces[ships] == 3)
+        land = ships[landing]
+        if len(land):
+            self.log_events(events.LANDING, land, speed[landing], pads[landing])
+            pad = self.match.pad_rects[pads[landing]]
+            self.bounces[land] = 0
+            self.direction[land] = (0, -MAX_SPEED)
+            self.inertia[land] = 0
+            self.stationary[land] = True
+            self.landings[land] += 1
+            self.pos[land, 1] = pad[:, 1] - SIZE[1] / 2
+            self._update_heading(land)
+
+        # Bounce back up with 60 % of the speed
+        bouncing = gentle & (self.bounces[ships] != 3) & (speed > 0)
+        bounce = ships[bouncing]
+        if len(bounce):
+            self.log_events(events.BOUNCE, bounce, speed[bouncing], pads[bouncing])
+            self.inertia[bounce] *= (0.6, -0.6)
+            self.collision_cooldown[bounce] = TICK_RATE / 15
+            self.bounces[bounce] += 1
+
+        if self.match.telemetry is not None:
+            self.log_events(events.CRASH_PAD, ships[~gentle], speed[~gentle], pads[~gentle])
+        return ships[~gentle]
+
+    def respawn(self, ships: np.ndarray) -> None:
+        """
+        Put ships back on their spawn points, facing up and at rest.
+        :param ships: Indices of the ships.
+        :return:
+        """
+        if self.match.particles is not None:
+            self.match.particles.explosion(self.pos[ships])
+        self.direction[ships] = (0, -MAX_SPEED)
+        self.inertia[ships] = 0
+        self.stationary[ships] = False
+        self.pos[ships] = self.spawn_points[ships]
+        self.previous_pos[ships] = self.pos[ships]
+        self.respawns[ships] += 1
+        self._update_heading(ships)
+
+    def log_events(self, kind: int, ships: np.ndarray, value: np.ndarray | float = 0.0,
+                   other: np.ndarray | int = -1) -> None:
+        """
+        Queue an event for each of many ships at their current positions, if the telemetry of the match is recorded.
+        The events of a tick are appended together at the end of update.
+        :param kind: One of the event kinds in sim.events
+        :param ships: Indices of the ships.
+        :param value: Depends on the kind, one for each ship or for all of them
+        :param other: Depends on the kind, one for each ship or for all of them
+        :return:
+        """
+        if self.match.telemetry is not None and len(ships):
+            self._events.append((kind, ships, self.pos.take(ships, axis=0), value, other))
+
+    def _emit_events(self) -> None:
+        """
+        Append the events queued this tick to the telemetry of the match with a single emit_many. A tick has only a
+        few events, they are gathered in lists which costs less than a NumPy call for each.
+        :return:
+        """
+        events = self._events
+        if not events:
+            return
+        kinds, ships, pos, values, others = [], [], [], [], []
+        for kind, group, group_pos, value, other in events:
+            n = len(group)
+            kinds += [kind] * n
+            ships.append(group)
+            pos.append(group_pos)
+            values += value.tolist() if isinstance(value, np.ndarray) else [value] * n
+            others += other.tolist() if isinstance(other, np.ndarray) else [other] * n
+        self.match.telemetry.emit_many(self.match.game.tick, kinds, np.concatenate(ships), np.concatenate(pos),
+                                       values, others)
+        events.clear()
+
+    def reset(self) -> None:
+        """
+        Respawn every ship and reset its stats for a new match.
+        :return:
+        """
+        self.respawn(np.arange(self.count))
+        for array in (self.score, self.respawns, self.landings, self.fuel_used, self.bounces, self.shoot_cooldown,
+                      self.collision_cooldown):
+            array[:] = 0
+        self.fuel[:] = FUEL
+        self._update_rects()
+
+    def _update_heading(self, ships: np.ndarray) -> None:
+        """
+        Pick the rotation cache image of ships whose direction changed, the same way Player.updateRotation does.
+        """
+        x, y = self.direction[ships].T
+        angle = (-np.degrees(np.arctan2(y, x))) % 360
+        self.heading[ships] = np.round((angle - 90) / ROTATION_STEP).astype(np.int64) % self.rotations.steps
+
+    def _update_rects(self) -> None:
+        """
+        Place the rect of every ship's current image on its rounded center, like Rect.center does.
+        """
+        size = self._sizes[self.heading]
+        self.rects[:, :2] = np.round(self.pos) - size // 2
+        self.rects[:, 2:] = self.rects[:, :2] + size
+
+    def capture(self, previous: np.ndarray, current: np.ndarray, topleft: np.ndarray) -> list[pygame.Surface]:
+        """
+        Copy what a frame draws of every ship, see FrameState.
+        :param previous: (ships, 2) filled with the centers at the previous tick.
+        :param current: (ships, 2) filled with the centers.
+        :param topleft: (ships, 2) filled with where each image is drawn.
+        :return: The image of every ship.
+        """
+        previous[:] = self.previous_pos
+        current[:] = self.pos
+        np.subtract(np.round(self.pos), self._sizes[self.heading] // 2, out=topleft)
+        image = self.rotations.image
+        return [image(h) for h in self.heading.tolist()]
+
+
+if TYPE_CHECKING:
+    from scenes.fleet_game import FleetGame
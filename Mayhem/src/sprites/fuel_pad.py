@@ -3,6 +3,9 @@ from sprites.base_object import BaseObject
 
 class FuelPad(BaseObject):
     """A Sub-class of BaseObject thats represent fuel pad."""
+
+    COLOR = (125, 125, 125)
+
     def __init__(self, id: int, pos: list[int, int], dimensions: list[int, int], *groups) -> None:
         """
         Create the fuel pad
@@ -12,4 +15,4 @@ class FuelPad(BaseObject):
         :param dimensions: Size [x,y]
         :param groups: sprite group
         """
-        super().__init__(id, pos, dimensions, (125, 125, 125), *groups)
\ No newline at end of file
+        super().__init__(id, pos, dimensions, self.COLOR, *groups)
\ No newline at end of file
@@ -4,6 +4,8 @@ from sprites.base_object import BaseObject
 class Object(BaseObject):
     """A Sub-class of BaseObject thats represent obstacles"""
 
+    COLOR = (0, 0, 0)
+
     def __init__(self, id: int, pos: list[int, int], dimensions: list[int, int], *groups) -> None:
         """
         Create object
@@ -13,5 +15,5 @@ class Object(BaseObject):
         :param dimensions: Size [x,y]
         :param groups: sprite group
         """
-        super().__init__(id, pos, dimensions, (0, 0, 0), *groups)
+        super().__init__(id, pos, dimensions, self.COLOR, *groups)
 
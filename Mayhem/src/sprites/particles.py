@@ -0,0 +1,236 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+from typing import NamedTuple
+import numpy as np
+import pygame
+from config import *
+
+
+class ParticleKind(NamedTuple):
+    """
+    How a kind of particle looks and moves.
+
+    Attributes:
+        color       : Color of the particle.
+        radius      : Radius in pixels when it is emitted, it shrinks and fades until it dies.
+        life        : Ticks it lives.
+        speed       : Speed it is emitted at, on top of the movement of what emits it.
+        spread      : Largest angle in degrees between its direction and the direction it is emitted in.
+        drag        : Share of its speed it keeps every tick.
+        gravity     : Pull down per tick.
+    """
+    color: tuple[int, int, int]
+    radius: int
+    life: int
+    speed: float
+    spread: float
+    drag: float
+    gravity: float
+
+
+# Exhaust out of the back of a thrusting ship, sparks of a bullet hitting something and debris of a destroyed ship
+EXHAUST = ParticleKind((255, 170, 60), 3, 16, 2.5, 20, 0.9, 0.0)
+SPARK = ParticleKind((255, 240, 150), 2, 12, 3.0, 180, 0.85, 0.05)
+DEBRIS = ParticleKind((60, 60, 60), 3, 40, 3.5, 180, 0.95, 0.1)
+KINDS = (EXHAUST, SPARK, DEBRIS)
+EXHAUST_KIND, SPARK_KIND, DEBRIS_KIND = range(len(KINDS))
+
+# Particles emitted at once per ship or bullet
+EXHAUST_PARTICLES = 2
+SPARK_PARTICLES = 6
+DEBRIS_PARTICLES = 24
+
+
+class Particles:
+    """
+    Every particle of a match, stored in preallocated arrays with a stack of free slots instead of one sprite each.
+    Particles are only drawn, nothing in the match reads them, so they have their own random numbers and never change
+    how a match plays out.
+
+    Emitters ask for more particles than the budget can hold once many are alive: the fuller the arrays get, the fewer
+    of the asked for particles are emitted, so effects thin out instead of making frames slower.
+
+    Attributes:
+        capacity    : Most particles alive at once.
+        pos         : (capacity, 2) particle positions.
+        velocity    : (capacity, 2) movement per tick.
+        age         : (capacity,) ticks each particle has lived.
+        kind        : (capacity,) index into KINDS.
+        alive       : (capacity,) True for the slots in use.
+        free        : Stack of free slots, the first free_count are free.
+        free_count  : Number of free slots.
+        rng         : Random numbers of the emitters.
+        images      : Images of every kind and fade step, shared by every match.
+
+    Methods:
+    -------
+    __init__    : Allocate the arrays with every slot free.
+    emit        : Add particles of a kind.
+    thrust      : Exhaust behind thrusting ships.
+    impact      : Sparks where bullets hit something.
+    explosion   : Debris where ships were destroyed.
+    update      : Move every particle and free the ones that died.
+    clear       : Free every slot.
+    count       : Number of particles alive.
+    capture     : Copy the position, velocity and image of every particle for a frame.
+    get_images  : Images of every kind and fade step.
+    """
+
+    images = None
+
+    def __init__(self, capacity: int = PARTICLE_BUDGET, seed: int = 0) -> None:
+        """
+        Allocate the arrays with every slot free.
+        :param capacity: Most particles alive at once
+        :param seed: Seed of the emitters
+        """
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.age = np.zeros(capacity, dtype=np.int32)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = np.arange(capacity)[::-1].copy()
+        self.free_count = capacity
+        self.rng = np.random.default_rng(seed)
+
+        self._life = np.array([kind.life for kind in KINDS])
+        self._drag = np.array([kind.drag for kind in KINDS])
+        self._gravity = np.array([kind.gravity for kind in KINDS])
+
+    def emit(self, kind: int, pos: np.ndarray, direction: np.ndarray, base: np.ndarray = None) -> int:
+        """
+        Add particles of a kind, as many as the budget allows.
+        :param kind: Index into KINDS
+        :param pos: (m, 2) where each particle starts
+        :param direction: (m, 2) direction each particle is emitted in, turned by up to the spread of the kind
+        :param base: (m, 2) movement of what emits each particle, added to its own
+        :return: Number of particles emitted.
+        """
+        # Once half of the budget is in use, fewer and fewer of the asked for particles are emitted
+        share = min(1.0, 2 * self.free_count / self.capacity)
+        m = min(round(len(pos) * share), self.free_count)
+        if m <= 0:
+            return 0
+        rows = np.linspace(0, len(pos) - 1, m).round().astype(int)
+
+        spec = KINDS[kind]
+        angle = np.radians(self.rng.uniform(-spec.spread, spec.spread, m))
+        direction = np.asarray(direction, dtype=float)[rows]
+        length = np.maximum(np.hypot(direction[:, 0], direction[:, 1]), 1e-9)
+        x, y = (direction / length[:, None]).T
+        cos, sin = np.cos(angle), np.sin(angle)
+        velocity = np.column_stack([x * cos - y * sin, x * sin + y * cos])
+        velocity *= (spec.speed * self.rng.uniform(0.5, 1.0, m))[:, None]
+        if base is not None:
+            velocity += np.asarray(base, dtype=float)[rows]
+
+        self.free_count -= m
+        slots = self.free[self.free_count:self.free_count + m]
+        self.pos[slots] = np.asarray(pos, dtype=float)[rows]
+        self.velocity[slots] = velocity
+        self.age[slots] = self.rng.integers(0, max(1, spec.life // 4), m)
+        self.kind[slots] = kind
+        self.alive[slots] = True
+        return m
+
+    def thrust(self, pos: np.ndarray, direction: np.ndarray, inertia: np.ndarray) -> None:
+        """
+        Exhaust out of the back of thrusting ships.
+        :param pos: (n, 2) ship centers
+        :param direction: (n, 2) direction each ship faces
+        :param inertia: (n, 2) movement of each ship
+        :return:
+        """
+        direction = np.asarray(direction, dtype=float)
+        back = -direction / np.maximum(np.hypot(direction[:, 0], direction[:, 1]), 1e-9)[:, None]
+        nozzle = np.asarray(pos, dtype=float) + back * (max(SIZE) / 2)
+        self.emit(EXHAUST_KIND, np.repeat(nozzle, EXHAUST_PARTICLES, axis=0),
+                  np.repeat(back, EXHAUST_PARTICLES, axis=0), np.repeat(inertia, EXHAUST_PARTICLES, axis=0))
+
+    def impact(self, pos: np.ndarray, velocity: np.ndarray) -> None:
+        """
+        Sparks where bullets hit something, thrown back against the bullets' movement.
+        :param pos: (n, 2) where the bullets hit
+        :param velocity: (n, 2) movement of each bullet
+        :return:
+        """
+        self.emit(SPARK_KIND, np.repeat(pos, SPARK_PARTICLES, axis=0),
+                  -np.repeat(velocity, SPARK_PARTICLES, axis=0))
+
+    def explosion(self, pos: np.ndarray) -> None:
+        """
+        Debris thrown every way from destroyed ships.
+        :param pos: (n, 2) where the ships were
+        :return:
+        """
+        pos = np.repeat(pos, DEBRIS_PARTICLES, axis=0)
+        self.emit(DEBRIS_KIND, pos, np.tile([0.0, -1.0], (len(pos), 1)))
+
+    def update(self) -> None:
+        """
+        Move every particle by one tick and free the slots of the ones that died.
+        :return:
+        """
+        live = np.flatnonzero(self.alive)
+        if len(live) == 0:
+            return
+
+        kind = self.kind[live]
+        velocity = self.velocity[live] * self._drag[kind][:, None]
+        velocity[:, 1] += self._gravity[kind]
+        self.velocity[live] = velocity
+        self.pos[live] += velocity
+        self.age[live] += 1
+
+        dead = live[self.age[live] >= self._life[kind]]
+        if len(dead):
+            self.alive[dead] = False
+            self.free[self.free_count:self.free_count + len(dead)] = dead
+            self.free_count += len(dead)
+
+    def clear(self) -> None:
+        """
+        Free every slot.
+        :return:
+        """
+        self.alive[:] = False
+        self.free[:] = np.arange(self.capacity)[::-1]
+        self.free_count = self.capacity
+
+    def count(self) -> int:
+        """
+        :return: Number of particles alive.
+        """
+        return self.capacity - self.free_count
+
+    def capture(self, out: np.ndarray) -> None:
+        """
+        Copy what a frame draws of every particle, see FrameState.
+        :param out: (count, 5) filled with the position, velocity and index into the images of every particle.
+        :return:
+        """
+        live = np.flatnonzero(self.alive)
+        kind = self.kind[live]
+        step = np.minimum(self.age[live] * PARTICLE_FADE_STEPS // self._life[kind], PARTICLE_FADE_STEPS - 1)
+        out[:, :2] = self.pos[live]
+        out[:, 2:4] = self.velocity[live]
+        out[:, 4] = kind * PARTICLE_FADE_STEPS + step
+
+    @staticmethod
+    def get_images() -> list[pygame.Surface]:
+        """
+        Images of every kind and fade step, rendered once and shared by every match. Each step is smaller and more
+        transparent than the one before.
+        :return: PARTICLE_FADE_STEPS images per kind, in KINDS order.
+        """
+        if Particles.images is None:
+            Particles.images = []
+            for kind in KINDS:
+                for step in range(PARTICLE_FADE_STEPS):
+                    fade = 1 - step / PARTICLE_FADE_STEPS
+                    radius = max(1.0, kind.radius * fade)
+                    image = pygame.Surface((kind.radius * 2, kind.radius * 2), pygame.SRCALPHA)
+                    pygame.draw.circle(image, (*kind.color, round(255 * fade)), (kind.radius, kind.radius), radius)
+                    Particles.images.append(image)
+        return Particles.images
+
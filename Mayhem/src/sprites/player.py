@@ -1,10 +1,13 @@
 """Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
 import pygame.sprite
+import numpy as np
 from typing import TYPE_CHECKING
 from config import *
-from sprites.bullets import *
-from sprites.object import Object
 from sprites.fuel_pad import FuelPad
+from sprites.rotation_cache import RotationCache
+from physics.sweep import sweep_boxes
+from physics.masks import touches, touches_rect
+from sim import events
 
 
 
@@ -32,9 +35,10 @@ class Player(pygame.sprite.Sprite):
         #Game screen
         self.match = match
 
-        # Draw the default player shape 
-        self.original_image = pygame.Surface(SIZE, pygame.SRCALPHA)
-        pygame.draw.polygon(self.original_image, COLOR, [(self.SIZE[0]/2, 0), (0, self.SIZE[1]), self.SIZE])
+        # The default player shape and its rotations are shared with every other player that looks the same
+        self.rotations = RotationCache.shared(SIZE, COLOR)
+        self.original_image = self.rotations.original
+        self.rotation_step = None
 
         # Initialize the image and rect attributes
         self.image = self.original_image
@@ -42,8 +46,10 @@ class Player(pygame.sprite.Sprite):
 
         # Position & Direction
         self.pos = [pos[0], pos[1]]
+        self.previous_pos = (pos[0], pos[1])
         self.direction_vec = pygame.math.Vector2(0, -1)
         self.inertia_vec = pygame.math.Vector2()
+        self.step = (0, 0)
 
         # Rotate the image to the correct angle
         self.updateRotation()
@@ -52,6 +58,11 @@ class Player(pygame.sprite.Sprite):
         self.fuel = FUEL
         self.score = 0
 
+        # Match statistics
+        self.respawns = 0
+        self.landings = 0
+        self.fuel_used = 0
+
         # Collision Variables
         self.collision_cooldown = 0
         self.bounces = 0
@@ -75,14 +86,20 @@ class Player(pygame.sprite.Sprite):
             None
 
         """
+        # Position at the end of the previous tick, frames drawn between ticks are interpolated from it
+        self.previous_pos = (self.pos[0], self.pos[1])
+
         #Update player behavior 
         self.input(keys)
         self.move()
+        self.match.spatial_hash.update_dynamic(self)
         self.spriteCollisions()
 
         # Activate the Fuel pad
         if self.stationary and self.fuel < FUEL:
             self.fuel += 5
+            if self.fuel >= FUEL:
+                self.logEvent(events.REFILL, self.fuel)
         elif self.fuel > FUEL:
             self.fuel = FUEL
 
@@ -93,6 +110,18 @@ class Player(pygame.sprite.Sprite):
     def scoreMinusOne(self) -> None:
         if self.score > 0:
             self.score -= 1
+            self.logEvent(events.SCORE, -1)
+
+    def logEvent(self, kind: int, value: float = 0.0, other: int = -1) -> None:
+        """
+        Append an event at the player's position to the telemetry of the match, if it is recorded.
+        :param kind: One of the event kinds in sim.events
+        :param value: Depends on the kind
+        :param other: Depends on the kind
+        :return:
+        """
+        if self.match.telemetry is not None:
+            self.match.telemetry.emit(self.match.game.tick, kind, self.id, self.pos[0], self.pos[1], value, other)
 
     def get_angle(self) -> float:
         """
@@ -110,13 +139,34 @@ class Player(pygame.sprite.Sprite):
         """
         Updates the players rotation to face the direction of its velocity vector.
 
-        It rotates the players original image based of the angle of the players direction vector.
-        Achieved by finding the vector's angle to the reference angle.
+        It picks the players image, rotated to the nearest ROTATION_STEP, from the shared rotation cache.
+        Achieved by finding the vector's angle to the reference angle. The image is only swapped when that heading changes.
         """
         if self.image and self.rect and self.direction_vec.length() > 0 and self.original_image:
-            angle = self.get_angle()
-            self.image = pygame.transform.rotate(self.original_image, angle-90)
-            self.rect = self.image.get_rect(center=self.rect.center)
+            step = self.rotations.quantize(self.get_angle() - 90)
+            if step != self.rotation_step:
+                self.rotation_step = step
+                self.image = self.rotations.image(step)
+                self.rect = self.image.get_rect(center=self.rect.center)
+
+    def getMask(self) -> pygame.mask.Mask:
+        """
+        Returns the collision mask of the player's current image, from the rotation cache.
+        """
+        return self.rotations.mask(self.rotation_step)
+
+    def touching(self, sprite: pygame.sprite.Sprite) -> bool:
+        """
+        Pixel test against a sprite whose rect already overlaps the player's rect: walls and fuel pads are solid,
+        players are tested mask against mask.
+
+        :param sprite: A wall, fuel pad or player.
+        :return: True if the ship's pixels touch the sprite.
+        """
+        if isinstance(sprite, Player):
+            return touches(self.getMask(), self.rect.topleft, sprite.getMask(), sprite.rect.topleft)
+        return touches_rect(self.getMask(), self.rect.topleft, (sprite.rect.left, sprite.rect.top,
+                                                                 sprite.rect.right, sprite.rect.bottom))
 
     def input(self, keys: tuple[bool, ...]) -> None:
 
@@ -131,6 +181,7 @@ class Player(pygame.sprite.Sprite):
 
             if self.fuel > 0:
                 self.fuel -= 3
+                self.fuel_used += 3
 
                 # Logic for accelerating the player
                 if self.inertia_vec.length() == 0:
@@ -142,7 +193,7 @@ class Player(pygame.sprite.Sprite):
                         self.inertia_vec.scale_to_length(SPEED_ACCELERATION)
                         self.stationary = False
                         self.bounces = 0
-                        self.collision_cooldown = FPS
+                        self.collision_cooldown = TICK_RATE
                 else:
                     distance_to_max_speed = self.inertia_vec.distance_to(self.direction_vec)
 
@@ -150,13 +201,16 @@ class Player(pygame.sprite.Sprite):
                         self.inertia_vec.scale_to_length(MAX_SPEED)
                     else:
                         self.inertia_vec = self.inertia_vec.lerp(self.direction_vec, SPEED_ACCELERATION/distance_to_max_speed)
+
+                if self.match.particles is not None:
+                    self.match.particles.thrust([self.pos], [self.direction_vec], [self.inertia_vec])
         # ROTATE
         if not self.stationary:
             if keys[PLAYER_CONTROLS[self.id][1]]:
-                self.direction_vec = self.direction_vec.rotate(-5)
+                self.direction_vec = self.direction_vec.rotate(-ROTATION_STEP)
 
             if keys[PLAYER_CONTROLS[self.id][2]]:
-                self.direction_vec = self.direction_vec.rotate(5)
+                self.direction_vec = self.direction_vec.rotate(ROTATION_STEP)
 
         self.updateRotation()
 
@@ -164,7 +218,8 @@ class Player(pygame.sprite.Sprite):
         if keys[PLAYER_CONTROLS[self.id][3]]:
             if self.shoot_cooldown == 0:
                 self.shoot_cooldown = SHOOT_COOLDOWN
-                Bullets(self, self.match.bullets, self.match.all_sprites)
+                self.match.bullets.spawn(self)
+                self.logEvent(events.SHOT)
 
     def move(self) -> None:
 
@@ -191,6 +246,9 @@ class Player(pygame.sprite.Sprite):
         if not self.stationary:
             self.pos[0] += self.inertia_vec.x
             self.pos[1] += self.inertia_vec.y
+            self.step = (self.inertia_vec.x, self.inertia_vec.y)
+        else:
+            self.step = (0, 0)
 
         self.rect.center = (round(self.pos[0]), round(self.pos[1]))
 
@@ -199,13 +257,32 @@ class Player(pygame.sprite.Sprite):
         Respawn player back to their predefined start point.
         :return:
         """
+        if self.match.particles is not None:
+            self.match.particles.explosion([self.pos])
         self.direction_vec = pygame.math.Vector2(0,-MAX_SPEED)
         self.inertia_vec = pygame.math.Vector2(0,0)
         self.stationary = False
-        self.pos = RESPAWN_POINT[self.id].copy()
+        self.pos = self.match.spawn_points[self.id].copy()
+        self.previous_pos = (self.pos[0], self.pos[1])
         self.scoreMinusOne()
+        self.respawns += 1
 
-    def playerCollisions(self) -> None:
+    def reset(self) -> None:
+        """
+        Respawn the player and reset its stats for a new match.
+        :return:
+        """
+        self.respawn()
+        self.fuel = FUEL
+        self.score = 0
+        self.respawns = 0
+        self.landings = 0
+        self.fuel_used = 0
+        self.collision_cooldown = 0
+        self.bounces = 0
+        self.shoot_cooldown = 0
+
+    def playerCollisions(self, opponent: 'Player') -> None:
 
         """
         + Bounce player back when colliding with other players.
@@ -214,13 +291,14 @@ class Player(pygame.sprite.Sprite):
         :return:
         """
         #Bounce
-        self.collision_cooldown = 60
+        self.collision_cooldown = TICK_RATE
         if self.inertia_vec[0] > 0.4 or self.inertia_vec[1] > 0.4 :
 
             self.inertia_vec[0] *= -1
             self.inertia_vec[1] *= -1
 
         else:
+            self.logEvent(events.CRASH_SHIP, self.inertia_vec.length(), opponent.id)
             self.respawn()
 
     def fuelPadCollisions(self, angle_from_up, colliding_fuel_pad) -> None:
@@ -236,76 +314,117 @@ class Player(pygame.sprite.Sprite):
 
             # After some bounces set player to be stationary on the fuel pad
             if self.bounces == 3:
+                self.logEvent(events.LANDING, self.inertia_vec.length(), self.match.fuel_pads.sprites().index(colliding_fuel_pad))
                 self.bounces = 0
                 self.direction_vec = pygame.math.Vector2(0, -MAX_SPEED)
                 self.inertia_vec = pygame.math.Vector2()
                 self.stationary = True
+                self.landings += 1
                 self.pos[1] = colliding_fuel_pad.pos[1] - colliding_fuel_pad.dimensions[1] / 2 - self.SIZE[
                     1] / 2
 
             # Bounce the player with a certain % of its speed back up
             elif self.inertia_vec.length() > 0:
+                self.logEvent(events.BOUNCE, self.inertia_vec.length(), self.match.fuel_pads.sprites().index(colliding_fuel_pad))
                 self.inertia_vec.reflect_ip(pygame.math.Vector2(0, -1))
                 self.inertia_vec.scale_to_length(self.inertia_vec.length() * 0.6)
                 if angle_from_up > 0:
                     if angle_from_up == 180:
                         self.inertia_vec.rotate_ip(10)
-                self.collision_cooldown = FPS / 15
+                self.collision_cooldown = TICK_RATE / 15
                 self.bounces += 1
         else:
+            self.logEvent(events.CRASH_PAD, self.inertia_vec.length(), self.match.fuel_pads.sprites().index(colliding_fuel_pad))
             self.respawn()
 
-    def spriteCollisions(self) -> None:
-
+    def lastColliding(self, sprites: list[pygame.sprite.Sprite]) -> pygame.sprite.Sprite | None:
         """
-        Collision detection for when a player collides with other non-player sprites :[ Fuel pad, Player, Object, Bullets ]
+        Returns the last sprite in the list whose rect overlaps the player's rect, and with MASK_COLLISIONS whose
+        pixels also touch the ship's.
 
-        :return:
+        :param sprites: Broadphase candidates in match order.
+        :return: The sprite, or None.
         """
-        # Get a list all colliding sprites with player
-        colliding_sprite = pygame.sprite.spritecollide(self, self.match.all_sprites, False)
-        if len(colliding_sprite) > 0:
-
-            colliding_with_fuel_pad = False
-            colliding_fuel_pad = None
-            colliding_object = None
-            colliding_bullet = None
-            colliding_players = None
+        for sprite in reversed(sprites):
+            if self.rect.colliderect(sprite.rect) and (not MASK_COLLISIONS or self.touching(sprite)):
+                return sprite
+        return None
 
-            # Detect with what the collision is taking place with
-            for colliding in colliding_sprite:
-
-                if isinstance(colliding, FuelPad):
-                    colliding_with_fuel_pad = True
-                    colliding_fuel_pad = colliding
+    def sweptCollision(self) -> pygame.sprite.Sprite | None:
+        """
+        Finds the first wall or fuel pad the player passed through during this tick's move. Only moves longer than the
+        player itself can skip over a wall, shorter ones are left to the rect test.
+        The player is put back where it first touched the sprite.
 
-                elif isinstance(colliding, Player):
-                    colliding_players = colliding
+        :return: The sprite that was hit first, or None.
+        """
+        dx, dy = self.step
+        if max(abs(dx), abs(dy)) < min(self.rect.width, self.rect.height):
+            return None
+
+        path = self.rect.union(self.rect.move(-round(dx), -round(dy)))
+        candidates = self.match.spatial_hash.query(path)
+        sprites = candidates.fuel_pads + candidates.objects
+        if not sprites:
+            return None
+
+        start = (self.pos[0] - dx, self.pos[1] - dy)
+        rects = np.array([[s.rect.left, s.rect.top, s.rect.right, s.rect.bottom] for s in sprites], dtype=float)
+        times = sweep_boxes(np.array([start]), np.array([self.step]),
+                            np.array([self.rect.width / 2, self.rect.height / 2]), rects)
+        first = int(np.argmin(times))
+        if not np.isfinite(times[first]):
+            return None
+
+        self.pos = [start[0] + dx * times[first], start[1] + dy * times[first]]
+        self.rect.center = (round(self.pos[0]), round(self.pos[1]))
+        return sprites[first]
 
-                elif isinstance(colliding, Object):
-                    colliding_object = colliding
+    def spriteCollisions(self) -> None:
 
-                if isinstance(colliding, Bullets):
-                    colliding_bullet = colliding
+        """
+        Collision detection for when a player collides with other non-player sprites :[ Fuel pad, Player, Object, Bullets ]
 
-            # Bullet Collision
-            if colliding_bullet and colliding_bullet.owner != self:
-                colliding_bullet.owner.score += 1
-                colliding_bullet.kill()
+        :return:
+        """
+        # Bullet Collision, only the newest bullet touching the player counts
+        colliding_bullet = self.match.bullets.hit(self.rect, self.getMask() if MASK_COLLISIONS else None)
+        if colliding_bullet != -1:
+            shooter = self.match.bullets.owner_of(colliding_bullet)
+            if shooter != self:
+                self.logEvent(events.HIT, 0.0, shooter.id)
+                shooter.score += 1
+                shooter.logEvent(events.SCORE, 1, self.id)
+                self.match.bullets.kill(colliding_bullet)
                 self.scoreMinusOne()
                 self.respawn()
 
-            # Landing on fuel pad logic and collision
-            if colliding_with_fuel_pad and not self.stationary:
-                angle_from_up = self.direction_vec.angle_to(pygame.math.Vector2(0, -1))
-                self.fuelPadCollisions(angle_from_up, colliding_fuel_pad)
-
-            elif colliding_object and not self.stationary:
-                self.respawn()
+        # Get the sprites near the player, already sorted by type, and keep the last colliding one of each
+        candidates = self.match.spatial_hash.query(self.rect)
+        colliding_fuel_pad = self.lastColliding(candidates.fuel_pads)
+        colliding_object = self.lastColliding(candidates.objects)
+        colliding_players = self.lastColliding(candidates.players)
+
+        # Nothing touched at the end of the move, check that the move did not pass through a thin wall
+        if not colliding_fuel_pad and not colliding_object and not self.stationary:
+            crossed = self.sweptCollision()
+            if isinstance(crossed, FuelPad):
+                colliding_fuel_pad = crossed
+            elif crossed:
+                colliding_object = crossed
+
+        # Landing on fuel pad logic and collision
+        if colliding_fuel_pad and not self.stationary:
+            angle_from_up = self.direction_vec.angle_to(pygame.math.Vector2(0, -1))
+            self.fuelPadCollisions(angle_from_up, colliding_fuel_pad)
+
+        elif colliding_object and not self.stationary:
+            self.logEvent(events.CRASH_WALL, self.inertia_vec.length(), self.match.objects.sprites().index(colliding_object))
+            self.respawn()
 
-            if colliding_players and colliding_players != self:
-                self.playerCollisions()
-                colliding_players.playerCollisions()
+        if colliding_players and colliding_players != self:
+            self.playerCollisions(colliding_players)
+            colliding_players.playerCollisions(self)
 
         self.collision_cooldown += -1
 
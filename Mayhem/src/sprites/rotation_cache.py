@@ -0,0 +1,81 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+from config import *
+
+
+class RotationCache:
+    """
+    Rotated copies of a ship image, one per ROTATION_STEP, shared by every Player with the same shape and color.
+
+    Images and masks are rotated the first time a heading is used and kept for the rest of the program. Masks only
+    depend on the shape, so ships of every color share them. Caches are kept per ROTATION_STEP, so matches played with
+    another step in the same process, like a batch sweep over it, never get the headings of the first.
+
+    Attributes:
+        original    : The unrotated image, pointing up.
+        step        : Degrees between headings, the ROTATION_STEP the cache was created with.
+        steps       : Number of headings in a full turn.
+
+    Methods:
+    -------
+    shared      : The cache for a size, color and ROTATION_STEP, created on first use.
+    quantize    : Heading index for an angle.
+    image       : Rotated image for a heading index.
+    mask        : Collision mask for a heading index.
+    """
+
+    _caches = {}
+    _shape_masks = {}
+
+    def __init__(self, size: tuple[int, int], color) -> None:
+        """
+        Draw the default ship shape.
+        :param size: Size [x,y] of the ship
+        :param color: Color of the ship
+        """
+        self.original = pygame.Surface(size, pygame.SRCALPHA)
+        pygame.draw.polygon(self.original, color, [(size[0]/2, 0), (0, size[1]), size])
+
+        self.step = ROTATION_STEP
+        self.steps = 360 // self.step
+        self._images = [None] * self.steps
+        self._masks = RotationCache._shape_masks.setdefault((tuple(size), self.step), [None] * self.steps)
+
+    @classmethod
+    def shared(cls, size: tuple[int, int], color) -> 'RotationCache':
+        """
+        :param size: Size [x,y] of the ship
+        :param color: Color of the ship
+        :return: The cache every ship of this size and color uses with the current ROTATION_STEP.
+        """
+        key = (tuple(size), str(color), ROTATION_STEP)
+        if key not in cls._caches:
+            cls._caches[key] = cls(size, color)
+        return cls._caches[key]
+
+    def quantize(self, angle: float) -> int:
+        """
+        :param angle: Counter-clockwise rotation from pointing up, in degrees.
+        :return: Index of the nearest heading.
+        """
+        return round(angle / self.step) % self.steps
+
+    def image(self, step: int) -> pygame.Surface:
+        """
+        :param step: Heading index
+        :return: The ship rotated to that heading.
+        """
+        image = self._images[step]
+        if image is None:
+            image = self._images[step] = pygame.transform.rotate(self.original, step * self.step)
+        return image
+
+    def mask(self, step: int) -> pygame.mask.Mask:
+        """
+        :param step: Heading index
+        :return: Collision mask of the ship rotated to that heading.
+        """
+        mask = self._masks[step]
+        if mask is None:
+            mask = self._masks[step] = pygame.mask.from_surface(self.image(step))
+        return mask
@@ -0,0 +1,27 @@
+"""Authors: Narongchai Cherdchoo & Daniels Sliks, 2024."""
+import pygame
+
+
+class StaticGroup(pygame.sprite.Group):
+    """
+    A sprite group for sprites that never move, like walls and fuel pads.
+
+    Attributes:
+        version     : Changes every time a sprite is added or removed, caches built from the group compare against it.
+    """
+
+    def __init__(self, *sprites) -> None:
+        """
+        Create the group
+        :param sprites: Sprites to add
+        """
+        self.version = 0
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite: pygame.sprite.Sprite, layer: int = None) -> None:
+        super().add_internal(sprite, layer)
+        self.version += 1
+
+    def remove_internal(self, sprite: pygame.sprite.Sprite) -> None:
+        super().remove_internal(sprite)
+        self.version += 1